@@ -1,12 +1,17 @@
-from fastapi import APIRouter, Request
+from fastapi import APIRouter, Request, Depends
+from app.middlewares.api_response import ApiRoute
+from app.middlewares.inject import internal_access
 from app.services.redis import business_client
 from app.services import user as user_service
 from app.services.mongodb.models.user import User
-from app.utils import get_logger
+from app.services.mongodb.monitoring import command_monitor
+from app.utils.worker_pool import password_pool, WorkerPoolBusy
+from app.utils import get_logger, handle_error
+from app.define import ErrorCode
 
 logger = get_logger()
 
-router = APIRouter()
+router = APIRouter(route_class=ApiRoute)
 
 @router.get("/example")
 async def example(request: Request):
@@ -22,6 +27,20 @@ async def health(request: Request):
         "ret": "health_response"
     }
 
+# 内部接口由配置开关与访问令牌控制（见 config["internal_api"]）
+@router.get("/base/internal/db-stats", dependencies=[Depends(internal_access)])
+async def db_stats(request: Request, reset: bool = False):
+    """MongoDB 命令统计（按 路由 -> 集合 -> 命令 的滚动窗口直方图）"""
+    stats = command_monitor.snapshot()
+    if reset:
+        command_monitor.reset()
+    return stats
+
+@router.get("/base/internal/worker-pools", dependencies=[Depends(internal_access)])
+async def worker_pools(request: Request):
+    """线程池状态（执行中、排队、拒绝数与平均等待/执行耗时）"""
+    return {"password": password_pool.stats()}
+
 @router.get("/redis-test")
 async def test_redis():
     logger.debug("test_redis")
@@ -55,7 +74,10 @@ async def test_mongodb():
 
     # 如果不存在，则创建
     if not user:
-        user = await user_service.create_user(mobile, password)
+        try:
+            user = await user_service.create_user(mobile, password)
+        except WorkerPoolBusy:
+            return handle_error(ErrorCode.SERVICE_BUSY, "创建用户请求过多")
         logger.info("Created new user with mobile=%s", mobile)
     else:
         logger.info("Found existing user with mobile=%s", mobile)
@@ -1,13 +1,15 @@
 from typing import Dict, Any, List
 from fastapi import APIRouter, Request, Body, Depends, Query
 from app.middlewares.inject import auth_user
+from app.middlewares.api_response import ApiRoute
 from app.services.mongodb.models.card import Card
-from app.utils import get_logger, handle_error, dict_to_sort_list
+from app.services.mongodb.query import compile_sort, equality_fields, QueryCompileError
+from app.utils import get_logger, handle_error
 from app.define import ErrorCode
 
 logger = get_logger()
 
-router = APIRouter()
+router = APIRouter(route_class=ApiRoute)
 
 @router.get("/card/list")
 async def get_cards(
@@ -17,16 +19,17 @@ async def get_cards(
 ):
     """获取用户的信用卡列表"""
     try:
-        # sort 转换为字典
-        sort = eval(sort)
         filter_dict = {"user_id": user_id}
         if is_active is not None:
             filter_dict["is_active"] = is_active
+        
+        # 排序必须由索引支撑
+        try:
+            sort_list = compile_sort(Card, sort, equality_fields(filter_dict))
+        except QueryCompileError as e:
+            return handle_error(ErrorCode.INVALID_PARAMS, str(e))
             
-        cards = await Card.find_many(
-            filter=filter_dict,
-            sort=dict_to_sort_list(sort)
-        )
+        cards = await Card.cached_find(user_id, is_active=is_active, sort=sort_list)
         
         return cards
     except Exception as e:
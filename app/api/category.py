@@ -1,6 +1,7 @@
 from typing import Dict, Any, List
 from fastapi import APIRouter, Request, Body, Depends, Query
 from app.middlewares.inject import auth_user
+from app.middlewares.api_response import ApiRoute
 from app.services.mongodb.models.swipe_type import SwipeType
 from app.services.mongodb.models.consumption_type import ConsumptionType
 from app.utils import get_logger, handle_error, dict_to_sort_list
@@ -8,7 +9,7 @@ from app.define import ErrorCode
 
 logger = get_logger()
 
-router = APIRouter()
+router = APIRouter(route_class=ApiRoute)
 
 # ==================== 刷卡类型管理 ====================
 
@@ -20,14 +21,7 @@ async def get_swipe_types(
     """获取刷卡类型列表"""
     try:
         sort = {"sort_order": 1, "created_at": 1}
-        filter_dict = {"user_id": user_id}
-        if is_active is not None:
-            filter_dict["is_active"] = is_active
-            
-        swipe_types = await SwipeType.find_many(
-            filter=filter_dict,
-            sort=dict_to_sort_list(sort)
-        )
+        swipe_types = await SwipeType.cached_find(user_id, is_active=is_active, sort=dict_to_sort_list(sort))
         
         return swipe_types
     except Exception as e:
@@ -139,14 +133,7 @@ async def get_consumption_types(
     """获取消费类型列表"""
     try:
         sort = {"sort_order": 1, "created_at": 1}
-        filter_dict = {"user_id": user_id}
-        if is_active is not None:
-            filter_dict["is_active"] = is_active
-            
-        consumption_types = await ConsumptionType.find_many(
-            filter=filter_dict,
-            sort=dict_to_sort_list(sort)
-        )
+        consumption_types = await ConsumptionType.cached_find(user_id, is_active=is_active, sort=dict_to_sort_list(sort))
         
         return consumption_types
     except Exception as e:
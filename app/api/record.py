@@ -1,17 +1,23 @@
+import asyncio
 from typing import Dict, Any, List
 from datetime import datetime, timedelta
 from fastapi import APIRouter, Request, Body, Depends, Query
 from app.middlewares.inject import auth_user
+from app.middlewares.api_response import ApiRoute
 from app.services.mongodb.models.record import Record
 from app.services.mongodb.models.card import Card
 from app.services.mongodb.models.swipe_type import SwipeType
 from app.services.mongodb.models.consumption_type import ConsumptionType
-from app.utils import get_logger, handle_error, dict_to_sort_list, to_local_timezone
+from app.services.mongodb.query import compile_sort, equality_fields, parse_fields, QueryCompileError
+from app.services.rollup import sum_by_consumption_type
+from app.services.allocation import allocate_new_record, update_record as update_record_locked
+from app.utils import get_logger, handle_error, to_local_timezone, event_manager, EVENTS, \
+    encode_cursor, decode_cursor
 from app.define import ErrorCode
 
 logger = get_logger()
 
-router = APIRouter()
+router = APIRouter(route_class=ApiRoute)
 
 @router.get("/record/list")
 async def get_records(
@@ -23,11 +29,12 @@ async def get_records(
     page: int = Query(1, description="页码"),
     page_size: int = Query(20, description="每页数量"),
     sort: str = Query(f"{{'trade_date': -1}}", description="排序字段"),
+    after: str = Query(None, description="游标，传入上一页返回的 next_cursor（传入后忽略 page）"),
+    with_total: bool = Query(True, description="是否返回总数"),
+    fields: str = Query(None, description="返回字段，逗号分隔，如 id,amount,trade_date（默认返回完整记录）"),
 ):
-    """获取消费记录列表"""
+    """获取消费记录列表（支持页码分页与游标分页）"""
     try:
-        # sort 转换为字典
-        sort = eval(sort)
         # 构建查询条件
         filter_dict = {"user_id": user_id, "is_active": True}
         
@@ -48,26 +55,67 @@ async def get_records(
                 date_filter["$lt"] = end_datetime
             filter_dict["trade_date"] = date_filter
         
-        # 分页计算
-        skip = (page - 1) * page_size
-        
-        # 查询记录
-        records = await Record.find_many(
-            filter=filter_dict,
-            sort=dict_to_sort_list(sort),
-            skip=skip,
-            limit=page_size
+        # 排序必须由索引支撑；按交易时间排序时索引附带 _id 次序
+        try:
+            sort_list = compile_sort(Record, sort, equality_fields(filter_dict))
+        except QueryCompileError as e:
+            return handle_error(ErrorCode.INVALID_PARAMS, str(e))
+        
+        # 游标分页：仅按交易时间排序时可用，_id 保证同一时间内次序稳定
+        cursor_mode = [field for field, _ in sort_list] == ["trade_date", "_id"]
+        direction = sort_list[0][1] if cursor_mode else None
+        
+        # 指定返回字段时只投影所需字段，并补充游标所需的排序字段
+        try:
+            projection = parse_fields(Record, fields, required=[field for field, _ in sort_list] if cursor_mode else ())
+        except QueryCompileError as e:
+            return handle_error(ErrorCode.INVALID_PARAMS, str(e))
+        
+        query_filter = filter_dict
+        if after:
+            if not cursor_mode:
+                return handle_error(ErrorCode.INVALID_PARAMS, "当前排序不支持游标分页")
+            try:
+                after_date, after_id = decode_cursor(after)
+            except (ValueError, TypeError):
+                return handle_error(ErrorCode.INVALID_PARAMS, "无效的游标")
+            op = "$lt" if direction < 0 else "$gt"
+            query_filter = {"$and": [filter_dict, {"$or": [
+                {"trade_date": {op: after_date}},
+                {"trade_date": after_date, "_id": {op: after_id}}
+            ]}]}
+        
+        # 分页计算（游标模式不再跳过记录）
+        skip = 0 if after else (page - 1) * page_size
+        
+        # 查询记录，按需同时获取总数
+        records, total = await asyncio.gather(
+            Record.find_many(
+                filter=query_filter,
+                sort=sort_list,
+                skip=skip,
+                limit=page_size,
+                fields=projection,
+                as_dict=projection is not None,
+                trusted=True
+            ),
+            Record.count(filter_dict) if with_total else asyncio.sleep(0)
         )
         
-        # 获取总数
-        total = await Record.count(filter_dict)
+        next_cursor = None
+        if cursor_mode and len(records) == page_size:
+            last = records[-1]
+            if not isinstance(last, dict):
+                last = {"trade_date": last.trade_date, "id": last.id}
+            next_cursor = encode_cursor([last["trade_date"], last["id"]])
         
         return {
             "list": records,
             "total": total,
             "page": page,
             "page_size": page_size,
-            "total_pages": (total + page_size - 1) // page_size
+            "total_pages": (total + page_size - 1) // page_size if total is not None else None,
+            "next_cursor": next_cursor
         }
         
     except Exception as e:
@@ -97,32 +145,23 @@ async def add_record(
         if record_type == "支付" and not all([consumption_type_id]):
             return handle_error(ErrorCode.INVALID_PARAMS, "缺少必要参数")
         
-        # 验证信用卡、类型
-        card = await Card.find_one({
-            "_id": card_id,
-            "user_id": user_id,
-            "is_active": True
-        })
+        # 验证信用卡、类型（并发读取用户的基础数据缓存）
+        card, consumption_type, swipe_type = await asyncio.gather(
+            Card.cached_get(user_id, card_id),
+            ConsumptionType.cached_get(user_id, consumption_type_id),
+            SwipeType.cached_get(user_id, swipe_type_id)
+        )
         
-        if not card:
+        if not card or not card.is_active:
             return handle_error(ErrorCode.INVALID_PARAMS, "信用卡不存在或不可用")
 
         consumption_type_name = None
-        if consumption_type_id:      
-            consumption_type = await ConsumptionType.find_one({
-                "_id": consumption_type_id,
-                "user_id": user_id,
-                "is_active": True
-            })
-            if not consumption_type:
+        if consumption_type_id:
+            if not consumption_type or not consumption_type.is_active:
                 return handle_error(ErrorCode.INVALID_PARAMS, "消费类型不存在或不可用")
             consumption_type_name = consumption_type.name
         
-        swipe_type = await SwipeType.find_one({
-            "_id": swipe_type_id,
-            "is_active": True
-        })
-        if not swipe_type:
+        if not swipe_type or not swipe_type.is_active:
             return handle_error(ErrorCode.INVALID_PARAMS, "刷卡类型不存在或不可用")
         swipe_type_name = swipe_type.name
         
@@ -147,136 +186,14 @@ async def add_record(
             description=body.get("description"),
             trade_date=trade_date,
             record_type=record_type,
-            status="未还"
+            status="未还",
+            outstanding_amount=float(amount) if record_type == "支付" else 0.0
         )
         
-        await record.save()
-        
-        # ========== 新增还款：分配到未还/部分还的支付记录，并更新还款状态 ==========
-        if record_type == "还款":
-            remaining_repay = float(amount)
-            applied_total = 0.0
-            
-            payments = await Record.find_many(
-                filter={
-                    "user_id": user_id,
-                    "card_id": card_id,
-                    "swipe_type_id": swipe_type_id,
-                    "record_type": "支付",
-                    "status": {"$in": ["未还", "部分还"]},
-                    "is_active": True
-                },
-                sort=[("trade_date", 1)]
-            )
-            
-            for payment in payments:
-                if remaining_repay <= 0:
-                    break
-                repaid_amount = sum((ref.amount for ref in (payment.repayment_refs or [])))
-                remaining_payment = max(payment.amount - repaid_amount, 0.0)
-                if remaining_payment <= 0:
-                    continue
-                
-                applied = min(remaining_payment, remaining_repay)
-                
-                # 更新支付记录：追加还款引用并更新状态
-                new_payment_status = "已还" if (repaid_amount + applied) >= payment.amount else \
-                                     ("部分还" if (repaid_amount + applied) > 0 else "未还")
-                await Record.update_one(
-                    {"_id": payment.id, "user_id": user_id},
-                    {
-                        "$push": {"repayment_refs": {"repayment_id": record.id, "amount": applied}},
-                        "$set": {"status": new_payment_status, "updated_at": datetime.now().astimezone()}
-                    }
-                )
-                
-                remaining_repay -= applied
-                applied_total += applied
-            
-            # 更新还款记录状态（已全部分配/部分分配/未分配）
-            new_repayment_status = "已还" if applied_total >= float(amount) else \
-                                   ("部分还" if applied_total > 0 else "未还")
-            await Record.update_one(
-                {"_id": record.id, "user_id": user_id},
-                {"$set": {"status": new_repayment_status, "updated_at": datetime.now().astimezone()}}
-            )
-        
-        # ========== 新增支付：消耗未还/部分还的还款记录，更新双方状态 ==========
-        if record_type == "支付":
-            remaining_payment = float(amount)
-            repaid_total_for_this_payment = 0.0
-            
-            repayments = await Record.find_many(
-                filter={
-                    "user_id": user_id,
-                    "card_id": card_id,
-                    "swipe_type_id": swipe_type_id,
-                    "record_type": "还款",
-                    "status": {"$in": ["未还", "部分还"]},
-                    "is_active": True
-                },
-                sort=[("trade_date", 1)]
-            )
-            
-            for repayment in repayments:
-                if remaining_payment <= 0:
-                    break
-                
-                # 计算该还款已被分配的总额（聚合统计所有支付记录的repayment_refs）
-                pipeline = [
-                    {"$match": {
-                        "user_id": user_id,
-                        "card_id": card_id,
-                        "record_type": "支付",
-                        "is_active": True,
-                        "repayment_refs": {"$elemMatch": {"repayment_id": repayment.id}}
-                    }},
-                    {"$unwind": "$repayment_refs"},
-                    {"$match": {"repayment_refs.repayment_id": repayment.id}},
-                    {"$group": {"_id": None, "applied": {"$sum": "$repayment_refs.amount"}}}
-                ]
-                agg = await Record.aggregate(pipeline)
-                applied_so_far = (agg[0]["applied"] if agg else 0.0)
-                
-                remaining_repay = max(repayment.amount - applied_so_far, 0.0)
-                if remaining_repay <= 0:
-                    # 已完全分配的还款，状态应为已还（兜底修正）
-                    await Record.update_one(
-                        {"_id": repayment.id, "user_id": user_id},
-                        {"$set": {"status": "已还", "updated_at": datetime.now().astimezone()}}
-                    )
-                    continue
-                
-                applied = min(remaining_repay, remaining_payment)
-                
-                # 更新当前支付记录的还款引用
-                await Record.update_one(
-                    {"_id": record.id, "user_id": user_id},
-                    {
-                        "$push": {"repayment_refs": {"repayment_id": repayment.id, "amount": applied}},
-                        "$set": {"updated_at": datetime.now().astimezone()}
-                    }
-                )
-                repaid_total_for_this_payment += applied
-                remaining_payment -= applied
-                
-                # 更新还款记录状态
-                new_repayment_status = "已还" if (applied_so_far + applied) >= repayment.amount else \
-                                       ("部分还" if (applied_so_far + applied) > 0 else "未还")
-                await Record.update_one(
-                    {"_id": repayment.id, "user_id": user_id},
-                    {"$set": {"status": new_repayment_status, "updated_at": datetime.now().astimezone()}}
-                )
-            
-            # 最后更新当前支付记录的状态
-            new_payment_status = "已还" if repaid_total_for_this_payment >= float(amount) else \
-                                 ("部分还" if repaid_total_for_this_payment > 0 else "未还")
-            await Record.update_one(
-                {"_id": record.id, "user_id": user_id},
-                {"$set": {"status": new_payment_status, "updated_at": datetime.now().astimezone()}}
-            )
-        
-        return await Record.find_by_id(record.id)
+        # 按 FIFO 分配到对方记录，并与新记录一起批量写入
+        changes = await allocate_new_record(record)
+        await event_manager.emit(EVENTS.RECORD_CHANGED, user_id, changes)
+        return record
         
     except Exception as e:
         logger.error(f"添加消费记录失败: {str(e)}")
@@ -290,35 +207,33 @@ async def update_record(
 ):
     """更新消费记录"""
     try:
-        # 查找记录
-        record = await Record.find_one({
-            "_id": record_id,
-            "user_id": user_id
-        })
-        
-        if not record:
+        def build_update(record: Record) -> Dict[str, Any]:
+            """根据账本锁内读取的最新记录生成更新字段"""
+            update_fields = {}
+            for field in ["card_id", "swipe_type_id", "consumption_type_id", "amount", 
+                         "description", "trade_date", "is_active"]:
+                if field in body:
+                    if field == "amount":
+                        update_fields[field] = float(body[field])
+                        # 支付金额变化时同步未还金额
+                        if record.record_type == "支付":
+                            update_fields["outstanding_amount"] = max(update_fields[field] - record.repaid_amount, 0.0)
+                    elif field == "trade_date":
+                        update_fields[field] = datetime.fromisoformat(body[field])
+                    else:
+                        update_fields[field] = body[field]
+            return update_fields
+        
+        # 读取、写入与重放受影响账本的后缀分配在同一组账本锁内完成
+        result = await update_record_locked(user_id, record_id, build_update)
+        if result is None:
             return handle_error(ErrorCode.INVALID_PARAMS, "消费记录不存在")
-        
-        # 更新字段
-        update_fields = {}
-        for field in ["card_id", "swipe_type_id", "consumption_type_id", "amount", 
-                     "description", "trade_date", "is_active"]:
-            if field in body:
-                if field == "amount":
-                    update_fields[field] = float(body[field])
-                elif field == "trade_date":
-                    update_fields[field] = datetime.fromisoformat(body[field])
-                else:
-                    update_fields[field] = body[field]
-        
-        if update_fields:
-            updated_record = await Record.find_one_and_update(
-                {"_id": record_id, "user_id": user_id},
-                {"$set": update_fields}
-            )
+        updated_record, changes = result
+        if not changes:
             return updated_record
-        
-        return record
+        await event_manager.emit(EVENTS.RECORD_CHANGED, user_id, changes)
+        # 返回重放后的最新状态
+        return next((after for _, after in reversed(changes) if after.id == record_id), updated_record)
         
     except Exception as e:
         logger.error(f"更新消费记录失败: {str(e)}")
@@ -331,15 +246,13 @@ async def delete_record(
 ):
     """删除消费记录（软删除）"""
     try:
-        # 软删除：设置为非激活状态
-        updated_record = await Record.find_one_and_update(
-            {"_id": record_id, "user_id": user_id},
-            {"$set": {"is_active": False}}
-        )
-        
-        if not updated_record:
+        # 软删除：在账本锁内设置为非激活状态，撤销该记录参与的分配，并重放其交易时间之后的分配
+        result = await update_record_locked(user_id, record_id, lambda record: {"is_active": False})
+        if result is None:
             return handle_error(ErrorCode.INVALID_PARAMS, "消费记录不存在")
         
+        _, changes = result
+        await event_manager.emit(EVENTS.RECORD_CHANGED, user_id, changes)
         return {}
         
     except Exception as e:
@@ -355,56 +268,28 @@ async def get_record_stats(
 ):
     """获取消费统计"""
     try:
-        # 构建查询条件
-        match_filter = {"user_id": user_id, "is_active": True}
+        # 日期范围（本地时区，结束日期包含当天）
+        start_datetime = to_local_timezone(datetime.fromisoformat(start_date)) if start_date else None
+        end_datetime = to_local_timezone(datetime.fromisoformat(end_date)) + timedelta(days=1) if end_date else None
         
-        if card_id:
-            match_filter["card_id"] = card_id
-        
-        # 日期范围查询
-        if start_date or end_date:
-            date_filter = {}
-            if start_date:
-                date_filter["$gte"] = datetime.fromisoformat(start_date)
-            if end_date:
-                end_datetime = datetime.fromisoformat(end_date) + timedelta(days=1)
-                date_filter["$lt"] = end_datetime
-            match_filter["trade_date"] = date_filter
-        
-        # 聚合查询
-        pipeline = [
-            {"$match": match_filter},
-            {
-                "$group": {
-                    "_id": "$consumption_type_id",
-                    "total_amount": {"$sum": "$amount"},
-                    "count": {"$sum": 1}
-                }
-            },
-            {"$sort": {"total_amount": -1}}
-        ]
-        
-        stats = await Record.aggregate(pipeline)
+        # 整月部分读取月度汇总，首尾不完整月份扫描原始记录
+        stats = await sum_by_consumption_type(user_id, start_datetime, end_datetime, card_id)
         
         # 获取消费类型信息
         consumption_types = {}
         if stats:
-            type_ids = [stat["_id"] for stat in stats]
-            types = await ConsumptionType.find_many({
-                "_id": {"$in": type_ids},
-                "user_id": user_id
-            })
+            types = await ConsumptionType.cached_all(user_id)
             consumption_types = {t.id: t for t in types}
         
         # 组装结果
         result = []
         total_amount = 0
         for stat in stats:
-            type_info = consumption_types.get(stat["_id"], {})
+            type_info = consumption_types.get(stat["_id"])
             result.append({
                 "consumption_type_id": stat["_id"],
-                "consumption_type_name": type_info.get("name", "未知"),
-                "consumption_type_color": type_info.get("color", "#3B82F6"),
+                "consumption_type_name": type_info.name if type_info else "未知",
+                "consumption_type_color": (type_info.color if type_info else None) or "#3B82F6",
                 "total_amount": stat["total_amount"],
                 "count": stat["count"]
             })
@@ -424,9 +309,15 @@ async def get_recent_consumptions(
     user_id: str = Depends(auth_user),
     card_id: str = Query(..., description="信用卡ID"),
     swipe_type_id: str = Query(..., description="刷卡类型ID"),
-    limit: int = Query(3, description="数量")
+    limit: int = Query(3, description="数量"),
+    fields: str = Query("trade_date,consumption_type_id,consumption_type_name,amount", description="返回字段，逗号分隔")
 ):
     try:
+        try:
+            projection = parse_fields(Record, fields)
+        except QueryCompileError as e:
+            return handle_error(ErrorCode.INVALID_PARAMS, str(e))
+        
         records = await Record.find_many(
             filter={
                 "user_id": user_id,
@@ -436,20 +327,16 @@ async def get_recent_consumptions(
                 "is_active": True
             },
             sort=[("trade_date", -1)],
-            limit=limit
+            limit=limit,
+            fields=projection,
+            as_dict=True
         )
 
-        result = [
-            {
-                "trade_date": r.trade_date.isoformat(),
-                "consumption_type_id": r.consumption_type_id,
-                "consumption_type_name": r.consumption_type_name,
-                "amount": r.amount
-            }
-            for r in records
-        ]
+        for r in records:
+            if isinstance(r.get("trade_date"), datetime):
+                r["trade_date"] = r["trade_date"].isoformat()
 
-        return {"list": result}
+        return {"list": records}
     except Exception as e:
         logger.error(f"获取最近消费记录失败: {str(e)}")
         return handle_error(ErrorCode.UNKNOWN_ERROR, "获取最近消费记录失败")
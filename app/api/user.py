@@ -1,13 +1,15 @@
 from typing import Dict, Any
 from fastapi import APIRouter, Request, Body, Depends
 from app.middlewares.inject import auth_user
+from app.middlewares.api_response import ApiRoute
 from app.services import user as user_service
 from app.utils import get_logger, handle_error
+from app.utils.worker_pool import WorkerPoolBusy
 from app.define import ErrorCode
 
 logger = get_logger()
 
-router = APIRouter()
+router = APIRouter(route_class=ApiRoute)
 
 @router.post("/user/login")
 async def login_user(
@@ -24,9 +26,12 @@ async def login_user(
     if not user:
         return handle_error(ErrorCode.AUTH_FAILED, "用户不存在")
     
-    # 校验密码
-    if not await user_service.verify_password(user, password):
-        return handle_error(ErrorCode.AUTH_FAILED, "密码错误")
+    # 校验密码，哈希线程池排队已满时直接返回繁忙
+    try:
+        if not await user_service.verify_password(user, password):
+            return handle_error(ErrorCode.AUTH_FAILED, "密码错误")
+    except WorkerPoolBusy:
+        return handle_error(ErrorCode.SERVICE_BUSY, "登录请求过多")
 
     session_id, session_data = await user_service.login_user(user)
 
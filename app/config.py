@@ -9,11 +9,40 @@ ENV = os.environ.get("BB_ENV", "development")
 BASE_CONFIG = {
     "log": {
         "level": logging.INFO
+    },
+    # 请求级数据库调用预算，超出时记录警告
+    "db_budget": {
+        "header": False,
+        "default": {"mongo_calls": 30, "redis_calls": 30, "total_ms": 1000},
+        "routes": {
+            "POST /api/record/add": {"mongo_calls": 10, "redis_calls": 10},
+            "GET /api/home/dashboard": {"mongo_calls": 6}
+        }
+    },
+    # 密码哈希线程池：并发数与最大排队数，排队已满时登录直接返回繁忙
+    "password_pool": {
+        "workers": 2,
+        "max_queue": 16
+    },
+    # 分布式锁等待：阻塞等待释放信号使用独立连接池，最多占用的连接数，超出时退化为定时重试
+    "lock_wait": {
+        "max_connections": 20
+    },
+    # 内部接口（/base/internal/*）：关闭时返回不存在；配置了 token 时请求需携带 X-Internal-Token 请求头
+    "internal_api": {
+        "enabled": False,
+        "token": os.environ.get("BB_INTERNAL_TOKEN", "")
     }
 }
 
 # 开发环境配置
 DEV_CONFIG = {
+    "db_budget": {
+        "header": True
+    },
+    "internal_api": {
+        "enabled": True
+    },
     "redis": {
         "host": "120.0.0.1",
         "port": 6479,
@@ -33,7 +62,8 @@ DEV_CONFIG = {
         "password": "123456",
         "connection_timeout_ms": 5000,
         "max_pool_size": 30,
-        "min_pool_size": 10
+        "min_pool_size": 10,
+        "slow_query_ms": 200
     }
 }
 
@@ -58,7 +88,8 @@ PROD_CONFIG = {
         "password": "123456",
         "connection_timeout_ms": 5000,
         "max_pool_size": 30,
-        "min_pool_size": 10
+        "min_pool_size": 10,
+        "slow_query_ms": 200
     }
 }
 
@@ -37,6 +37,10 @@ class ErrorCode:
         'errcode': 10005,
         'errmsg': '无效的手机号码'
     }
+    SERVICE_BUSY = {
+        'errcode': 10006,
+        'errmsg': '服务繁忙，请稍后重试'
+    }
     
     # 数据库相关错误 (2xxxx)
     DATABASE_ERROR = {
@@ -1,4 +1,5 @@
 from app.middlewares.session_middleware import SessionMiddleware
-from app.middlewares.api_response_middleware import ApiResponseMiddleware
+from app.middlewares.api_response import ApiResponse, ApiRoute, register_exception_handlers
+from app.middlewares.db_monitor_middleware import DbMonitorMiddleware
 
-__all__ = ["SessionMiddleware", "ApiResponseMiddleware"]
+__all__ = ["SessionMiddleware", "ApiResponse", "ApiRoute", "register_exception_handlers", "DbMonitorMiddleware"]
@@ -0,0 +1,87 @@
+import asyncio
+import functools
+from decimal import Decimal
+from typing import Any, Callable
+import orjson
+from fastapi import FastAPI, Request
+from fastapi.datastructures import DefaultPlaceholder
+from fastapi.encoders import jsonable_encoder
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, Response
+from fastapi.routing import APIRoute
+from pydantic import BaseModel
+from starlette.exceptions import HTTPException as StarletteHTTPException
+from app.define.errcode import ErrorCode
+from app.utils import get_logger
+
+logger = get_logger()
+
+def _default(obj: Any) -> Any:
+    """orjson 不支持的类型：pydantic 模型按字段展开（嵌套模型再次回调），其余与 jsonable_encoder 一致"""
+    if isinstance(obj, BaseModel):
+        return dict(obj)
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    return jsonable_encoder(obj)
+
+class ApiResponse(JSONResponse):
+    """
+    API响应类，在序列化时统一包装返回格式（作为 /api 路由的 default_response_class）:
+    - 正常返回: {"errcode": 0, "ret": 原始返回内容}
+    - 异常返回: {"errcode": 错误码, "errmsg": 错误信息}，已包含 errcode 的内容原样返回
+    使用 orjson 直接序列化模型、datetime 与列表
+    """
+
+    def render(self, content) -> bytes:
+        if not (isinstance(content, dict) and "errcode" in content):
+            content = {"errcode": ErrorCode.OK["errcode"], "ret": content}
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+class ApiRoute(APIRoute):
+    """
+    API路由类：异步接口的返回值直接交给响应类序列化，跳过 FastAPI 的 jsonable_encoder
+    （声明了 response_model 的接口仍走 FastAPI 的校验与序列化）
+    """
+
+    def get_route_handler(self) -> Callable:
+        call = self.dependant.call
+        if self.response_model is None and asyncio.iscoroutinefunction(call):
+            response_class = self.response_class
+            if isinstance(response_class, DefaultPlaceholder):
+                response_class = response_class.value
+            status_code = self.status_code or 200
+
+            @functools.wraps(call)
+            async def endpoint(*args, **kwargs):
+                result = await call(*args, **kwargs)
+                if isinstance(result, Response):
+                    return result
+                return response_class(result, status_code=status_code)
+
+            self.dependant.call = endpoint
+        return super().get_route_handler()
+
+async def http_exception_handler(request: Request, exc: StarletteHTTPException):
+    """HTTPException：detail 中带 errcode 时直接返回 detail"""
+    detail = exc.detail
+    if not (isinstance(detail, dict) and "errcode" in detail):
+        detail = {"errcode": ErrorCode.UNKNOWN_ERROR["errcode"], "errmsg": str(detail)}
+    return ApiResponse(detail, status_code=exc.status_code, headers=getattr(exc, "headers", None))
+
+async def validation_exception_handler(request: Request, exc: RequestValidationError):
+    """请求参数校验失败"""
+    error = {**ErrorCode.INVALID_PARAMS, "errdetail": jsonable_encoder(exc.errors())}
+    return ApiResponse(error, status_code=422)
+
+async def unhandled_exception_handler(request: Request, exc: Exception):
+    """未处理的异常"""
+    logger.error(f"API处理异常: {str(exc)}")
+    return ApiResponse(ErrorCode.UNKNOWN_ERROR, status_code=500)
+
+def register_exception_handlers(app: FastAPI):
+    """注册异常处理，错误响应使用与 ApiResponse 相同的格式"""
+    app.add_exception_handler(StarletteHTTPException, http_exception_handler)
+    app.add_exception_handler(RequestValidationError, validation_exception_handler)
+    app.add_exception_handler(Exception, unhandled_exception_handler)
@@ -0,0 +1,40 @@
+from app.config import config
+from app.services.mongodb.monitoring import request_scope, route_label
+from app.utils.db_budget import DbUsage, db_usage, finish_request
+
+class DbMonitorMiddleware:
+    """
+    数据库命令监控中间件（纯 ASGI）
+    - 将当前请求的 scope 放入 contextvar，供命令监听器按路由归类统计
+    - 统计请求内的 MongoDB/Redis 调用，超出预算时记录警告；
+      开启 db_budget.header 时在响应头中返回用量
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.expose_header = (config.get("db_budget") or {}).get("header", False)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        usage = DbUsage()
+        scope_token = request_scope.set(scope)
+        usage_token = db_usage.set(usage)
+
+        async def send_wrapper(message):
+            if self.expose_header and message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-db-usage", (
+                    f"mongo={usage.mongo_calls};redis={usage.redis_calls};"
+                    f"ms={usage.total_ms:.1f};docs={usage.max_documents}"
+                ).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            db_usage.reset(usage_token)
+            request_scope.reset(scope_token)
+            finish_request(route_label(scope), usage)
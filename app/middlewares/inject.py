@@ -1,5 +1,7 @@
+import secrets
 from fastapi import Request
 from fastapi import HTTPException
+from app.config import config
 from app.define import ErrorCode
 
 async def auth_user(request: Request) -> str:
@@ -17,4 +19,16 @@ async def auth_user(request: Request) -> str:
     if not user_id:
         raise HTTPException(status_code=401, detail={"errcode": ErrorCode.AUTH_FAILED["errcode"], "errmsg": "未授权"})
     return user_id
-    
\ No newline at end of file
+
+async def internal_access(request: Request) -> None:
+    """
+    校验内部接口访问权限
+    未开启内部接口时按不存在处理；配置了 token 时校验 X-Internal-Token 请求头
+    """
+    internal_config = config.get("internal_api", {})
+    if not internal_config.get("enabled"):
+        raise HTTPException(status_code=404, detail={"errcode": ErrorCode.RESOURCE_NOT_FOUND["errcode"], "errmsg": "接口不存在"})
+
+    token = internal_config.get("token")
+    if token and not secrets.compare_digest(request.headers.get("X-Internal-Token", ""), token):
+        raise HTTPException(status_code=401, detail={"errcode": ErrorCode.AUTH_FAILED["errcode"], "errmsg": "仅限内部访问"})
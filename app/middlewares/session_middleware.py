@@ -1,43 +1,63 @@
-from fastapi import Request
-from starlette.middleware.base import BaseHTTPMiddleware
+from http.cookies import SimpleCookie
+from starlette.requests import HTTPConnection
 from app.utils import get_logger, session_manager
 
 logger = get_logger()
 
-class SessionMiddleware(BaseHTTPMiddleware):
+class SessionMiddleware:
+    """
+    会话中间件（纯 ASGI）
+    - 从 cookie 中读取会话ID并加载会话，放入 request.state.session_id / request.state.session
+    - 响应时如果存在会话ID（包括路由中登录后设置的），在响应中设置 cookie
+    """
+
     def __init__(self, app, cookie_name: str = "bb_session", cookie_max_age: int = 180):
-        super().__init__(app)
+        self.app = app
         self.cookie_name = cookie_name
         # cookie过期时间（天）
         self.cookie_max_age = cookie_max_age * 24 * 60 * 60
-    
-    async def dispatch(self, request: Request, call_next):
+
+    def _cookie_header(self, session_id: str) -> bytes:
+        """生成 set-cookie 响应头"""
+        cookie = SimpleCookie()
+        cookie[self.cookie_name] = session_id
+        cookie[self.cookie_name]["max-age"] = self.cookie_max_age
+        cookie[self.cookie_name]["path"] = "/"            # 适用于整个网站
+        cookie[self.cookie_name]["httponly"] = True       # 防止JavaScript访问
+        cookie[self.cookie_name]["samesite"] = "lax"      # 防止CSRF攻击
+        return cookie.output(header="").strip().encode("latin-1")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        connection = HTTPConnection(scope)
         # 尝试从cookie中获取会话ID
-        session_id = request.cookies.get(self.cookie_name)
+        session_id = connection.cookies.get(self.cookie_name)
 
         # 如果有会话ID，尝试获取会话数据
         session_data = None
         if session_id:
             session_data = await session_manager.get_session(session_id)
-            logger.info(f"获取到的会话数据: {session_data}")
-        
-        # 将会话ID添加到请求状态中，以便路由处理函数使用
-        request.state.session_id = session_id
-        request.state.session = session_data
-
-        # 处理请求
-        response = await call_next(request)
-        
-        # 如果有管理员会话ID，在响应中设置cookie
-        if getattr(request.state, "session_id", None):
-            # 在响应中设置cookie
-            response.set_cookie(
-                key=self.cookie_name,
-                value=request.state.session_id,
-                max_age=self.cookie_max_age,
-                httponly=True,  # 防止JavaScript访问
-                samesite="lax",  # 防止CSRF攻击
-                path="/",        # 适用于整个网站
-            )
-        
-        return response
+
+        # 将会话ID添加到请求状态中（request.state 即 scope["state"]），以便路由处理函数使用
+        state = connection.state
+        state.session_id = session_id
+        state.session = session_data
+
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message):
+            # 如果有会话ID，在响应中设置cookie
+            if message["type"] == "http.response.start":
+                current_session_id = getattr(state, "session_id", None)
+                if current_session_id:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"set-cookie", self._cookie_header(current_session_id)))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
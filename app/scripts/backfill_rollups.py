@@ -0,0 +1,31 @@
+"""
+月度汇总回填命令
+从 records 集合分批重建 record_rollups，建议在低峰期执行
+
+用法:
+    python -m app.scripts.backfill_rollups [--user-id USER_ID ...] [--batch-size 50]
+"""
+import argparse
+import asyncio
+from app.services.mongodb import mongodb_client
+from app.services.rollup import rebuild_rollups
+from app.utils import get_logger
+
+logger = get_logger()
+
+async def main(user_ids=None, batch_size: int = 50):
+    if not await mongodb_client.initialize():
+        logger.error("MongoDB初始化失败，无法回填月度汇总")
+        return
+    try:
+        count = await rebuild_rollups(user_ids=user_ids, batch_size=batch_size)
+        logger.info(f"月度汇总回填完成，共 {count} 个用户")
+    finally:
+        await mongodb_client.shutdown()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="从 records 集合回填月度汇总")
+    parser.add_argument("--user-id", action="append", dest="user_ids", help="只回填指定用户，可重复")
+    parser.add_argument("--batch-size", type=int, default=50, help="每批并发重建的用户数")
+    args = parser.parse_args()
+    asyncio.run(main(user_ids=args.user_ids, batch_size=args.batch_size))
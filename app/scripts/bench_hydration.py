@@ -0,0 +1,79 @@
+"""
+模型构造基准
+对比完整校验（cls(**data)）与信任构造（trusted=True）将 MongoDB 文档转换为 Record 的耗时，
+不连接数据库，使用内存中模拟的文档
+
+用法:
+    python -m app.scripts.bench_hydration [--rows 10000] [--rounds 5]
+"""
+import argparse
+import time
+import uuid
+from datetime import datetime, timedelta
+from app.services.mongodb.models.record import Record
+
+def make_documents(rows: int):
+    """生成模拟的记录文档（与库中存储结构一致，含还款分配明细）"""
+    now = datetime.now().astimezone()
+    documents = []
+    for i in range(rows):
+        documents.append({
+            "_id": str(uuid.uuid4()),
+            "user_id": "bench-user",
+            "card_id": f"card-{i % 5}",
+            "card_name": "基准卡",
+            "card_bank": "招商银行",
+            "card_number": "1234",
+            "swipe_type_id": f"swipe-{i % 3}",
+            "swipe_type_name": "刷卡",
+            "consumption_type_id": f"type-{i % 8}",
+            "consumption_type_name": "餐饮",
+            "amount": 100.0 + i,
+            "description": "基准测试记录",
+            "trade_date": now - timedelta(minutes=i),
+            "record_type": "支付",
+            "status": "部分还",
+            "repayment_refs": [
+                {"repayment_id": str(uuid.uuid4()), "amount": 10.0},
+                {"repayment_id": str(uuid.uuid4()), "amount": 20.0}
+            ],
+            "repaid_amount": 30.0,
+            "outstanding_amount": 70.0 + i,
+            "applied_amount": 0.0,
+            "is_active": True,
+            "created_at": now,
+            "updated_at": now
+        })
+    return documents
+
+def validated(document):
+    """原有读取路径：复制 _id 后完整校验"""
+    if "_id" in document and "id" not in document:
+        document["id"] = document["_id"]
+    return Record(**document)
+
+def trusted(document):
+    """信任构造路径"""
+    return Record.from_document(document, trusted=True)
+
+def bench(name: str, build, rows: int, rounds: int) -> float:
+    best = None
+    for _ in range(rounds):
+        # 每轮使用新文档，避免原地修改影响结果
+        documents = make_documents(rows)
+        start = time.perf_counter()
+        for document in documents:
+            build(document)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{name:<10} {rows} 条: 最佳 {best * 1000:.1f} ms，单条 {best / rows * 1e6:.2f} us")
+    return best
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="对比记录模型的校验构造与信任构造耗时")
+    parser.add_argument("--rows", type=int, default=10000, help="每轮构造的记录数")
+    parser.add_argument("--rounds", type=int, default=5, help="轮数，取最佳值")
+    args = parser.parse_args()
+    slow = bench("validated", validated, args.rows, args.rounds)
+    fast = bench("trusted", trusted, args.rows, args.rounds)
+    print(f"加速比: {slow / fast:.1f}x")
@@ -0,0 +1,65 @@
+"""
+响应序列化基准
+以 500 条记录的 /record/list 返回值为负载，对比：
+- 原有路径：jsonable_encoder → JSONResponse → 中间件 json.loads 解析后包装再 JSONResponse 编码
+- 现有路径：ApiResponse 使用 orjson 直接序列化模型并包装
+不连接数据库，使用内存中模拟的文档
+
+用法:
+    python -m app.scripts.bench_response [--rows 500] [--rounds 200]
+"""
+import argparse
+import json
+import time
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from app.middlewares.api_response import ApiResponse
+from app.services.mongodb.models.record import Record
+from app.scripts.bench_hydration import make_documents
+
+def make_payload(rows: int):
+    """与 /record/list 相同结构的返回值（信任构造的记录模型）"""
+    records = [Record.from_document(document, trusted=True) for document in make_documents(rows)]
+    return {
+        "list": records,
+        "total": rows,
+        "page": 1,
+        "page_size": rows,
+        "total_pages": 1,
+        "next_cursor": None
+    }
+
+def legacy(payload) -> bytes:
+    """原有路径：FastAPI 编码 + 中间件解析后重新编码"""
+    body = JSONResponse(content=jsonable_encoder(payload)).body
+    data = json.loads(body)
+    return JSONResponse(content={"errcode": 0, "ret": data}).body
+
+def current(payload) -> bytes:
+    """现有路径：序列化时直接包装"""
+    return ApiResponse(payload).body
+
+def bench(name: str, render, payload, rounds: int) -> float:
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        render(payload)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{name:<8} 最佳 {best * 1000:.2f} ms")
+    return best
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="对比响应序列化的原有路径与 orjson 路径耗时")
+    parser.add_argument("--rows", type=int, default=500, help="记录条数")
+    parser.add_argument("--rounds", type=int, default=200, help="轮数，取最佳值")
+    args = parser.parse_args()
+    payload = make_payload(args.rows)
+
+    # 两条路径的输出应一致
+    if json.loads(legacy(payload)) != json.loads(current(payload)):
+        raise SystemExit("两种序列化结果不一致")
+
+    slow = bench("legacy", legacy, payload, args.rounds)
+    fast = bench("orjson", current, payload, args.rounds)
+    print(f"{args.rows} 条记录，加速比: {slow / fast:.1f}x")
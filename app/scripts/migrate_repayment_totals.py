@@ -0,0 +1,64 @@
+"""
+一次性迁移：回填记录的已还/未还/已分配金额
+- 支付：repaid_amount = repayment_refs 金额之和，outstanding_amount = max(amount - repaid_amount, 0)
+- 还款：applied_amount = 所有支付记录中引用该还款的分配金额之和
+
+用法:
+    python -m app.scripts.migrate_repayment_totals
+"""
+import asyncio
+from app.services.mongodb import mongodb_client
+from app.services.mongodb.models.record import Record
+from app.utils import get_logger
+
+logger = get_logger()
+
+async def migrate_payments() -> int:
+    """回填支付记录的已还/未还金额"""
+    return await Record.update_many(
+        {"record_type": "支付"},
+        [
+            {"$set": {"repaid_amount": {"$sum": {"$map": {
+                "input": {"$ifNull": ["$repayment_refs", []]},
+                "as": "r",
+                "in": {"$ifNull": ["$$r.amount", 0]}
+            }}}}},
+            {"$set": {"outstanding_amount": {"$max": [{"$subtract": ["$amount", "$repaid_amount"]}, 0]}}}
+        ]
+    )
+
+async def migrate_repayments() -> int:
+    """回填还款记录的已分配金额"""
+    # 先全部置零（没有被引用的还款保持为0）
+    modified = await Record.update_many(
+        {"record_type": "还款"},
+        {"$set": {"applied_amount": 0.0, "repaid_amount": 0.0, "outstanding_amount": 0.0}}
+    )
+    # 再按支付记录中的引用汇总，合并写回还款记录
+    await Record.aggregate([
+        {"$match": {"record_type": "支付", "is_active": True, "repayment_refs.0": {"$exists": True}}},
+        {"$unwind": "$repayment_refs"},
+        {"$group": {"_id": "$repayment_refs.repayment_id", "applied": {"$sum": "$repayment_refs.amount"}}},
+        {"$merge": {
+            "into": Record.Config.collection,
+            "on": "_id",
+            "whenMatched": [{"$set": {"applied_amount": "$$new.applied"}}],
+            "whenNotMatched": "discard"
+        }}
+    ])
+    return modified
+
+async def main():
+    if not await mongodb_client.initialize():
+        logger.error("MongoDB初始化失败，无法执行迁移")
+        return
+    try:
+        payments = await migrate_payments()
+        logger.info(f"支付记录已回填: {payments} 条")
+        repayments = await migrate_repayments()
+        logger.info(f"还款记录已回填: {repayments} 条")
+    finally:
+        await mongodb_client.shutdown()
+
+if __name__ == "__main__":
+    asyncio.run(main())
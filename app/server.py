@@ -5,11 +5,13 @@ from fastapi import FastAPI, APIRouter
 from fastapi.responses import FileResponse, HTMLResponse
 import app.api as api_routers
 from app.utils import get_logger
-from app.services.redis import redis_client
+from app.utils.worker_pool import password_pool
+from app.services.redis import redis_client, invalidation_bus
 from app.services.mongodb import mongodb_client
+from app.services.mongodb.indexes import start_index_sync, stop_index_sync
 from app.services.scheduler import init_scheduler, shutdown_scheduler
 
-from app.middlewares import SessionMiddleware, ApiResponseMiddleware
+from app.middlewares import SessionMiddleware, ApiResponse, register_exception_handlers, DbMonitorMiddleware
 
 logger = get_logger()
 
@@ -20,11 +22,15 @@ async def lifespan(app: FastAPI):
     # 初始化Redis连接
     if await redis_client.initialize():
         logger.info("Redis初始化成功")
+        # 订阅跨进程缓存失效消息
+        invalidation_bus.start()
     else:
         logger.error("Redis初始化失败")
     # 初始化MongoDB连接
-    if mongodb_client.initialize():
+    if await mongodb_client.initialize():
         logger.info("MongoDB初始化成功")
+        # 后台同步索引，不阻塞启动
+        start_index_sync()
     else:
         logger.error("MongoDB初始化失败")
     # 初始化定时任务调度器
@@ -39,21 +45,30 @@ async def lifespan(app: FastAPI):
     logger.info("正在关闭应用...")
     # 关闭定时任务调度器
     await shutdown_scheduler()
+    # 停止缓存失效订阅
+    await invalidation_bus.stop()
     # 关闭Redis连接
     await redis_client.shutdown()
+    # 取消未完成的索引同步
+    await stop_index_sync()
     # 关闭MongoDB连接
-    mongodb_client.shutdown()
+    await mongodb_client.shutdown()
+    # 关闭密码哈希线程池
+    password_pool.shutdown()
 
 # Create FastAPI app with lifespan
 app = FastAPI(lifespan=lifespan)
+# 异常统一返回 {"errcode": 错误码, "errmsg": 错误信息}
+register_exception_handlers(app)
 
+# 中间件按添加顺序的逆序包裹：后添加的在外层，执行顺序为 DbMonitor → Session → 路由
 # 添加会话中间件 - 所有路由都会经过这个中间件
 app.add_middleware(SessionMiddleware)
-# 添加响应中间件 - 统一处理API返回格式, 只拦截/api开头的路由
-app.add_middleware(ApiResponseMiddleware)
+# 添加数据库命令监控中间件 - 最外层，按路由归类统计命令，会话读取也计入请求预算
+app.add_middleware(DbMonitorMiddleware)
 
-# 创建api路由并设置前缀
-api_router = APIRouter(prefix="/api")
+# 创建api路由并设置前缀，/api 路由的返回值在序列化时统一包装为 {"errcode": 0, "ret": ...}
+api_router = APIRouter(prefix="/api", default_response_class=ApiResponse)
 # 添加api路由
 # 简化路由添加，通过循环自动添加所有路由
 for router_name in api_routers.__all__:
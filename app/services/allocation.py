@@ -0,0 +1,365 @@
+"""
+还款分配引擎
+同一 用户 × 信用卡 × 刷卡类型 构成一个账本：
+- 新增还款按交易时间先后（FIFO）分配到未还/部分还的支付记录
+- 新增支付按交易时间先后消耗未还/部分还（尚未分配完）的还款记录
+分配在内存中一次算完，连同新记录本身以一次有序 bulk_write 写入；
+读取与写入在账本锁内完成，避免并发写入重复分配同一笔未还记录
+
+记录的金额/账本/交易时间/有效状态变化后，只撤销受影响账本上该交易时间之后（后缀）
+涉及的分配，再按交易时间顺序对后缀重放 FIFO 分配；记录的读取、写入与重放在同一组账本锁内完成
+"""
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from app.services.mongodb.models.record import Record, RepaymentRef, OUTSTANDING_STATUSES
+from app.utils import get_logger
+from app.utils.dynamic_redis_lock import create_ledger_lock
+
+logger = get_logger()
+
+def allocation_status(allocated: float, total: float) -> str:
+    """根据已分配金额计算状态：已还/部分还/未还"""
+    if allocated >= total:
+        return "已还"
+    return "部分还" if allocated > 0 else "未还"
+
+def ledger_filter(user_id: str, card_id: str, swipe_type_id: Optional[str]) -> dict:
+    """账本查询条件"""
+    return {
+        "user_id": user_id,
+        "card_id": card_id,
+        "swipe_type_id": swipe_type_id,
+        "is_active": True
+    }
+
+def _remaining(record: Record) -> float:
+    """记录尚可参与分配的金额"""
+    if record.record_type == "支付":
+        return record.outstanding_amount
+    return max(record.amount - record.applied_amount, 0.0)
+
+async def allocate_new_record(record: Record) -> List[Tuple[Optional[Record], Record]]:
+    """为新记录执行 FIFO 分配并写入
+
+    Args:
+        record: 尚未保存的新记录（支付或还款），分配结果直接写回该对象
+
+    Returns:
+        本次写入涉及的记录变更列表 [(变更前, 变更后)]，新记录的变更前为 None
+    """
+    async with create_ledger_lock(record.user_id, record.card_id, record.swipe_type_id):
+        return await _allocate_new_record(record)
+
+async def _allocate_new_record(record: Record) -> List[Tuple[Optional[Record], Record]]:
+    """在账本锁内执行分配与写入"""
+    is_repayment = record.record_type == "还款"
+    counters = await Record.find_many(
+        filter={
+            **ledger_filter(record.user_id, record.card_id, record.swipe_type_id),
+            "record_type": "支付" if is_repayment else "还款",
+            "status": {"$in": OUTSTANDING_STATUSES}
+        },
+        sort=[("trade_date", 1)]
+    )
+
+    now = datetime.now().astimezone()
+    changes: List[Tuple[Optional[Record], Record]] = []
+    # 新记录先插入，再应用对方记录的更新；新记录在执行时按最终分配结果序列化
+    bulk = Record.bulk(ordered=True)
+    bulk.insert(record)
+    remaining = record.amount
+    allocated_total = 0.0
+
+    for counter in counters:
+        if remaining <= 0:
+            break
+        capacity = _remaining(counter)
+        if capacity <= 0:
+            if not is_repayment:
+                # 已完全分配的还款，状态应为已还（兜底修正）
+                bulk.update(
+                    {"_id": counter.id, "user_id": record.user_id},
+                    {"$set": {"status": "已还"}}
+                )
+            continue
+
+        applied = min(capacity, remaining)
+        remaining -= applied
+        allocated_total += applied
+
+        if is_repayment:
+            # 支付记录：追加还款引用，同步已还/未还金额并更新状态
+            repaid = counter.repaid_amount + applied
+            status = allocation_status(repaid, counter.amount)
+            bulk.update(
+                {"_id": counter.id, "user_id": record.user_id},
+                {
+                    "$push": {"repayment_refs": {"repayment_id": record.id, "amount": applied}},
+                    "$inc": {"repaid_amount": applied, "outstanding_amount": -applied},
+                    "$set": {"status": status}
+                }
+            )
+            changes.append((counter, counter.copy(update={
+                "repayment_refs": list(counter.repayment_refs or []) + [RepaymentRef(repayment_id=record.id, amount=applied)],
+                "repaid_amount": repaid,
+                "outstanding_amount": counter.outstanding_amount - applied,
+                "status": status
+            })))
+        else:
+            # 还款记录：累加已分配金额并更新状态；引用记在新支付记录上
+            applied_amount = counter.applied_amount + applied
+            status = allocation_status(applied_amount, counter.amount)
+            bulk.update(
+                {"_id": counter.id, "user_id": record.user_id},
+                {
+                    "$inc": {"applied_amount": applied},
+                    "$set": {"status": status}
+                }
+            )
+            changes.append((counter, counter.copy(update={
+                "applied_amount": applied_amount,
+                "status": status
+            })))
+            record.repayment_refs.append(RepaymentRef(repayment_id=counter.id, amount=applied))
+
+    # 新记录的分配结果
+    if is_repayment:
+        record.applied_amount = allocated_total
+    else:
+        record.repaid_amount = allocated_total
+        record.outstanding_amount = max(record.amount - allocated_total, 0.0)
+    record.status = allocation_status(allocated_total, record.amount)
+
+    await bulk.execute(now)
+
+    changes.append((None, record))
+    return changes
+
+# 分配相关字段
+ALLOCATION_FIELDS = ["repayment_refs", "repaid_amount", "outstanding_amount", "applied_amount", "status"]
+
+# 影响分配结果的记录字段
+REALLOCATION_TRIGGER_FIELDS = ["amount", "card_id", "swipe_type_id", "trade_date", "is_active"]
+
+def _reset_allocation(record: Record):
+    """清空记录的分配结果"""
+    record.repayment_refs = []
+    record.repaid_amount = 0.0
+    record.applied_amount = 0.0
+    record.outstanding_amount = record.amount if record.record_type == "支付" else 0.0
+    record.status = "未还"
+
+def _apply_allocation(payment: Record, repayment: Record, amount: float):
+    """在内存中把一笔还款金额分配给支付记录"""
+    payment.repayment_refs.append(RepaymentRef(repayment_id=repayment.id, amount=amount))
+    payment.repaid_amount += amount
+    payment.outstanding_amount = max(payment.amount - payment.repaid_amount, 0.0)
+    payment.status = allocation_status(payment.repaid_amount, payment.amount)
+    repayment.applied_amount += amount
+    repayment.status = allocation_status(repayment.applied_amount, repayment.amount)
+
+def _replay(record: Record, open_payments: List[Record], open_repayments: List[Record]):
+    """对单条记录按 FIFO 重放分配，并维护双方的未分配队列"""
+    if record.record_type == "还款":
+        counters, own = open_payments, open_repayments
+    else:
+        counters, own = open_repayments, open_payments
+    for counter in list(counters):
+        remaining = _remaining(record)
+        if remaining <= 0:
+            break
+        applied = min(_remaining(counter), remaining)
+        if record.record_type == "还款":
+            _apply_allocation(counter, record, applied)
+        else:
+            _apply_allocation(record, counter, applied)
+        if _remaining(counter) <= 0:
+            counters.remove(counter)
+    if _remaining(record) > 0:
+        own.append(record)
+
+async def _reallocate_ledger(user_id: str, card_id: str, swipe_type_id: Optional[str],
+                             since: datetime, detached: Optional[Record] = None) -> List[Tuple[Record, Record]]:
+    """撤销并重放账本上 since 之后的分配
+
+    Args:
+        since: 后缀起点，交易时间不早于该时间的记录全部重放
+        detached: 已离开该账本（删除或改到其他账本）的记录，其分配需要从账本中撤销
+
+    Returns:
+        分配结果发生变化的记录列表 [(变更前, 变更后)]
+    """
+    ledger = ledger_filter(user_id, card_id, swipe_type_id)
+    sort = [("trade_date", 1), ("created_at", 1)]
+    suffix = await Record.find_many(filter={**ledger, "trade_date": {"$gte": since}}, sort=sort)
+
+    # 需要撤销分配的记录：后缀记录 + 离开账本的记录
+    unwinding = suffix + ([detached] if detached else [])
+    unwind_ids = {r.id for r in unwinding}
+    # 撤销的支付记录释放到各还款记录上的金额
+    released = {}
+    for r in unwinding:
+        for ref in r.repayment_refs or []:
+            released[ref.repayment_id] = released.get(ref.repayment_id, 0.0) + ref.amount
+
+    # 前缀中受影响的记录：未分配完的、引用了后缀还款的支付、被后缀支付引用的还款
+    prefix = await Record.find_many(
+        filter={
+            **ledger,
+            "trade_date": {"$lt": since},
+            "$or": [
+                {"status": {"$in": OUTSTANDING_STATUSES}},
+                {"repayment_refs.repayment_id": {"$in": [r.id for r in unwinding if r.record_type == "还款"]}},
+                {"_id": {"$in": list(released)}}
+            ]
+        },
+        sort=sort
+    )
+
+    originals = {r.id: r for r in prefix + suffix}
+    working = {r.id: r.copy(deep=True) for r in prefix + suffix}
+
+    # 撤销：前缀记录去掉与后缀相关的分配，后缀记录清空
+    for r in prefix:
+        w = working[r.id]
+        if w.record_type == "支付":
+            w.repayment_refs = [ref for ref in w.repayment_refs if ref.repayment_id not in unwind_ids]
+            w.repaid_amount = sum(ref.amount for ref in w.repayment_refs)
+            w.outstanding_amount = max(w.amount - w.repaid_amount, 0.0)
+            w.status = allocation_status(w.repaid_amount, w.amount)
+        else:
+            w.applied_amount = max(w.applied_amount - released.get(w.id, 0.0), 0.0)
+            w.status = allocation_status(w.applied_amount, w.amount)
+    for r in suffix:
+        _reset_allocation(working[r.id])
+
+    # 重放：前缀中仍有余额的记录作为初始队列，后缀按交易时间依次分配
+    open_payments = [working[r.id] for r in prefix if r.record_type == "支付" and _remaining(working[r.id]) > 0]
+    open_repayments = [working[r.id] for r in prefix if r.record_type == "还款" and _remaining(working[r.id]) > 0]
+    for r in suffix:
+        _replay(working[r.id], open_payments, open_repayments)
+
+    now = datetime.now().astimezone()
+    changes: List[Tuple[Record, Record]] = []
+    bulk = Record.bulk(ordered=True)
+    targets = [(originals[rid], w) for rid, w in working.items()]
+    if detached and not detached.is_active:
+        # 已删除的记录清空分配结果；改到其他账本的记录由新账本重放
+        reset = detached.copy(deep=True)
+        _reset_allocation(reset)
+        targets.append((detached, reset))
+    for before, after in targets:
+        if all(getattr(before, f) == getattr(after, f) for f in ALLOCATION_FIELDS):
+            continue
+        after.updated_at = now
+        bulk.update(
+            {"_id": after.id, "user_id": user_id},
+            {"$set": {
+                "repayment_refs": [ref.dict() for ref in after.repayment_refs],
+                "repaid_amount": after.repaid_amount,
+                "outstanding_amount": after.outstanding_amount,
+                "applied_amount": after.applied_amount,
+                "status": after.status
+            }}
+        )
+        changes.append((before, after))
+
+    await bulk.execute(now)
+    return changes
+
+@asynccontextmanager
+async def hold_ledger_locks(user_id: str, ledgers: Iterable[Tuple[str, Optional[str]]]):
+    """持有多个账本（信用卡, 刷卡类型）的锁，按固定顺序获取，避免并发请求互相等待"""
+    ordered = sorted(set(ledgers), key=lambda ledger: (ledger[0], ledger[1] or ""))
+    locks = []
+    try:
+        for card_id, swipe_type_id in ordered:
+            lock = create_ledger_lock(user_id, card_id, swipe_type_id)
+            await lock.acquire()
+            locks.append(lock)
+        yield
+    finally:
+        for lock in reversed(locks):
+            await lock.release()
+
+async def reallocate_after_change(before: Record, after: Record, locked: bool = False) -> List[Tuple[Record, Record]]:
+    """记录更新或软删除后，增量修正受影响账本的分配
+
+    Args:
+        before: 变更前的记录
+        after: 变更后（已写入）的记录
+        locked: 调用方是否已持有变更前后账本的锁
+
+    Returns:
+        分配结果发生变化的记录列表 [(变更前, 变更后)]
+    """
+    if all(getattr(before, f) == getattr(after, f) for f in REALLOCATION_TRIGGER_FIELDS):
+        return []
+    if not locked:
+        ledgers = [(before.card_id, before.swipe_type_id), (after.card_id, after.swipe_type_id)]
+        async with hold_ledger_locks(after.user_id, ledgers):
+            return await reallocate_after_change(before, after, locked=True)
+
+    changes: List[Tuple[Record, Record]] = []
+    moved = (before.card_id, before.swipe_type_id) != (after.card_id, after.swipe_type_id)
+    if moved:
+        # 原账本撤销该记录的分配；新账本从其交易时间起重放
+        changes += await _reallocate_ledger(
+            before.user_id, before.card_id, before.swipe_type_id, before.trade_date, detached=after
+        )
+        if after.is_active:
+            changes += await _reallocate_ledger(
+                after.user_id, after.card_id, after.swipe_type_id, after.trade_date
+            )
+    else:
+        since = min(before.trade_date, after.trade_date)
+        changes += await _reallocate_ledger(
+            after.user_id, after.card_id, after.swipe_type_id, since,
+            detached=None if after.is_active else after
+        )
+    return changes
+
+# 记录所在账本被并发改动时的最大重试次数
+UPDATE_RETRIES = 3
+
+async def update_record(user_id: str, record_id: str,
+                        build_update: Callable[[Record], Dict]) -> Optional[Tuple[Record, List[Tuple[Record, Record]]]]:
+    """在账本锁内读取记录、写入更新并重放受影响账本的分配
+
+    Args:
+        build_update: 根据锁内读取的最新记录生成 $set 字段（可依赖已还金额等分配结果）
+
+    Returns:
+        (更新后的记录, 变更列表 [(变更前, 变更后)])；记录不存在时返回 None
+    """
+    for _ in range(UPDATE_RETRIES):
+        record = await Record.find_one({"_id": record_id, "user_id": user_id})
+        if record is None:
+            return None
+        # 锁外先读一次，确定变更前后涉及的账本
+        update_fields = build_update(record)
+        ledgers = [
+            (record.card_id, record.swipe_type_id),
+            (update_fields.get("card_id", record.card_id), update_fields.get("swipe_type_id", record.swipe_type_id))
+        ]
+        async with hold_ledger_locks(user_id, ledgers):
+            current = await Record.find_one({"_id": record_id, "user_id": user_id})
+            if current is None:
+                return None
+            if (current.card_id, current.swipe_type_id) != (record.card_id, record.swipe_type_id):
+                # 记录在获取锁前被并发移到其他账本，按最新账本重试
+                continue
+            update_fields = build_update(current)
+            if not update_fields:
+                return current, []
+            updated = await Record.find_one_and_update(
+                {"_id": record_id, "user_id": user_id},
+                {"$set": update_fields}
+            )
+            if updated is None:
+                return None
+            changes = [(current, updated)]
+            changes += await reallocate_after_change(current, updated, locked=True)
+            return updated, changes
+    raise RuntimeError(f"记录所在账本并发变更，更新失败: {record_id}")
@@ -0,0 +1,218 @@
+"""
+首页看板查询引擎
+- 将看板所需的各项统计合并为一个 $facet 聚合，只扫描一次用户的记录集合
+- 聚合结果物化为每个用户一份的看板快照，记录变更时按增量更新，定时全量重建修正误差
+- 本月账单/本月待还读取当月的月度汇总行
+- 增量更新与全量重建在同一用户的看板锁内进行，重建期间的增量等待重建完成后再应用
+"""
+import asyncio
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+from app.services.mongodb.models.record import Record, OUTSTANDING_STATUSES, OUTSTANDING_EXPR
+from app.services.mongodb.models.dashboard_snapshot import DashboardSnapshot
+from app.services.rollup import sum_monthly_by_card
+from app.utils import get_logger, event_manager, EVENTS, to_month_key
+from app.utils.dynamic_redis_lock import create_dashboard_lock
+
+logger = get_logger()
+
+def build_dashboard_pipeline(user_id: str) -> List[Dict]:
+    """构建看板快照的单次 $facet 聚合管道"""
+    is_payment = {"$eq": ["$record_type", "支付"]}
+    return [
+        {"$match": {"user_id": user_id, "is_active": True}},
+        # 公共投影：每条记录只计算一次未还金额
+        {"$project": {
+            "_id": 0,
+            "amount": 1, "card_id": 1, "swipe_type_id": 1, "swipe_type_name": 1,
+            "record_type": 1,
+            "is_payment": is_payment,
+            "is_open": {"$and": [is_payment, {"$in": ["$status", OUTSTANDING_STATUSES]}]},
+            "outstanding": OUTSTANDING_EXPR
+        }},
+        {"$facet": {
+            # 全局占用（未还/部分还），按卡+刷卡类型
+            "outstanding": [
+                {"$match": {"is_open": True}},
+                {"$group": {
+                    "_id": {"card_id": "$card_id", "swipe_type_id": "$swipe_type_id"},
+                    "card_id": {"$first": "$card_id"},
+                    "name": {"$first": "$swipe_type_name"},
+                    "total_outstanding": {"$sum": "$outstanding"}
+                }}
+            ],
+            # 消费分析（跨卡），按刷卡类型
+            "swipe_types": [
+                {"$match": {"is_payment": True}},
+                {"$group": {
+                    "_id": "$swipe_type_id",
+                    "name": {"$first": "$swipe_type_name"},
+                    "total_amount": {"$sum": "$amount"}
+                }}
+            ],
+            # 类型统计（全量）
+            "record_types": [
+                {"$group": {"_id": "$record_type", "total_amount": {"$sum": "$amount"}}}
+            ]
+        }}
+    ]
+
+def _swipe_key(swipe_type_id: Optional[str]) -> str:
+    """刷卡类型ID作为快照字段名（缺失时使用 none）"""
+    return swipe_type_id or "none"
+
+def _snapshot_contribution(record: Optional[Record]) -> Dict[str, float]:
+    """单条记录对快照各计数字段的贡献"""
+    if record is None or not record.is_active:
+        return {}
+    contribution = {f"type_totals.{record.record_type}": record.amount}
+    if record.record_type == "支付":
+        sid = _swipe_key(record.swipe_type_id)
+        contribution[f"swipe_totals.{sid}"] = record.amount
+        if record.status in OUTSTANDING_STATUSES:
+            contribution[f"outstanding.{record.card_id}.{sid}"] = record.get_outstanding()
+    return contribution
+
+def compute_snapshot_delta(changes: List[Tuple[Optional[Record], Optional[Record]]]) -> Dict[str, float]:
+    """根据记录变更前后的状态计算快照增量"""
+    delta: Dict[str, float] = {}
+    for before, after in changes:
+        for path, value in _snapshot_contribution(after).items():
+            delta[path] = delta.get(path, 0.0) + value
+        for path, value in _snapshot_contribution(before).items():
+            delta[path] = delta.get(path, 0.0) - value
+    return {path: value for path, value in delta.items() if value != 0}
+
+@event_manager.on(EVENTS.RECORD_CHANGED)
+async def apply_snapshot_delta(user_id: str, changes: List[Tuple[Optional[Record], Optional[Record]]]):
+    """记录变更后按增量更新看板快照
+
+    仅当快照已存在时生效；快照缺失时由下一次读取全量重建。
+    增量写入失败（如等待重建超时）时删除快照，由下一次读取全量重建，不保留缺少增量的快照
+    """
+    try:
+        delta = compute_snapshot_delta(changes)
+        names = {
+            f"swipe_names.{_swipe_key(after.swipe_type_id)}": after.swipe_type_name
+            for _, after in changes
+            if after is not None and after.swipe_type_name
+        }
+        if not delta and not names:
+            return
+        update = {}
+        if delta:
+            update["$inc"] = delta
+        if names:
+            update["$set"] = names
+        # 与重建互斥：重建读取记录到写入快照之间的增量会被覆盖或重复计入
+        async with create_dashboard_lock(user_id):
+            await DashboardSnapshot.update_one({"_id": user_id}, update)
+    except Exception as e:
+        # 快照更新失败不影响记录写入；删除快照，下一次读取时全量重建
+        logger.error(f"更新看板快照失败，删除快照待重建: user_id={user_id}, 错误: {str(e)}")
+        try:
+            await DashboardSnapshot.delete_many({"_id": user_id})
+        except Exception as delete_error:
+            logger.error(f"删除看板快照失败: user_id={user_id}, 错误: {str(delete_error)}")
+
+async def rebuild_dashboard_snapshot(user_id: str, if_missing: bool = False) -> DashboardSnapshot:
+    """以单次聚合全量重建用户的看板快照
+
+    持有该用户的看板锁并持续续期，重建期间的增量写入等待重建完成后再应用
+
+    Args:
+        if_missing: 为 True 时获取锁后快照已存在（并发读取已重建）则直接返回
+    """
+    async with create_dashboard_lock(user_id) as lock, lock.keep_alive():
+        if if_missing:
+            snapshot = await DashboardSnapshot.find_by_id(user_id)
+            if snapshot is not None:
+                return snapshot
+        return await _rebuild_dashboard_snapshot(user_id)
+
+async def _rebuild_dashboard_snapshot(user_id: str) -> DashboardSnapshot:
+    """在看板锁内聚合并写入快照"""
+    result = await Record.aggregate(build_dashboard_pipeline(user_id))
+    facet = result[0] if result else {}
+
+    snapshot = DashboardSnapshot(id=user_id, user_id=user_id)
+    for s in facet.get("outstanding") or []:
+        sid = _swipe_key(s["_id"].get("swipe_type_id"))
+        snapshot.outstanding.setdefault(s["card_id"], {})[sid] = float(s.get("total_outstanding", 0.0))
+        if s.get("name"):
+            snapshot.swipe_names[sid] = s["name"]
+    for s in facet.get("swipe_types") or []:
+        sid = _swipe_key(s["_id"])
+        snapshot.swipe_totals[sid] = float(s.get("total_amount", 0.0))
+        if s.get("name"):
+            snapshot.swipe_names[sid] = s["name"]
+    for t in facet.get("record_types") or []:
+        snapshot.type_totals[t["_id"]] = float(t.get("total_amount", 0.0))
+
+    snapshot.rebuilt_at = datetime.now().astimezone()
+    await snapshot.save()
+    return snapshot
+
+def snapshot_to_stats(snapshot: DashboardSnapshot) -> Dict[str, Any]:
+    """将快照映射为看板统计字典"""
+    used_by_card: Dict[str, float] = {}
+    used_swipe_by_card: Dict[str, List[Dict[str, Any]]] = {}
+    for cid, by_swipe in snapshot.outstanding.items():
+        for sid, amount in by_swipe.items():
+            # 增量累加后归零的项不再展示
+            if abs(amount) < 1e-6:
+                continue
+            used_by_card[cid] = used_by_card.get(cid, 0.0) + amount
+            used_swipe_by_card.setdefault(cid, []).append({
+                "name": snapshot.swipe_names.get(sid) or "未知",
+                "amount": amount
+            })
+
+    swipe_type_totals: Dict[str, float] = {}
+    for sid, amount in snapshot.swipe_totals.items():
+        name = snapshot.swipe_names.get(sid) or "未知"
+        swipe_type_totals[name] = swipe_type_totals.get(name, 0.0) + amount
+
+    type_stats = {"支付": 0.0, "还款": 0.0}
+    for rt, amount in snapshot.type_totals.items():
+        if rt in type_stats:
+            type_stats[rt] += amount
+
+    return {
+        "used_by_card": used_by_card,
+        "used_swipe_by_card": used_swipe_by_card,
+        "swipe_type_totals": swipe_type_totals,
+        "type_stats": type_stats
+    }
+
+async def _load_snapshot(user_id: str) -> DashboardSnapshot:
+    """读取看板快照，缺失时全量重建"""
+    snapshot = await DashboardSnapshot.find_by_id(user_id)
+    if snapshot is None:
+        snapshot = await rebuild_dashboard_snapshot(user_id, if_missing=True)
+    return snapshot
+
+async def get_dashboard_stats(user_id: str, start_of_month: datetime) -> Dict[str, Any]:
+    """读取看板统计：全局部分来自快照，本月部分来自月度汇总"""
+    snapshot, (monthly_bill, monthly_outstanding) = await asyncio.gather(
+        _load_snapshot(user_id),
+        sum_monthly_by_card(user_id, to_month_key(start_of_month))
+    )
+    stats = snapshot_to_stats(snapshot)
+    stats["monthly_spent_by_card"] = monthly_bill
+    stats["monthly_outstanding_by_card"] = monthly_outstanding
+    return stats
+
+async def rebuild_all_dashboard_snapshots():
+    """重建所有已存在的看板快照，修正增量累计误差
+
+    流式遍历快照，只读取用户ID，内存占用与用户数无关
+    """
+    count = 0
+    async for snapshot in DashboardSnapshot.iter_many(fields=["user_id"], as_dict=True):
+        try:
+            await rebuild_dashboard_snapshot(snapshot["user_id"])
+            count += 1
+        except Exception as e:
+            logger.error(f"重建看板快照失败: user_id={snapshot['user_id']}, 错误: {str(e)}")
+    return count
@@ -0,0 +1,106 @@
+"""
+批量写入构建器
+- 以 InsertOne/UpdateOne/ReplaceOne 累积写操作，按数量分块执行 bulk_write
+- 与 save() 一致地维护 created_at/updated_at
+"""
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple, Union
+from pymongo import InsertOne, ReplaceOne, UpdateOne
+
+# 单次 bulk_write 的默认操作数
+DEFAULT_CHUNK_SIZE = 1000
+
+class BulkWriter:
+    """模型集合上的批量写入构建器
+
+    用法:
+        bulk = Record.bulk(ordered=True)
+        bulk.insert(record)
+        bulk.update({"_id": rid}, {"$inc": {"amount": 1}})
+        result = await bulk.execute()
+
+    insert/replace 传入的模型在 execute 时才序列化，之后对模型的修改会一并写入
+    """
+
+    def __init__(self, model_cls, ordered: bool = True, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        self.model_cls = model_cls
+        self.ordered = ordered
+        self.chunk_size = chunk_size
+        self._operations: List[Tuple[str, Any]] = []
+
+    def __len__(self) -> int:
+        return len(self._operations)
+
+    def insert(self, model) -> 'BulkWriter':
+        """插入模型"""
+        self._operations.append(("insert", model))
+        return self
+
+    def replace(self, model, upsert: bool = True) -> 'BulkWriter':
+        """按ID整体替换模型（默认不存在时插入），与 save() 相同"""
+        self._operations.append(("replace", (model, upsert)))
+        return self
+
+    def update(self, filter: Dict, update: Union[Dict, List], upsert: bool = False) -> 'BulkWriter':
+        """更新单个文档，支持更新操作符或聚合管道"""
+        self._operations.append(("update", (filter, update, upsert)))
+        return self
+
+    @staticmethod
+    def _stamp_update(update: Union[Dict, List], upsert: bool, now: datetime) -> Union[Dict, List]:
+        """为更新补充 updated_at（upsert 时补充 created_at）"""
+        if isinstance(update, list):
+            # 聚合管道更新：追加一个 $set 阶段
+            stamp = {"updated_at": now}
+            if upsert:
+                stamp["created_at"] = {"$ifNull": ["$created_at", now]}
+            return update + [{"$set": stamp}]
+        update = dict(update)
+        set_fields = dict(update.get("$set") or {})
+        set_fields.setdefault("updated_at", now)
+        update["$set"] = set_fields
+        if upsert and "created_at" not in set_fields:
+            on_insert = dict(update.get("$setOnInsert") or {})
+            on_insert.setdefault("created_at", now)
+            update["$setOnInsert"] = on_insert
+        return update
+
+    def _build(self, now: datetime) -> List:
+        """生成驱动的写操作列表"""
+        requests = []
+        for kind, payload in self._operations:
+            if kind == "insert":
+                payload.updated_at = now
+                requests.append(InsertOne(payload.to_document()))
+            elif kind == "replace":
+                model, upsert = payload
+                model.updated_at = now
+                document = model.to_document()
+                document.pop("_id")
+                requests.append(ReplaceOne({"_id": model.id}, document, upsert=upsert))
+            else:
+                filter, update, upsert = payload
+                requests.append(UpdateOne(filter, self._stamp_update(update, upsert, now), upsert=upsert))
+        return requests
+
+    async def execute(self, now: Optional[datetime] = None) -> Dict[str, int]:
+        """分块执行全部写操作
+
+        有序写入时任一块出错即抛出异常，后续块不再执行
+
+        Returns:
+            汇总计数 {"inserted", "matched", "modified", "upserted", "deleted"}
+        """
+        summary = {"inserted": 0, "matched": 0, "modified": 0, "upserted": 0, "deleted": 0}
+        if not self._operations:
+            return summary
+        requests = self._build(now or datetime.now().astimezone())
+        for i in range(0, len(requests), self.chunk_size):
+            result = await self.model_cls.bulk_write(requests[i:i + self.chunk_size], ordered=self.ordered)
+            summary["inserted"] += result.inserted_count
+            summary["matched"] += result.matched_count
+            summary["modified"] += result.modified_count
+            summary["upserted"] += result.upserted_count
+            summary["deleted"] += result.deleted_count
+        self._operations = []
+        return summary
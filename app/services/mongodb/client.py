@@ -1,7 +1,5 @@
 import asyncio
-import threading
 from datetime import datetime
-import time
 # 添加兼容层，为 Python 3.11 提供 coroutine 函数，兼容motor=2.5.1
 import sys
 if sys.version_info >= (3, 11):
@@ -9,53 +7,72 @@ if sys.version_info >= (3, 11):
         asyncio.coroutine = lambda f: f
 
 from motor.motor_asyncio import AsyncIOMotorClient
-from pymongo.errors import ServerSelectionTimeoutError, ConnectionFailure
-from pymongo import MongoClient
-import pymongo
 from pymongo.monitoring import ServerListener
 from urllib.parse import quote_plus
 from app.config import config
+from app.services.mongodb.monitoring import command_monitor
 from app.utils import get_logger
 
 logger = get_logger()
 
+# 健康检查间隔（秒）
+HEALTH_CHECK_INTERVAL = 60
+# 重连退避的初始与最大间隔（秒）
+RECONNECT_MIN_DELAY = 1
+RECONNECT_MAX_DELAY = 60
+# 连续失败多少次后重建客户端（驱动本身会自动重连，重建只作为兜底）
+RECREATE_AFTER_FAILURES = 5
+
 class _MongoDBClient:
+    """
+    MongoDB客户端
+    - 每个进程只持有一个 Motor 异步客户端（一个连接池）
+    - 健康检查运行在事件循环的后台任务中，失败后按指数退避重试，被监听器唤醒时也不绕过退避
+    - 驱动的监听线程只负责唤醒健康检查，不执行任何阻塞操作
+    """
     def __init__(self):
         self.mongodb_config = config["mongodb"]
-        self.client = None
         self.async_client = None
-        self._reconnect_lock = threading.Lock()
-        self._health_check_thread = None
+        self.async_db = None
+        self._health_check_task = None
+        self._loop = None
+        self._wakeup = None
         self._shutting_down = False  # 添加关闭标记
         # 不再在初始化时连接和启动健康检查
         
-    def initialize(self):
+    async def initialize(self):
         """显式初始化MongoDB连接和健康检查"""
-        if self.client is None:
+        self._shutting_down = False
+        if self.async_client is None:
             self._connect()
-            
-            # 只有在首次初始化时才启动健康检查线程
-            if self._health_check_thread is None:
-                self._health_check_thread = threading.Thread(target=self._health_check_loop, daemon=True)
-                self._health_check_thread.start()
-        return self.client is not None
+        
+        # 只有在首次初始化时才启动健康检查任务
+        if self._health_check_task is None:
+            self._loop = asyncio.get_running_loop()
+            self._wakeup = asyncio.Event()
+            self._health_check_task = asyncio.create_task(self._health_check_loop())
+        return await self.ping()
     
-    def shutdown(self):
+    async def shutdown(self):
         """关闭MongoDB连接"""
         # 设置关闭标记，防止断开连接时触发重连
         self._shutting_down = True
-        if self.client:
-            logger.info("正在关闭MongoDB连接...")
-            self.client.close()
+        if self._health_check_task:
+            self._health_check_task.cancel()
+            try:
+                await self._health_check_task
+            except asyncio.CancelledError:
+                pass
+            self._health_check_task = None
         if self.async_client:
-            logger.info("正在关闭MongoDB异步连接...")
+            logger.info("正在关闭MongoDB连接...")
             self.async_client.close()
-        self.client = None
         self.async_client = None
+        self.async_db = None
         logger.info("MongoDB连接已关闭")
 
     def _connect(self):
-        """连接到MongoDB数据库"""
+        """创建异步客户端（不等待连接建立，首次操作或健康检查时连接）"""
         try:
             # 连接池配置
             max_pool_size = self.mongodb_config.get("max_pool_size", 100)
@@ -65,25 +82,10 @@ class _MongoDBClient:
             # 构建连接URI
             uri = self._build_connection_uri()
             
-            # 注册事件监听器
-            event_listener = self._get_event_listeners()
-            pymongo.monitoring.register(event_listener)
-            
             # 获取系统当前时区
             tz_info = datetime.now().astimezone().tzinfo
             
-            # 创建同步客户端（用于健康检查）
-            self.client = MongoClient(
-                uri,
-                serverSelectionTimeoutMS=5000,
-                maxPoolSize=max_pool_size,
-                minPoolSize=min_pool_size,
-                maxIdleTimeMS=max_idle_time_ms,
-                tz_aware=True,
-                tzinfo=tz_info,
-            )
-            
-            # 创建异步客户端
+            # 创建异步客户端（附带连接状态监听与命令监控）
             self.async_client = AsyncIOMotorClient(
                 uri,
                 serverSelectionTimeoutMS=5000,
@@ -92,17 +94,17 @@ class _MongoDBClient:
                 maxIdleTimeMS=max_idle_time_ms,
                 tz_aware=True,
                 tzinfo=tz_info,
+                event_listeners=[self._get_event_listeners(), command_monitor],
             )
             
             # 获取默认数据库
-            self.db = self.client[self.mongodb_config["db"]]
             self.async_db = self.async_client[self.mongodb_config["db"]]
             
-            logger.info("MongoDB连接成功")
+            logger.info("MongoDB客户端已创建")
         except Exception as e:
-            logger.error(f"MongoDB连接失败: {str(e)}")
-            self.client = None
+            logger.error(f"MongoDB客户端创建失败: {str(e)}")
             self.async_client = None
+            self.async_db = None
     
     def _build_connection_uri(self):
         """构建MongoDB连接URI"""
@@ -123,69 +125,74 @@ class _MongoDBClient:
             def __init__(self, client_instance):
                 self.client_instance = client_instance
                 
-            def server_closed(self, event):
-                logger.warning(f"MongoDB服务器连接关闭: {event.server_address}")
-                self.client_instance._handle_connection_failure()
-                
-            def description_changed(self, event):
-                if event.new_description.error is not None:
-                    logger.warning(f"MongoDB服务器连接状态变更: {event.server_address}")
-                    self.client_instance._handle_connection_failure()
-            
             def opened(self, event):
-                # logger.info(f"MongoDB服务器连接已打开: {event.server_address}")
                 pass
                 
-            def topology_opened(self, event):
-                logger.info(f"MongoDB拓扑已打开: {event.topology_id}")
-                
-            def topology_closed(self, event):
-                logger.info(f"MongoDB拓扑已关闭: {event.topology_id}")
+            def closed(self, event):
+                if not self.client_instance._shutting_down:
+                    logger.warning(f"MongoDB服务器连接关闭: {event.server_address}")
+                    self.client_instance._request_health_check()
                 
-            def topology_description_changed(self, event):
-                logger.debug(f"MongoDB拓扑描述已更改: {event.topology_id}")
+            def description_changed(self, event):
+                if event.new_description.error is not None:
+                    logger.warning(f"MongoDB服务器连接状态变更: {event.server_address}")
+                    self.client_instance._request_health_check()
                 
         return CustomServerListener(self)
         
-    def _handle_connection_failure(self):
-        """处理连接失败事件"""
-        # 使用锁防止多线程同时重连
-        if self._reconnect_lock.acquire(blocking=False):
-            try:
-                # 检查程序是否正在主动关闭
-                if hasattr(self, '_shutting_down') and self._shutting_down:
-                    return
-                
-                if self.client:
-                    try:
-                        # 尝试ping服务器，检查连接是否真的断开
-                        self.client.admin.command('ping')
-                        return  # 连接仍然有效
-                    except (ServerSelectionTimeoutError, ConnectionFailure):
-                        logger.info("检测到MongoDB连接断开，尝试重新连接")
-                        self._connect()
-            finally:
-                self._reconnect_lock.release()
+    def _request_health_check(self):
+        """在驱动监听线程中调用：只唤醒健康检查任务，不阻塞监听线程"""
+        if self._shutting_down or self._loop is None or self._wakeup is None:
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+        except RuntimeError:
+            # 事件循环已关闭
+            pass
     
-    def _health_check_loop(self):
-        """后台线程定期检查连接状态"""
-        while True:
+    async def _health_check_loop(self):
+        """后台任务定期检查连接状态，失败时按指数退避重试"""
+        loop = asyncio.get_running_loop()
+        failures = 0
+        delay = HEALTH_CHECK_INTERVAL
+        last_probe = loop.time()
+        while not self._shutting_down:
+            # 等待下一次检查，或被监听器提前唤醒
             try:
-                if self._shutting_down:
-                    break
-                    
-                if self.client:
-                    # 使用admin命令检查连接状态
-                    self.client.admin.command('ping')
-                else:
-                    self._connect()
-            except Exception as e:
-                logger.warning(f"MongoDB健康检查失败，尝试重新连接: {str(e)}")
-                if not self._shutting_down:
-                    self._connect()
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(last_probe + delay - loop.time(), 0))
+            except asyncio.TimeoutError:
+                pass
+            else:
+                # 被唤醒时仍需等满距上次检查的间隔（失败后为退避间隔，正常时为最小间隔），
+                # 服务器反复抖动时监听事件不会绕过退避；等待期间的唤醒合并为一次检查
+                min_gap = delay if failures else RECONNECT_MIN_DELAY
+                remaining = last_probe + min_gap - loop.time()
+                if remaining > 0:
+                    await asyncio.sleep(remaining)
+            self._wakeup.clear()
+            if self._shutting_down:
+                break
+            
+            if self.async_client is None:
+                self._connect()
+            last_probe = loop.time()
+            if await self.ping():
+                if failures:
+                    logger.info("MongoDB连接已恢复")
+                failures = 0
+                delay = HEALTH_CHECK_INTERVAL
+                continue
             
-            # 每60秒检查一次
-            time.sleep(60)
+            failures += 1
+            delay = min(RECONNECT_MIN_DELAY * 2 ** (failures - 1), RECONNECT_MAX_DELAY)
+            logger.warning(f"MongoDB健康检查失败（连续 {failures} 次），{delay} 秒后重试")
+            if failures % RECREATE_AFTER_FAILURES == 0:
+                # 驱动长时间无法恢复时重建客户端
+                logger.warning("MongoDB长时间不可用，重建客户端")
+                old_client = self.async_client
+                self._connect()
+                if old_client is not None and old_client is not self.async_client:
+                    old_client.close()
     
     async def ping(self):
         """异步检查连接状态"""
@@ -197,12 +204,6 @@ class _MongoDBClient:
         except Exception:
             return False
     
-    def get_collection(self, collection_name):
-        """获取同步集合对象"""
-        if not self.client:
-            self._connect()
-        return self.db[collection_name]
-    
     def get_async_collection(self, collection_name):
         """获取异步集合对象"""
         if not self.async_client:
@@ -225,5 +226,4 @@ class MongoDBProxy:
 # 创建实例但不立即初始化连接
 mongodb_client = _MongoDBClient()
 # 创建代理对象
-db = MongoDBProxy(lambda: mongodb_client.db)
 async_db = MongoDBProxy(lambda: mongodb_client.async_db)
\ No newline at end of file
@@ -0,0 +1,170 @@
+"""
+索引声明与同步
+- 规范化模型 Config.indexes 中的索引声明（单字段、复合、唯一、部分索引）
+- 启动时对比声明与线上集合的索引，在后台创建缺失的索引
+- 报告未声明的索引、声明与线上选项不一致的索引，以及自统计开始后从未使用的索引
+  （只报告，不自动删除）
+"""
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple
+from app.utils import get_logger
+
+logger = get_logger()
+
+# 参与对比的索引选项
+INDEX_OPTIONS = ["unique", "sparse", "partialFilterExpression", "expireAfterSeconds"]
+
+def normalize_index(index: Any) -> Dict[str, Any]:
+    """将一项索引声明规范化为 {"keys": [(字段, 方向), ...], "name": 名称, "options": {...}}
+
+    支持：
+        "field"                                   单字段升序
+        ("field", 1)                              单字段指定方向
+        ("field_a", "field_b", ...)               复合索引，各字段升序
+        [("field_a", 1), ("field_b", -1)]         复合索引
+        {"keys": <以上任一形式>, "unique": True,
+         "partialFilterExpression": {...}, "name": "..."}  带选项的索引
+    """
+    options: Dict[str, Any] = {}
+    name = None
+    if isinstance(index, dict):
+        options = {key: value for key, value in index.items() if key in INDEX_OPTIONS}
+        name = index.get("name")
+        index = index["keys"]
+
+    if isinstance(index, str):
+        keys = [(index, 1)]
+    elif isinstance(index, tuple):
+        if len(index) == 2 and isinstance(index[1], int):
+            keys = [(index[0], index[1])]
+        else:
+            keys = [(field, 1) for field in index]
+    elif isinstance(index, list):
+        keys = [(field, direction) for field, direction in index]
+    else:
+        raise ValueError(f"无法识别的索引声明: {index!r}")
+
+    return {
+        "keys": keys,
+        "name": name or "_".join(f"{field}_{direction}" for field, direction in keys),
+        "options": options
+    }
+
+def _live_options(info: Dict[str, Any]) -> Dict[str, Any]:
+    """线上索引的选项"""
+    return {key: info[key] for key in INDEX_OPTIONS if key in info}
+
+def diff_indexes(declared: List[Dict[str, Any]], live: Dict[str, Dict[str, Any]]
+                 ) -> Tuple[List[Dict[str, Any]], List[Tuple[Dict[str, Any], str]], List[str]]:
+    """对比声明与线上索引（按键与方向匹配，与名称无关）
+
+    Args:
+        declared: normalize_index 的结果列表
+        live: collection.index_information() 的结果
+
+    Returns:
+        (缺失的声明, [(选项不一致的声明, 线上索引名)], 未声明的线上索引名)
+    """
+    live_by_keys = {
+        tuple((field, int(direction) if isinstance(direction, (int, float)) else direction)
+              for field, direction in info["key"]): (name, info)
+        for name, info in live.items()
+    }
+    missing, conflicting, matched = [], [], set()
+    for spec in declared:
+        found = live_by_keys.get(tuple(spec["keys"]))
+        if found is None:
+            missing.append(spec)
+            continue
+        name, info = found
+        matched.add(name)
+        if _live_options(info) != spec["options"]:
+            conflicting.append((spec, name))
+    undeclared = [name for name in live if name != "_id_" and name not in matched]
+    return missing, conflicting, undeclared
+
+async def _unused_indexes(collection) -> List[str]:
+    """自 mongod 启动（或索引创建）以来从未被使用的索引"""
+    try:
+        stats = await collection.aggregate([{"$indexStats": {}}]).to_list(length=None)
+    except Exception as e:
+        logger.warning(f"读取索引使用统计失败: {collection.name}, 错误: {str(e)}")
+        return []
+    return [s["name"] for s in stats if s["name"] != "_id_" and not s.get("accesses", {}).get("ops")]
+
+async def sync_model_indexes(model_cls) -> Dict[str, Any]:
+    """同步单个模型的索引，返回同步报告"""
+    from app.services.mongodb.client import async_db
+    collection = async_db.get_collection(model_cls.Config.collection)
+    declared = [normalize_index(index) for index in (model_cls.Config.indexes or [])]
+    live = await collection.index_information()
+    missing, conflicting, undeclared = diff_indexes(declared, live)
+
+    created, failed = [], []
+    for spec in missing:
+        try:
+            await collection.create_index(spec["keys"], name=spec["name"], **spec["options"])
+            created.append(spec["name"])
+        except Exception as e:
+            failed.append(spec["name"])
+            logger.error(f"创建索引失败: {model_cls.Config.collection}.{spec['name']}, 错误: {str(e)}")
+
+    for spec, name in conflicting:
+        logger.warning(
+            f"索引选项与声明不一致，需要人工重建: {model_cls.Config.collection}.{name} "
+            f"声明={spec['options']}"
+        )
+    if undeclared:
+        logger.warning(f"存在未声明的索引: {model_cls.Config.collection} {undeclared}")
+    unused = [name for name in await _unused_indexes(collection) if name not in created]
+    if unused:
+        logger.info(f"未被使用的索引: {model_cls.Config.collection} {unused}")
+
+    return {
+        "collection": model_cls.Config.collection,
+        "created": created,
+        "failed": failed,
+        "conflicting": [name for _, name in conflicting],
+        "undeclared": undeclared,
+        "unused": unused
+    }
+
+def registered_models() -> List[type]:
+    """声明了集合的全部模型"""
+    import app.services.mongodb.models as models
+    result = []
+    for name in models.__all__:
+        model_cls = getattr(models, name)
+        if getattr(model_cls.Config, "collection", None):
+            result.append(model_cls)
+    return result
+
+async def sync_all_indexes(models: Optional[List[type]] = None) -> List[Dict[str, Any]]:
+    """同步全部模型的索引，单个集合失败不影响其他集合"""
+    reports = []
+    for model_cls in models or registered_models():
+        try:
+            reports.append(await sync_model_indexes(model_cls))
+        except Exception as e:
+            logger.error(f"同步索引失败: {model_cls.Config.collection}, 错误: {str(e)}")
+    created = sum(len(report["created"]) for report in reports)
+    logger.info(f"索引同步完成: {len(reports)} 个集合，新建 {created} 个索引")
+    return reports
+
+_sync_task: Optional[asyncio.Task] = None
+
+def start_index_sync() -> asyncio.Task:
+    """在后台启动索引同步，不阻塞应用启动"""
+    global _sync_task
+    if _sync_task is None or _sync_task.done():
+        _sync_task = asyncio.create_task(sync_all_indexes())
+    return _sync_task
+
+async def stop_index_sync():
+    """取消尚未完成的索引同步"""
+    if _sync_task is not None and not _sync_task.done():
+        _sync_task.cancel()
+        try:
+            await _sync_task
+        except asyncio.CancelledError:
+            pass
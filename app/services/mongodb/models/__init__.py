@@ -1,17 +1,23 @@
 from app.services.mongodb.models.base_model import MongoBaseModel
+from app.services.mongodb.models.cached_model import UserCachedModel
 from app.services.mongodb.models.schedule import Schedule
 from app.services.mongodb.models.user import User
 from app.services.mongodb.models.card import Card
 from app.services.mongodb.models.swipe_type import SwipeType
 from app.services.mongodb.models.consumption_type import ConsumptionType
 from app.services.mongodb.models.record import Record
+from app.services.mongodb.models.dashboard_snapshot import DashboardSnapshot
+from app.services.mongodb.models.record_rollup import RecordRollup
 
 __all__ = [
     "MongoBaseModel",
+    "UserCachedModel",
     "Schedule",
     "User",
     "Card",
     "SwipeType",
     "ConsumptionType",
     "Record",
+    "DashboardSnapshot",
+    "RecordRollup",
 ]
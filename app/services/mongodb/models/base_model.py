@@ -1,8 +1,10 @@
 from datetime import datetime
 import uuid
-from typing import ClassVar, List, Optional, Dict, Any, Type, TypeVar, Generic
+from typing import ClassVar, List, Optional, Dict, Any, Type, TypeVar, Generic, Union, AsyncIterator
 from pydantic import BaseModel, Field
 from app.services.mongodb.client import async_db
+from app.services.mongodb.bulk import BulkWriter, DEFAULT_CHUNK_SIZE
+from app.services.mongodb.indexes import sync_model_indexes
 from pymongo import ReturnDocument
 
 T = TypeVar('T', bound='MongoBaseModel')
@@ -19,12 +21,58 @@ class MongoBaseModel(BaseModel):
         collection: ClassVar[str] = None
         indexes: ClassVar[List[str]] = []
     
+    def to_document(self) -> Dict[str, Any]:
+        """转换为MongoDB文档（id映射为_id）"""
+        data = self.dict(by_alias=True)
+        data["_id"] = data.pop("id")
+        return data
+    
+    @classmethod
+    def projection(cls, fields: Optional[List[str]]) -> Optional[Dict[str, int]]:
+        """字段列表转换为MongoDB投影（id 对应 _id，始终返回）"""
+        if not fields:
+            return None
+        return {("_id" if field == "id" else field): 1 for field in fields}
+    
+    @classmethod
+    def from_document(cls: Type[T], data: Dict[str, Any], fields: Optional[List[str]] = None,
+                      as_dict: bool = False, trusted: bool = False) -> Union[T, Dict[str, Any]]:
+        """MongoDB文档转换为模型
+        
+        Args:
+            data: MongoDB文档
+            fields: 查询时使用的投影字段，指定时返回只含这些字段的部分模型（不做校验）；
+                未投影的字段不填默认值，访问时抛出 AttributeError
+            as_dict: 为 True 时直接返回字典（_id 映射为 id）
+            trusted: 为 True 时信任库中数据，跳过 pydantic 校验直接构造模型
+                （嵌套模型字段保持为字典，只适合直接序列化返回的只读场景）
+        """
+        # _id 只映射一次为 id
+        if "_id" in data:
+            _id = data.pop("_id")
+            data.setdefault("id", _id)
+        if as_dict:
+            return data
+        if fields:
+            return cls._partial(data)
+        if trusted:
+            return cls.construct(_fields_set=set(data), **data)
+        return cls(**data)
+    
+    @classmethod
+    def _partial(cls: Type[T], data: Dict[str, Any]) -> T:
+        """构造只含给定字段的部分模型（construct 会为缺失字段填默认值，这里不填）"""
+        model = cls.__new__(cls)
+        object.__setattr__(model, "__dict__", data)
+        object.__setattr__(model, "__fields_set__", set(data))
+        return model
+    
     async def save(self) -> 'MongoBaseModel':
         """异步保存文档到MongoDB"""
         self.updated_at = datetime.now().astimezone()
         collection = async_db.get_collection(self.Config.collection)
-        data = self.dict(by_alias=True)
-        data.pop("id")
+        data = self.to_document()
+        data.pop("_id")
         await collection.replace_one({"_id": self.id}, data, upsert=True)
         return self
     
@@ -35,31 +83,23 @@ class MongoBaseModel(BaseModel):
         return result.deleted_count > 0
     
     @classmethod
-    async def find_by_id(cls: Type[T], id: str) -> Optional[T]:
+    async def find_by_id(cls: Type[T], id: str, fields: Optional[List[str]] = None,
+                         as_dict: bool = False, trusted: bool = False) -> Optional[Union[T, Dict[str, Any]]]:
         """异步根据ID查找文档"""
-        collection = async_db.get_collection(cls.Config.collection)
-        data = await collection.find_one({"_id": id})
-        if data:
-            # 确保_id映射到id字段
-            if "_id" in data and "id" not in data:
-                data["id"] = data["_id"]
-            return cls(**data)
-        return None
+        return await cls.find_one({"_id": id}, fields=fields, as_dict=as_dict, trusted=trusted)
     
     @classmethod
-    async def find_one(cls: Type[T], filter: Dict) -> Optional[T]:
+    async def find_one(cls: Type[T], filter: Dict, fields: Optional[List[str]] = None,
+                       as_dict: bool = False, trusted: bool = False) -> Optional[Union[T, Dict[str, Any]]]:
         """异步查找单个文档"""
         collection = async_db.get_collection(cls.Config.collection)
-        data = await collection.find_one(filter)
+        data = await collection.find_one(filter, cls.projection(fields))
         if data:
-            # 确保_id映射到id字段
-            if "_id" in data and "id" not in data:
-                data["id"] = data["_id"]
-            return cls(**data)
+            return cls.from_document(data, fields=fields, as_dict=as_dict, trusted=trusted)
         return None
 
     @classmethod
-    async def find_one_and_update(cls: Type[T], filter: Dict, update: Dict) -> Optional[T]:
+    async def find_one_and_update(cls: Type[T], filter: Dict, update: Dict, trusted: bool = False) -> Optional[T]:
         """异步查找并更新单个文档"""
         collection = async_db.get_collection(cls.Config.collection)
         if '$set' not in update:
@@ -71,20 +111,46 @@ class MongoBaseModel(BaseModel):
             return_document=ReturnDocument.AFTER
         )
         if data:
-            # 确保_id映射到id字段
-            if "_id" in data and "id" not in data:
-                data["id"] = data["_id"]
-            return cls(**data)
+            return cls.from_document(data, trusted=trusted)
         return None
     
     @classmethod
     async def find_many(cls: Type[T], filter: Dict = None, 
                        sort: List = None, 
                        skip: int = 0, 
-                       limit: int = 0) -> List[T]:
-        """异步查找多个文档"""
+                       limit: int = 0,
+                       fields: Optional[List[str]] = None,
+                       as_dict: bool = False,
+                       trusted: bool = False) -> List[Union[T, Dict[str, Any]]]:
+        """异步查找多个文档
+        
+        Args:
+            fields: 只返回指定字段（id 始终返回）
+            as_dict: 为 True 时返回字典而不是模型
+            trusted: 为 True 时跳过校验直接构造模型，列表接口默认使用
+        """
+        return [
+            document async for document in cls.iter_many(
+                filter, sort=sort, skip=skip, limit=limit,
+                fields=fields, as_dict=as_dict, trusted=trusted, batch_size=0
+            )
+        ]
+    
+    @classmethod
+    async def iter_many(cls: Type[T], filter: Dict = None,
+                        sort: List = None,
+                        skip: int = 0,
+                        limit: int = 0,
+                        fields: Optional[List[str]] = None,
+                        as_dict: bool = False,
+                        trusted: bool = False,
+                        batch_size: int = 100) -> AsyncIterator[Union[T, Dict[str, Any]]]:
+        """异步逐条迭代查询结果，游标按 batch_size 分批拉取，内存占用与结果总量无关
+        
+        参数同 find_many；batch_size 为每次从服务端拉取的文档数，0 表示使用驱动默认值
+        """
         collection = async_db.get_collection(cls.Config.collection)
-        cursor = collection.find(filter or {})
+        cursor = collection.find(filter or {}, cls.projection(fields))
         
         if sort:
             cursor = cursor.sort(sort)
@@ -94,15 +160,12 @@ class MongoBaseModel(BaseModel):
             
         if limit:
             cursor = cursor.limit(limit)
+        
+        if batch_size:
+            cursor = cursor.batch_size(batch_size)
             
-        result = []
         async for document in cursor:
-            # 确保_id映射到id字段
-            if "_id" in document and "id" not in document:
-                document["id"] = document["_id"]
-            result.append(cls(**document))
-        
-        return result
+            yield cls.from_document(document, fields=fields, as_dict=as_dict, trusted=trusted)
     
     @classmethod
     async def count(cls, filter: Dict = None) -> int:
@@ -113,17 +176,21 @@ class MongoBaseModel(BaseModel):
     @classmethod
     async def aggregate(cls, pipeline: List[Dict]) -> List[Dict]:
         """异步执行聚合查询"""
+        return [document async for document in cls.iter_aggregate(pipeline, batch_size=0)]
+    
+    @classmethod
+    async def iter_aggregate(cls, pipeline: List[Dict], batch_size: int = 100) -> AsyncIterator[Dict]:
+        """异步逐条迭代聚合结果，游标按 batch_size 分批拉取（0 表示使用驱动默认值）"""
         collection = async_db.get_collection(cls.Config.collection)
-        result = []
-        async for document in collection.aggregate(pipeline):
-            result.append(document)
-        return result
+        options = {"batchSize": batch_size} if batch_size else {}
+        async for document in collection.aggregate(pipeline, **options):
+            yield document
     
     @classmethod
-    async def update_one(cls, filter: Dict, update: Dict) -> int:
+    async def update_one(cls, filter: Dict, update: Dict, upsert: bool = False) -> int:
         """异步更新单个文档"""
         collection = async_db.get_collection(cls.Config.collection)
-        result = await collection.update_one(filter, update)
+        result = await collection.update_one(filter, update, upsert=upsert)
         return result.modified_count
 
     @classmethod
@@ -133,6 +200,44 @@ class MongoBaseModel(BaseModel):
         result = await collection.update_many(filter, update)
         return result.modified_count
     
+    @classmethod
+    async def bulk_write(cls, requests: List, ordered: bool = True):
+        """异步批量写入（InsertOne/UpdateOne/ReplaceOne 等操作），一次往返"""
+        collection = async_db.get_collection(cls.Config.collection)
+        return await collection.bulk_write(requests, ordered=ordered)
+    
+    @classmethod
+    def bulk(cls, ordered: bool = True, chunk_size: int = DEFAULT_CHUNK_SIZE) -> BulkWriter:
+        """创建该集合的批量写入构建器"""
+        return BulkWriter(cls, ordered=ordered, chunk_size=chunk_size)
+    
+    @classmethod
+    async def insert_many(cls: Type[T], models: List[T], ordered: bool = False,
+                          chunk_size: int = DEFAULT_CHUNK_SIZE) -> int:
+        """异步批量插入模型，返回插入数量"""
+        if not models:
+            return 0
+        now = datetime.now().astimezone()
+        collection = async_db.get_collection(cls.Config.collection)
+        inserted = 0
+        for i in range(0, len(models), chunk_size):
+            documents = []
+            for model in models[i:i + chunk_size]:
+                model.updated_at = now
+                documents.append(model.to_document())
+            result = await collection.insert_many(documents, ordered=ordered)
+            inserted += len(result.inserted_ids)
+        return inserted
+    
+    @classmethod
+    async def save_many(cls: Type[T], models: List[T], ordered: bool = False,
+                        chunk_size: int = DEFAULT_CHUNK_SIZE) -> Dict[str, int]:
+        """异步批量保存模型（按ID整体替换，不存在时插入），与逐个 save() 等价"""
+        bulk = cls.bulk(ordered=ordered, chunk_size=chunk_size)
+        for model in models:
+            bulk.replace(model)
+        return await bulk.execute()
+    
     @classmethod
     async def delete_many(cls, filter: Dict) -> int:
         """异步删除多个文档"""
@@ -141,17 +246,6 @@ class MongoBaseModel(BaseModel):
         return result.deleted_count
     
     @classmethod
-    async def create_indexes(cls):
-        """异步创建索引"""
-        if not cls.Config.indexes:
-            return
-            
-        collection = async_db.get_collection(cls.Config.collection)
-        for index in cls.Config.indexes:
-            if isinstance(index, str):
-                await collection.create_index(index)
-            elif isinstance(index, tuple) and len(index) == 2:
-                field, direction = index
-                await collection.create_index([(field, direction)])
-            elif isinstance(index, list):
-                await collection.create_index(index)
\ No newline at end of file
+    async def create_indexes(cls) -> Dict[str, Any]:
+        """异步同步索引：创建 Config.indexes 中声明但集合上缺失的索引，返回同步报告"""
+        return await sync_model_indexes(cls)
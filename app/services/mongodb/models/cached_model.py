@@ -0,0 +1,186 @@
+"""
+按用户缓存的基础数据模型
+信用卡、刷卡类型、消费类型数据量小、变更少且几乎每个请求都会读取：
+- 以 user_id 为单位整体缓存该用户的全部文档
+- 读取顺序：进程内 L1（短 TTL）→ Redis 业务库 → MongoDB，未命中时回填
+- save / delete / find_one_and_update 写入后自动失效；
+  update_one / update_many / bulk 等批量写入不会失效，需调用 invalidate_cache
+- 失效消息经 Redis pub/sub 广播，其他进程收到后清除各自的进程内缓存
+- 失效时递增缓存版本号，未命中回填只在版本号与加载前一致时写入，
+  避免并发写入失效后又被加载到的旧数据覆盖
+"""
+import json
+import time
+from typing import Any, Dict, List, Optional, Tuple, Type, TypeVar
+from app.services.mongodb.models.base_model import MongoBaseModel
+from app.services.redis import business_client, invalidation_bus
+from app.utils import get_logger, event_manager, EVENTS
+from app.utils.redis_script import LuaScript
+
+logger = get_logger()
+
+T = TypeVar('T', bound='UserCachedModel')
+
+# Redis 缓存键前缀
+CACHE_PREFIX = "BB:ref:"
+# Redis 缓存有效期（秒）
+CACHE_TTL_SECONDS = 600
+# 缓存版本号有效期（秒），每次失效时重置，远长于一次回填加载的耗时
+GENERATION_TTL_SECONDS = 2 * CACHE_TTL_SECONDS
+# 进程内缓存有效期（秒）
+L1_TTL_SECONDS = 5
+
+# 回填缓存：版本号与加载前读到的一致时才写入
+# KEYS: 缓存, 版本号  ARGV: 加载前的版本号（不存在为空串）, 缓存内容, 有效期(秒)
+SET_IF_GENERATION_SCRIPT = LuaScript("""
+if (redis.call("GET", KEYS[2]) or "") ~= ARGV[1] then
+    return 0
+end
+redis.call("SET", KEYS[1], ARGV[2], "EX", ARGV[3])
+return 1
+""")
+
+# 失效缓存：递增版本号并删除缓存
+# KEYS: 缓存, 版本号  ARGV: 版本号有效期(秒)
+INVALIDATE_SCRIPT = LuaScript("""
+redis.call("INCR", KEYS[2])
+redis.call("EXPIRE", KEYS[2], ARGV[1])
+redis.call("DEL", KEYS[1])
+return 1
+""")
+
+# 进程内缓存：(集合, user_id) -> (过期时间, 模型列表)
+_l1_cache: Dict[Tuple[str, str], Tuple[float, List[Any]]] = {}
+
+def _sort_key(field: str):
+    """排序键：None 视为最小值"""
+    def key(model):
+        value = getattr(model, field, None)
+        return (False, 0) if value is None else (True, value)
+    return key
+
+def _sort_models(models: List[Any], sort: List[Tuple[str, int]]) -> List[Any]:
+    """按 [(字段, 方向)] 在内存中排序，与 MongoDB 排序结果一致"""
+    result = list(models)
+    # 稳定排序：从最后一个排序字段开始依次排序
+    for field, direction in reversed(sort):
+        result.sort(key=_sort_key(field), reverse=direction < 0)
+    return result
+
+@event_manager.on(EVENTS.CACHE_INVALIDATED)
+def evict_l1_cache(collection: Optional[str], user_id: Optional[str], id: Optional[str] = None):
+    """收到失效消息后清除进程内缓存"""
+    if collection is None:
+        _l1_cache.clear()
+    elif user_id is None:
+        for key in [key for key in _l1_cache if key[0] == collection]:
+            _l1_cache.pop(key, None)
+    else:
+        _l1_cache.pop((collection, user_id), None)
+
+class UserCachedModel(MongoBaseModel):
+    """按用户整体缓存的模型基类，要求模型包含 user_id 与 is_active 字段"""
+
+    @classmethod
+    def _cache_key(cls, user_id: str) -> str:
+        return f"{CACHE_PREFIX}{cls.Config.collection}:{user_id}"
+
+    @classmethod
+    def _generation_key(cls, user_id: str) -> str:
+        return f"{cls._cache_key(user_id)}:gen"
+
+    @classmethod
+    async def cached_all(cls: Type[T], user_id: str) -> List[T]:
+        """读取用户在该集合中的全部文档（含非激活），返回的模型为只读共享对象"""
+        l1_key = (cls.Config.collection, user_id)
+        entry = _l1_cache.get(l1_key)
+        if entry and entry[0] > time.monotonic():
+            return list(entry[1])
+
+        key = cls._cache_key(user_id)
+        generation_key = cls._generation_key(user_id)
+        models = None
+        # 读取缓存失败时不回填，避免在不知道版本号的情况下写入
+        generation = None
+        try:
+            raw, generation = await business_client.mget([key, generation_key])
+            generation = generation or ""
+            if raw:
+                models = [cls(**data) for data in json.loads(raw)]
+        except Exception as e:
+            logger.warning(f"读取基础数据缓存失败: {key}, 错误: {str(e)}")
+
+        cacheable = True
+        if models is None:
+            models = await cls.find_many({"user_id": user_id})
+            cacheable = False
+            if generation is not None:
+                try:
+                    payload = "[" + ",".join(model.json() for model in models) + "]"
+                    # 加载期间已失效时不写入，本进程也不缓存（结果可能已过期）
+                    cacheable = await SET_IF_GENERATION_SCRIPT(
+                        business_client, [key, generation_key],
+                        [generation, payload, CACHE_TTL_SECONDS]
+                    ) == 1
+                except Exception as e:
+                    logger.warning(f"写入基础数据缓存失败: {key}, 错误: {str(e)}")
+
+        if cacheable:
+            _l1_cache[l1_key] = (time.monotonic() + L1_TTL_SECONDS, models)
+        return list(models)
+
+    @classmethod
+    async def cached_find(cls: Type[T], user_id: str, is_active: Optional[bool] = None,
+                          sort: Optional[List[Tuple[str, int]]] = None) -> List[T]:
+        """从缓存中按激活状态筛选并排序"""
+        models = await cls.cached_all(user_id)
+        if is_active is not None:
+            models = [model for model in models if model.is_active == is_active]
+        if sort:
+            models = _sort_models(models, sort)
+        return models
+
+    @classmethod
+    async def cached_get(cls: Type[T], user_id: str, id: Optional[str]) -> Optional[T]:
+        """从缓存中按ID读取用户的文档"""
+        if not id:
+            return None
+        for model in await cls.cached_all(user_id):
+            if model.id == id:
+                return model
+        return None
+
+    @classmethod
+    def evict_local(cls, user_id: str):
+        """只移除本进程的缓存"""
+        _l1_cache.pop((cls.Config.collection, user_id), None)
+
+    @classmethod
+    async def invalidate_cache(cls, user_id: str, id: Optional[str] = None):
+        """移除用户在该集合上的缓存并递增版本号，通知其他进程"""
+        cls.evict_local(user_id)
+        try:
+            await INVALIDATE_SCRIPT(
+                business_client, [cls._cache_key(user_id), cls._generation_key(user_id)],
+                [GENERATION_TTL_SECONDS]
+            )
+        except Exception as e:
+            logger.warning(f"清除基础数据缓存失败: {cls._cache_key(user_id)}, 错误: {str(e)}")
+        await invalidation_bus.publish(cls.Config.collection, user_id, id)
+
+    async def save(self: T) -> T:
+        await super().save()
+        await self.invalidate_cache(self.user_id, self.id)
+        return self
+
+    async def delete(self) -> bool:
+        deleted = await super().delete()
+        await self.invalidate_cache(self.user_id, self.id)
+        return deleted
+
+    @classmethod
+    async def find_one_and_update(cls: Type[T], filter: Dict, update: Dict, trusted: bool = False) -> Optional[T]:
+        model = await super().find_one_and_update(filter, update, trusted=trusted)
+        if model is not None:
+            await cls.invalidate_cache(model.user_id, model.id)
+        return model
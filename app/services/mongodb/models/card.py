@@ -1,8 +1,8 @@
 from datetime import datetime
 from typing import Optional
-from app.services.mongodb.models import MongoBaseModel
+from app.services.mongodb.models.cached_model import UserCachedModel
 
-class Card(MongoBaseModel):
+class Card(UserCachedModel):
     """信用卡模型"""
     
     # 基本信息
@@ -27,5 +27,8 @@ class Card(MongoBaseModel):
             "user_id",
             ("user_id", "bank"),
             ("user_id", "card_number"),
-            ("user_id", "is_active")
+            ("user_id", "is_active"),
+            # 卡片列表与首页按账单日/还款日排序
+            [("user_id", 1), ("is_active", 1), ("bill_day", 1), ("created_at", -1)],
+            [("user_id", 1), ("is_active", 1), ("payment_day", 1), ("created_at", -1)],
         ]
\ No newline at end of file
@@ -0,0 +1,26 @@
+from datetime import datetime
+from typing import Dict, Optional
+from pydantic import Field
+from app.services.mongodb.models import MongoBaseModel
+
+class DashboardSnapshot(MongoBaseModel):
+    """首页看板快照模型（每个用户一份，id 即 user_id）"""
+
+    user_id: str  # 用户ID
+
+    # 全局占用：card_id -> swipe_type_id -> 未还金额
+    outstanding: Dict[str, Dict[str, float]] = Field(default_factory=dict)
+    # 刷卡类型支付合计：swipe_type_id -> 金额
+    swipe_totals: Dict[str, float] = Field(default_factory=dict)
+    # 刷卡类型名称：swipe_type_id -> 名称
+    swipe_names: Dict[str, str] = Field(default_factory=dict)
+    # 记录类型合计：支付/还款 -> 金额
+    type_totals: Dict[str, float] = Field(default_factory=dict)
+
+    rebuilt_at: Optional[datetime] = None  # 最近一次全量重建时间
+
+    class Config:
+        collection = "dashboard_snapshots"
+        indexes = [
+            "user_id"
+        ]
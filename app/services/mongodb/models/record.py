@@ -4,6 +4,12 @@ from typing import Optional, List
 from pydantic import Field, BaseModel
 from app.services.mongodb.models import MongoBaseModel
 
+# 计入占用的支付状态
+OUTSTANDING_STATUSES = ["未还", "部分还"]
+
+# 聚合管道中支付记录的未还金额（与 Record.get_outstanding 口径一致）
+OUTSTANDING_EXPR = {"$ifNull": ["$outstanding_amount", 0]}
+
 class RepaymentRef(BaseModel):
     repayment_id: str  # 关联还款记录ID
     amount: float      # 该还款分配金额
@@ -34,9 +40,20 @@ class Record(MongoBaseModel):
     status: Optional[str] = None  # 状态：未还/已还/部分还（支付表示还款状态，还款表示分配状态）
     repayment_refs: List[RepaymentRef] = Field(default_factory=list)  # 支付记录的关联还款明细
     
+    # 分配汇总（随 repayment_refs 的每次 $push 原子维护）
+    repaid_amount: float = 0.0  # 支付：已还金额，等于 repayment_refs 金额之和
+    outstanding_amount: float = 0.0  # 支付：未还金额，等于 max(amount - repaid_amount, 0)
+    applied_amount: float = 0.0  # 还款：已分配到支付记录的金额
+    
     # 状态
     is_active: bool = True  # 是否有效
     
+    def get_outstanding(self) -> float:
+        """支付记录的未还金额，还款记录视为0"""
+        if self.record_type != "支付":
+            return 0.0
+        return self.outstanding_amount
+    
     class Config:
         collection = "records"
         indexes = [
@@ -52,4 +69,16 @@ class Record(MongoBaseModel):
             "status",
             ("user_id", "record_type"),
             ("user_id", "status"),
+            # 列表游标分页：按交易时间倒序，_id 作为同一时间内的次序
+            [("user_id", 1), ("is_active", 1), ("trade_date", -1), ("_id", -1)],
+            # 列表按信用卡筛选
+            [("user_id", 1), ("is_active", 1), ("card_id", 1), ("trade_date", -1), ("_id", -1)],
+            # 分配引擎：账本内未还/部分还的对方记录，按交易时间 FIFO
+            [("user_id", 1), ("card_id", 1), ("swipe_type_id", 1), ("is_active", 1),
+             ("record_type", 1), ("status", 1), ("trade_date", 1)],
+            # 账本后缀重放与最近消费：账本内按交易时间顺序
+            [("user_id", 1), ("card_id", 1), ("swipe_type_id", 1), ("is_active", 1),
+             ("trade_date", 1), ("created_at", 1)],
+            # 账本重放：查找引用了指定还款的支付记录
+            [("user_id", 1), ("repayment_refs.repayment_id", 1)],
         ]
\ No newline at end of file
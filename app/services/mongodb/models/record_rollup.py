@@ -0,0 +1,34 @@
+from datetime import datetime
+from typing import Optional
+from pydantic import Field
+from app.services.mongodb.models import MongoBaseModel
+
+class RecordRollup(MongoBaseModel):
+    """记录月度汇总模型
+
+    按 用户 × 信用卡 × 刷卡类型 × 消费类型 × 月份 × 记录类型 汇总，
+    id 由上述维度拼接而成，记录写入时以 $inc 增量维护
+    """
+
+    # 汇总维度
+    user_id: str  # 用户ID
+    card_id: str  # 信用卡ID
+    swipe_type_id: Optional[str] = None  # 刷卡类型ID
+    consumption_type_id: Optional[str] = None  # 消费类型ID
+    month: str  # 自然月 YYYY-MM
+    record_type: str  # 记录类型：支付/还款
+
+    # 汇总值
+    amount: float = 0.0  # 金额合计
+    # 记录数；文档字段为 count，模型属性改名以免遮蔽 MongoBaseModel.count
+    record_count: int = Field(0, alias="count")
+    outstanding: float = 0.0  # 未还金额合计（仅支付）
+
+    rebuilt_at: Optional[datetime] = None  # 最近一次回填时间
+
+    class Config:
+        collection = "record_rollups"
+        indexes = [
+            [("user_id", 1), ("month", 1)],
+            [("user_id", 1), ("card_id", 1), ("month", 1)],
+        ]
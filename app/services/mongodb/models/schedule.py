@@ -13,5 +13,6 @@ class Schedule(MongoBaseModel):
     class Config:
         collection = "schedules"
         indexes = [
-            "task_name"
+            # 任务锁依赖每个任务只有一条记录
+            {"keys": "task_name", "unique": True}
         ]
@@ -1,7 +1,7 @@
 from typing import Optional
-from app.services.mongodb.models import MongoBaseModel
+from app.services.mongodb.models.cached_model import UserCachedModel
 
-class SwipeType(MongoBaseModel):
+class SwipeType(UserCachedModel):
     """刷卡类型模型"""
     
     user_id: str  # 用户ID（支持用户自定义分类）
@@ -16,5 +16,7 @@ class SwipeType(MongoBaseModel):
             "user_id",
             ("user_id", "name"),
             ("user_id", "is_active"),
-            "sort_order"
+            "sort_order",
+            # 列表按排序值排序
+            [("user_id", 1), ("is_active", 1), ("sort_order", 1), ("created_at", 1)],
         ]
\ No newline at end of file
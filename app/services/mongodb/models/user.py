@@ -16,4 +16,7 @@ class User(MongoBaseModel):
     
     class Config:
         collection = "users"
-        indexes = []
\ No newline at end of file
+        indexes = [
+            # 登录/注册按手机号查找
+            {"keys": "mobile", "unique": True},
+        ]
\ No newline at end of file
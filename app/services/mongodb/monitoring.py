@@ -0,0 +1,223 @@
+"""
+MongoDB 命令监控
+- CommandListener 记录每条命令的耗时、命令名、集合、返回文档数与发起请求的路由
+- 按 路由 × 集合 × 命令 维护滚动窗口内的耗时直方图
+- 超过阈值的命令写入慢查询日志（只记录命令结构，不记录参数值）
+
+监听器在驱动的执行线程中同步回调；Motor 在线程池执行时会复制 contextvars，
+因此可以通过 request_scope 取到发起命令的请求
+"""
+import json
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, Optional, Tuple
+from pymongo.monitoring import CommandListener
+from app.config import config
+from app.utils import get_logger
+from app.utils.db_budget import db_usage
+
+logger = get_logger()
+
+# 当前请求的 ASGI scope，由 DbMonitorMiddleware 设置；路由匹配后 scope 中带有 route
+request_scope: ContextVar[Optional[dict]] = ContextVar("request_scope", default=None)
+
+# 直方图分桶上界（毫秒），最后一个桶为溢出桶
+HISTOGRAM_BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+# 滚动窗口：每个槽 60 秒，保留 15 个槽
+SLOT_SECONDS = 60
+WINDOW_SLOTS = 15
+# 慢查询日志中命令结构的最大长度
+MAX_SHAPE_LENGTH = 2000
+
+def route_label(scope: Optional[dict] = None) -> str:
+    """发起命令的路由（使用路由模板，避免路径参数造成的高基数），请求外为 background"""
+    scope = scope if scope is not None else request_scope.get()
+    if scope is None:
+        return "background"
+    route = scope.get("route")
+    path = getattr(route, "path", None) or scope.get("path", "")
+    return f"{scope.get('method', '')} {path}".strip()
+
+def command_shape(value: Any, depth: int = 0) -> Any:
+    """提取命令结构：保留键、操作符与管道阶段，参数值替换为 ?"""
+    if depth > 8:
+        return "..."
+    if isinstance(value, dict):
+        return {key: command_shape(item, depth + 1) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        if value and all(isinstance(item, dict) for item in value):
+            return [command_shape(item, depth + 1) for item in value]
+        return ["?"] if value else []
+    return "?"
+
+# 慢查询日志中保留结构的命令字段
+SHAPE_FIELDS = ["filter", "sort", "projection", "pipeline", "updates", "deletes", "query", "q", "u"]
+
+def _collection_of(command_name: str, command: Dict[str, Any]) -> Optional[str]:
+    """命令操作的集合"""
+    if command_name == "getMore":
+        return command.get("collection")
+    value = command.get(command_name)
+    return value if isinstance(value, str) else None
+
+def _documents_of(reply: Dict[str, Any]) -> int:
+    """命令返回（或影响）的文档数"""
+    cursor = reply.get("cursor")
+    if isinstance(cursor, dict):
+        batch = cursor.get("firstBatch", cursor.get("nextBatch"))
+        if isinstance(batch, list):
+            return len(batch)
+    n = reply.get("n")
+    return n if isinstance(n, int) else 0
+
+class _RollingHistogram:
+    """按时间槽滚动的耗时直方图"""
+
+    def __init__(self):
+        # 槽序号 -> {分桶计数, 次数, 总耗时, 最大耗时, 文档数, 失败数}
+        self.slots: Dict[int, Dict[str, Any]] = {}
+
+    def add(self, slot: int, duration_ms: float, documents: int, failed: bool):
+        data = self.slots.get(slot)
+        if data is None:
+            data = {"buckets": [0] * (len(HISTOGRAM_BUCKETS_MS) + 1), "count": 0,
+                    "total_ms": 0.0, "max_ms": 0.0, "documents": 0, "failed": 0}
+            self.slots[slot] = data
+            # 丢弃窗口外的旧槽
+            for old in [s for s in self.slots if s <= slot - WINDOW_SLOTS]:
+                del self.slots[old]
+        index = len(HISTOGRAM_BUCKETS_MS)
+        for i, bound in enumerate(HISTOGRAM_BUCKETS_MS):
+            if duration_ms <= bound:
+                index = i
+                break
+        data["buckets"][index] += 1
+        data["count"] += 1
+        data["total_ms"] += duration_ms
+        data["max_ms"] = max(data["max_ms"], duration_ms)
+        data["documents"] += documents
+        data["failed"] += 1 if failed else 0
+
+    def summary(self, current_slot: int) -> Optional[Dict[str, Any]]:
+        """合并窗口内各槽"""
+        buckets = [0] * (len(HISTOGRAM_BUCKETS_MS) + 1)
+        count, total_ms, max_ms, documents, failed = 0, 0.0, 0.0, 0, 0
+        for slot, data in self.slots.items():
+            if slot <= current_slot - WINDOW_SLOTS:
+                continue
+            buckets = [a + b for a, b in zip(buckets, data["buckets"])]
+            count += data["count"]
+            total_ms += data["total_ms"]
+            max_ms = max(max_ms, data["max_ms"])
+            documents += data["documents"]
+            failed += data["failed"]
+        if not count:
+            return None
+
+        def percentile(p: float) -> float:
+            target = count * p
+            seen = 0
+            for i, n in enumerate(buckets):
+                seen += n
+                if seen >= target:
+                    return float(HISTOGRAM_BUCKETS_MS[i]) if i < len(HISTOGRAM_BUCKETS_MS) else max_ms
+            return max_ms
+
+        return {
+            "count": count,
+            "failed": failed,
+            "avg_ms": round(total_ms / count, 3),
+            "max_ms": round(max_ms, 3),
+            "p50_ms": percentile(0.5),
+            "p95_ms": percentile(0.95),
+            "p99_ms": percentile(0.99),
+            "documents": documents,
+            "buckets": {
+                **{f"le_{bound}ms": buckets[i] for i, bound in enumerate(HISTOGRAM_BUCKETS_MS)},
+                "overflow": buckets[-1]
+            }
+        }
+
+class MongoCommandMonitor(CommandListener):
+    """MongoDB 命令监听器"""
+
+    def __init__(self, slow_query_ms: Optional[float] = None):
+        self.slow_query_ms = slow_query_ms if slow_query_ms is not None else \
+            config["mongodb"].get("slow_query_ms", 200)
+        self._lock = threading.Lock()
+        # (connection_id, request_id) -> 命令开始时的信息
+        self._inflight: Dict[Tuple[Any, int], Dict[str, Any]] = {}
+        # (route, collection, command) -> 滚动直方图
+        self._histograms: Dict[Tuple[str, str, str], _RollingHistogram] = {}
+
+    def started(self, event):
+        command = event.command
+        info = {
+            "command": event.command_name,
+            "collection": _collection_of(event.command_name, command) or "-",
+            "route": route_label(),
+            # 请求级用量统计
+            "usage": db_usage.get(),
+            # 原始命令只在判定为慢查询时提取结构
+            "body": command
+        }
+        with self._lock:
+            self._inflight[(event.connection_id, event.request_id)] = info
+
+    def succeeded(self, event):
+        self._finish(event, _documents_of(event.reply or {}), failed=False)
+
+    def failed(self, event):
+        self._finish(event, 0, failed=True)
+
+    def _finish(self, event, documents: int, failed: bool):
+        with self._lock:
+            info = self._inflight.pop((event.connection_id, event.request_id), None)
+        if info is None:
+            return
+        duration_ms = event.duration_micros / 1000.0
+        slot = int(time.time() // SLOT_SECONDS)
+        key = (info["route"], info["collection"], info["command"])
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _RollingHistogram()
+            histogram.add(slot, duration_ms, documents, failed)
+        if info["usage"] is not None:
+            info["usage"].add_mongo(duration_ms, documents)
+
+        if self.slow_query_ms is not None and duration_ms >= self.slow_query_ms:
+            body = info["body"]
+            shape = {field: command_shape(body[field]) for field in SHAPE_FIELDS if field in body}
+            shape = json.dumps(shape, ensure_ascii=False, default=str)[:MAX_SHAPE_LENGTH]
+            logger.warning(
+                f"MongoDB慢查询: {duration_ms:.1f}ms route={info['route']} "
+                f"collection={info['collection']} command={info['command']} "
+                f"documents={documents} failed={failed} shape={shape}"
+            )
+
+    def snapshot(self) -> Dict[str, Any]:
+        """窗口内的统计，按 路由 -> 集合 -> 命令 组织"""
+        current_slot = int(time.time() // SLOT_SECONDS)
+        result: Dict[str, Any] = {}
+        with self._lock:
+            items = list(self._histograms.items())
+            for (route, collection, command), histogram in items:
+                summary = histogram.summary(current_slot)
+                if summary is None:
+                    continue
+                result.setdefault(route, {}).setdefault(collection, {})[command] = summary
+        return {
+            "window_seconds": SLOT_SECONDS * WINDOW_SLOTS,
+            "slow_query_ms": self.slow_query_ms,
+            "routes": result
+        }
+
+    def reset(self):
+        """清空统计"""
+        with self._lock:
+            self._histograms.clear()
+
+# 全局命令监听器
+command_monitor = MongoCommandMonitor()
@@ -0,0 +1,150 @@
+"""
+查询编译器
+- 安全解析客户端传入的排序参数（不再使用 eval）
+- 仅接受能由模型 Config.indexes 中声明的索引直接完成的排序，避免内存排序
+"""
+import ast
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Type
+from app.services.mongodb.indexes import normalize_index
+
+SortList = List[Tuple[str, int]]
+
+class QueryCompileError(ValueError):
+    """排序/查询参数不合法或没有可用索引"""
+
+def index_keys(index: Any) -> SortList:
+    """将 Config.indexes 中的一项声明规范化为 [(字段, 方向), ...]"""
+    try:
+        return normalize_index(index)["keys"]
+    except (ValueError, KeyError, TypeError):
+        raise QueryCompileError(f"无法识别的索引声明: {index!r}")
+
+def parse_sort(spec: Optional[str]) -> SortList:
+    """解析排序参数
+
+    支持两种写法：
+        "{'trade_date': -1, 'created_at': 1}"  字典字面量
+        "-trade_date,created_at"               逗号分隔，前缀 - 表示倒序
+    """
+    if spec is None or not spec.strip():
+        return []
+    spec = spec.strip()
+    if spec.startswith("{"):
+        try:
+            value = ast.literal_eval(spec)
+        except (ValueError, SyntaxError):
+            raise QueryCompileError("排序参数格式错误")
+        if not isinstance(value, dict):
+            raise QueryCompileError("排序参数格式错误")
+        items = list(value.items())
+    else:
+        items = []
+        for part in spec.split(","):
+            part = part.strip()
+            if not part:
+                continue
+            if part.startswith("-"):
+                items.append((part[1:], -1))
+            else:
+                items.append((part.lstrip("+"), 1))
+
+    sort = []
+    for field, direction in items:
+        if not isinstance(field, str) or not field or field.startswith("$"):
+            raise QueryCompileError(f"非法的排序字段: {field!r}")
+        if direction not in (1, -1):
+            raise QueryCompileError(f"非法的排序方向: {field}={direction!r}")
+        sort.append((field, direction))
+    if len({field for field, _ in sort}) != len(sort):
+        raise QueryCompileError("排序字段重复")
+    return sort
+
+def _match_index(keys: SortList, sort: SortList, equality_fields: Iterable[str]) -> Optional[Tuple[int, SortList]]:
+    """判断索引能否完成排序，可以则返回 (等值前缀长度, 实际使用的排序)，排序含索引后续的 _id 次序
+
+    索引需满足：前缀字段均为等值条件，随后连续的字段与排序一致（方向全同或全反）
+    """
+    equality_fields = set(equality_fields)
+    prefix = 0
+    while prefix < len(keys) and keys[prefix][0] in equality_fields:
+        prefix += 1
+    # 排序字段本身也可能是等值条件，前缀可在任意位置截断
+    for start in range(prefix, -1, -1):
+        segment = keys[start:start + len(sort)]
+        if len(segment) != len(sort) or [f for f, _ in segment] != [f for f, _ in sort]:
+            continue
+        same = all(d == sd for (_, d), (_, sd) in zip(segment, sort))
+        inverted = all(d == -sd for (_, d), (_, sd) in zip(segment, sort))
+        if not (same or inverted):
+            continue
+        # 索引紧随其后为 _id 时作为稳定次序一并使用
+        rest = keys[start + len(sort):]
+        if rest and rest[0][0] == "_id":
+            sign = 1 if same else -1
+            return start, sort + [("_id", rest[0][1] * sign)]
+        return start, sort
+    return None
+
+def compile_sort(model: Type, spec: Optional[str], equality_fields: Iterable[str],
+                 default: Optional[SortList] = None) -> SortList:
+    """将排序参数编译为由索引支撑的排序
+
+    Args:
+        model: 模型类，使用其 Config.indexes 判断可用索引
+        spec: 客户端传入的排序参数
+        equality_fields: 查询条件中的等值字段
+        default: 未传排序参数时使用的排序
+
+    Raises:
+        QueryCompileError: 参数非法或没有索引能完成该排序
+    """
+    sort = parse_sort(spec) or list(default or [])
+    if not sort:
+        return []
+    equality_fields = list(equality_fields)
+    best = None
+    for index in model.Config.indexes:
+        # 部分索引只覆盖部分文档，不能用于通用排序
+        if isinstance(index, dict) and "partialFilterExpression" in index:
+            continue
+        matched = _match_index(index_keys(index), sort, equality_fields)
+        # 优先选择等值前缀更长（扫描范围更小）的索引
+        if matched is not None and (best is None or matched[0] > best[0]):
+            best = matched
+    if best is not None:
+        return best[1]
+    fields = ", ".join(f"{field}:{direction}" for field, direction in sort)
+    raise QueryCompileError(f"不支持的排序: {fields}")
+
+def equality_fields(filter_dict: Dict[str, Any]) -> List[str]:
+    """提取查询条件中的等值字段（值不是操作符字典的字段）"""
+    return [
+        field for field, value in filter_dict.items()
+        if not field.startswith("$") and not (isinstance(value, dict) and any(k.startswith("$") for k in value))
+    ]
+
+def parse_fields(model: Type, spec: Optional[str], required: Iterable[str] = ()) -> Optional[List[str]]:
+    """解析逗号分隔的返回字段参数，只允许模型上声明的字段
+
+    Args:
+        model: 模型类
+        spec: 客户端传入的字段列表，如 "id,amount,trade_date"
+        required: 查询本身需要的字段（如游标分页的排序字段），自动补充
+
+    Returns:
+        字段列表；未传参数时返回 None 表示返回完整文档
+    """
+    if spec is None or not spec.strip():
+        return None
+    fields = []
+    for field in spec.split(","):
+        field = field.strip()
+        if not field or field in fields:
+            continue
+        if field not in model.__fields__:
+            raise QueryCompileError(f"不支持的字段: {field}")
+        fields.append(field)
+    for field in required:
+        if field != "_id" and field not in fields:
+            fields.append(field)
+    return fields
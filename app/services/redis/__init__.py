@@ -1,3 +1,4 @@
 from app.services.redis.client import redis_client, session_client, business_client, sync_business_client
+from app.services.redis.invalidation_bus import invalidation_bus
 
-__all__ = ["redis_client", "session_client", "business_client", "sync_business_client"]
\ No newline at end of file
+__all__ = ["redis_client", "session_client", "business_client", "sync_business_client", "invalidation_bus"]
\ No newline at end of file
@@ -1,9 +1,11 @@
 import asyncio
+import time
 from redis.asyncio import Redis, ConnectionPool
 from redis.asyncio.connection import Connection
 from redis.exceptions import ConnectionError
 from app.config import config
 from app.utils import get_logger
+from app.utils.db_budget import record_redis
 from redis import Redis as SyncRedis
 from redis.exceptions import ConnectionError
 
@@ -21,6 +23,15 @@ class RedisConnectionListener(Connection):
             await self.on_disconnect()
         await super().disconnect(nowait=nowait)
 
+class InstrumentedRedis(Redis):
+    """统计每条命令耗时的Redis客户端，计入请求级数据库调用预算（管道按一次 execute 之外不单独统计）"""
+    async def execute_command(self, *args, **options):
+        start = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            record_redis((time.perf_counter() - start) * 1000)
+
 class _RedisClient:
     def __init__(self):
         self.redis_config = config["redis"]
@@ -30,6 +41,9 @@ class _RedisClient:
         self.business_db = self.redis_config["db"]["business"]
         self.session_pool = None
         self.business_pool = None
+        # 分布式锁阻塞等待（BLPOP）专用，避免等待者占满业务连接池
+        self.lock_wait_client = None
+        self.lock_wait_pool = None
         self._reconnect_lock = asyncio.Lock()
         self._health_check_task = None
         self._shutting_down = False  # 添加关闭标记
@@ -64,10 +78,14 @@ class _RedisClient:
         if self.business_pool:
             logger.info("正在关闭Redis业务连接...")
             await self.business_pool.disconnect()
+        if self.lock_wait_pool:
+            await self.lock_wait_pool.disconnect()
         self.session_client = None
         self.business_client = None
+        self.lock_wait_client = None
         self.session_pool = None
         self.business_pool = None
+        self.lock_wait_pool = None
         logger.info("Redis连接已关闭")
 
     async def _on_disconnect(self, db_type):
@@ -119,9 +137,19 @@ class _RedisClient:
                 **business_connection_kwargs
             )
             
+            # 创建锁等待连接池：只执行 BLPOP，断开时不触发重连（由业务连接负责）
+            lock_wait_connection_kwargs = base_connection_kwargs.copy()
+            lock_wait_connection_kwargs["db"] = self.business_db
+            
+            self.lock_wait_pool = ConnectionPool(
+                max_connections=config["lock_wait"]["max_connections"],
+                **lock_wait_connection_kwargs
+            )
+            
             # 创建客户端实例
-            self.session_client = Redis(connection_pool=self.session_pool)
-            self.business_client = Redis(connection_pool=self.business_pool)
+            self.session_client = InstrumentedRedis(connection_pool=self.session_pool)
+            self.business_client = InstrumentedRedis(connection_pool=self.business_pool)
+            self.lock_wait_client = InstrumentedRedis(connection_pool=self.lock_wait_pool)
             
             # 测试连接是否成功
             await self.session_client.ping()
@@ -131,8 +159,10 @@ class _RedisClient:
             logger.error(f"Redis连接失败: {str(e)}")
             self.session_client = None
             self.business_client = None
+            self.lock_wait_client = None
             self.session_pool = None
             self.business_pool = None
+            self.lock_wait_pool = None
     
     async def _health_check_loop(self):
         """后台任务定期检查连接状态"""
@@ -160,6 +190,10 @@ class _RedisClient:
     def get_business_client(self):
         """获取用于业务数据的Redis客户端"""
         return self.business_client
+    
+    def get_lock_wait_client(self):
+        """获取用于分布式锁阻塞等待的Redis客户端"""
+        return self.lock_wait_client
 
 class AsyncRedisClientProxy:
     """异步Redis客户端代理类，实现懒加载"""
@@ -179,6 +213,7 @@ redis_client = _RedisClient()
 # 创建代理对象
 session_client = AsyncRedisClientProxy(redis_client.get_session_client)
 business_client = AsyncRedisClientProxy(redis_client.get_business_client)
+lock_wait_client = AsyncRedisClientProxy(redis_client.get_lock_wait_client)
 
 class SyncRedisClient:
     """同步Redis客户端代理类，用于非异步环境"""
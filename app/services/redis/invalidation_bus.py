@@ -0,0 +1,114 @@
+"""
+跨进程缓存失效总线
+- 写入方通过 Redis 业务库的 pub/sub 频道发布 (集合, user_id, id) 失效消息
+- 每个进程订阅该频道，收到消息后经 EventManager 转发为 EVENTS.CACHE_INVALIDATED，由各缓存自行清除
+- 订阅连接断开重连后可能漏收消息，此时以 user_id=None 转发，表示清空该进程的全部本地缓存
+"""
+import asyncio
+import json
+import uuid
+from typing import Optional
+from redis.asyncio import Redis
+from app.config import config
+from app.services.redis.client import business_client
+from app.utils import get_logger, event_manager, EVENTS
+
+logger = get_logger()
+
+# 失效消息频道
+INVALIDATION_CHANNEL = "BB:cache:invalidate"
+
+class InvalidationBus:
+    """基于 Redis pub/sub 的缓存失效总线"""
+
+    def __init__(self):
+        # 进程标识，用于忽略本进程发出的消息（本进程已在写入时同步清除）
+        self.origin = str(uuid.uuid4())
+        self._task: Optional[asyncio.Task] = None
+        self._client: Optional[Redis] = None
+
+    async def publish(self, collection: str, user_id: Optional[str], id: Optional[str] = None):
+        """发布失效消息，发布失败只记录日志（其他进程依赖本地缓存的短 TTL 兜底）"""
+        message = json.dumps({"origin": self.origin, "collection": collection, "user_id": user_id, "id": id})
+        try:
+            await business_client.publish(INVALIDATION_CHANNEL, message)
+        except Exception as e:
+            logger.warning(f"发布缓存失效消息失败: {collection}:{user_id}, 错误: {str(e)}")
+
+    def start(self):
+        """启动订阅任务"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._listen_loop())
+
+    async def stop(self):
+        """停止订阅任务"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _create_client(self) -> Redis:
+        """订阅使用独立连接：订阅状态的连接不能执行其他命令，也不应触发业务连接池的断线重连"""
+        redis_config = config["redis"]
+        return Redis(
+            host=redis_config["host"],
+            port=redis_config["port"],
+            password=redis_config["password"],
+            db=redis_config["db"]["business"],
+            decode_responses=True,
+            socket_connect_timeout=5,
+            health_check_interval=30,
+        )
+
+    async def _listen_loop(self):
+        """订阅循环，异常时延迟重连"""
+        retry_delay = 1
+        while True:
+            pubsub = None
+            try:
+                self._client = self._create_client()
+                pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                logger.info("缓存失效总线已订阅")
+                # 订阅前可能漏收了消息，清空本地缓存
+                await event_manager.emit(EVENTS.CACHE_INVALIDATED, None, None, None)
+                retry_delay = 1
+                async for message in pubsub.listen():
+                    await self._dispatch(message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"缓存失效总线连接异常，{retry_delay} 秒后重连: {str(e)}")
+                await asyncio.sleep(retry_delay)
+                retry_delay = min(retry_delay * 2, 30)
+            finally:
+                if pubsub is not None:
+                    try:
+                        await pubsub.aclose() if hasattr(pubsub, "aclose") else await pubsub.close()
+                    except Exception:
+                        pass
+                if self._client is not None:
+                    try:
+                        await self._client.aclose() if hasattr(self._client, "aclose") else await self._client.close()
+                    except Exception:
+                        pass
+                    self._client = None
+
+    async def _dispatch(self, message):
+        """处理一条失效消息"""
+        if message.get("type") != "message":
+            return
+        try:
+            data = json.loads(message["data"])
+        except (TypeError, ValueError):
+            logger.warning(f"无法解析缓存失效消息: {message.get('data')}")
+            return
+        if data.get("origin") == self.origin:
+            return
+        await event_manager.emit(EVENTS.CACHE_INVALIDATED, data.get("collection"), data.get("user_id"), data.get("id"))
+
+# 全局失效总线
+invalidation_bus = InvalidationBus()
@@ -0,0 +1,289 @@
+"""
+记录月度汇总服务
+- 记录写入时以 $inc upsert 增量维护 record_rollups
+- 日期范围统计优先汇总整月的汇总行，仅对首尾不完整的月份扫描原始记录
+- 提供从 records 集合回填汇总的能力
+- 增量写入与重建在同一用户的汇总锁内进行，重建期间该用户的增量写入等待重建完成
+- 增量写入失败（如等待锁超时）时标记该用户待重建，由定时任务从原始记录重建
+"""
+import asyncio
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Tuple
+from app.services.mongodb.models.record import Record, OUTSTANDING_EXPR
+from app.services.mongodb.models.record_rollup import RecordRollup
+from app.services.redis import business_client
+from app.utils import get_logger, event_manager, EVENTS, to_month_key
+from app.utils.dynamic_redis_lock import create_rollup_lock
+
+logger = get_logger()
+
+# 增量写入失败、待重建汇总的用户集合
+DIRTY_USERS_KEY = "BB:rollup:dirty"
+
+# 汇总维度字段
+ROLLUP_DIMENSIONS = ["user_id", "card_id", "swipe_type_id", "consumption_type_id", "month", "record_type"]
+
+def rollup_id(dimensions: Dict[str, Any]) -> str:
+    """由汇总维度拼接汇总行ID"""
+    return ":".join(str(dimensions.get(field) or "none") for field in ROLLUP_DIMENSIONS)
+
+def _record_dimensions(record: Record) -> Dict[str, Any]:
+    """记录所属的汇总维度"""
+    return {
+        "user_id": record.user_id,
+        "card_id": record.card_id,
+        "swipe_type_id": record.swipe_type_id,
+        "consumption_type_id": record.consumption_type_id,
+        "month": to_month_key(record.trade_date),
+        "record_type": record.record_type
+    }
+
+def compute_rollup_deltas(changes: List[Tuple[Optional[Record], Optional[Record]]]) -> Dict[str, Dict[str, Any]]:
+    """根据记录变更前后的状态计算各汇总行的增量"""
+    deltas: Dict[str, Dict[str, Any]] = {}
+    for before, after in changes:
+        for record, sign in ((after, 1), (before, -1)):
+            if record is None or not record.is_active:
+                continue
+            dimensions = _record_dimensions(record)
+            key = rollup_id(dimensions)
+            delta = deltas.setdefault(key, {"dimensions": dimensions, "amount": 0.0, "count": 0, "outstanding": 0.0})
+            delta["amount"] += sign * record.amount
+            delta["count"] += sign
+            delta["outstanding"] += sign * record.get_outstanding()
+    return {
+        key: delta for key, delta in deltas.items()
+        if delta["amount"] or delta["count"] or delta["outstanding"]
+    }
+
+@event_manager.on(EVENTS.RECORD_CHANGED)
+async def apply_rollup_deltas(user_id: str, changes: List[Tuple[Optional[Record], Optional[Record]]]):
+    """记录变更后以 $inc upsert 更新月度汇总"""
+    try:
+        deltas = compute_rollup_deltas(changes)
+        if not deltas:
+            return
+        # 各汇总行互不依赖，一次无序批量写入
+        bulk = RecordRollup.bulk(ordered=False)
+        for key, delta in deltas.items():
+            bulk.update(
+                {"_id": key},
+                {
+                    "$inc": {"amount": delta["amount"], "count": delta["count"], "outstanding": delta["outstanding"]},
+                    "$setOnInsert": delta["dimensions"]
+                },
+                upsert=True
+            )
+        # 与重建互斥：重建读取原始记录到清理旧行之间的增量会被覆盖或删除
+        async with create_rollup_lock(user_id):
+            await bulk.execute()
+    except Exception as e:
+        # 汇总更新失败不影响记录写入；记录已写入，标记待重建后由定时任务从原始记录修复
+        logger.error(f"更新月度汇总失败，标记待重建: user_id={user_id}, 错误: {str(e)}")
+        await mark_rollups_dirty(user_id)
+
+async def mark_rollups_dirty(user_id: str):
+    """标记用户的汇总待重建"""
+    try:
+        await business_client.sadd(DIRTY_USERS_KEY, user_id)
+    except Exception as e:
+        logger.error(f"标记月度汇总待重建失败，需手动回填: user_id={user_id}, 错误: {str(e)}")
+
+async def repair_dirty_rollups(limit: int = 100) -> int:
+    """重建被标记的用户汇总，重建失败的用户重新标记
+
+    Returns:
+        重建成功的用户数
+    """
+    # SPOP 原子取出，多个进程同时执行时每个用户只被一个进程重建
+    user_ids = await business_client.spop(DIRTY_USERS_KEY, limit) or []
+    repaired = 0
+    for user_id in user_ids:
+        try:
+            await rebuild_user_rollups(user_id)
+            repaired += 1
+        except Exception as e:
+            logger.error(f"重建月度汇总失败: user_id={user_id}, 错误: {str(e)}")
+            await mark_rollups_dirty(user_id)
+    return repaired
+
+def _month_start(dt: datetime) -> datetime:
+    """所在自然月的第一天零点"""
+    return dt.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+def _next_month_start(dt: datetime) -> datetime:
+    """下一个自然月的第一天零点"""
+    return (_month_start(dt) + timedelta(days=32)).replace(day=1)
+
+def split_date_range(start: Optional[datetime], end: Optional[datetime]) -> Tuple[Optional[Dict], List[Dict]]:
+    """将 [start, end) 拆分为整月部分（汇总行月份条件）与首尾的原始记录日期条件
+
+    Returns:
+        (月份条件, 原始记录的 trade_date 条件列表)；月份条件为 None 表示没有整月部分
+    """
+    # 第一个完整月的开始、最后一个完整月之后的开始
+    full_start = None
+    if start is not None:
+        full_start = start if start == _month_start(start) else _next_month_start(start)
+    full_end = _month_start(end) if end is not None else None
+
+    if full_start is not None and full_end is not None and full_start >= full_end:
+        # 不足一个整月，全部扫描原始记录
+        date_filter = {"$gte": start, "$lt": end}
+        return None, [date_filter]
+
+    month_filter = {}
+    raw_filters = []
+    if full_start is not None:
+        month_filter["$gte"] = to_month_key(full_start)
+        if start < full_start:
+            raw_filters.append({"$gte": start, "$lt": full_start})
+    if full_end is not None:
+        month_filter["$lt"] = to_month_key(full_end)
+        if full_end < end:
+            raw_filters.append({"$gte": full_end, "$lt": end})
+    return month_filter, raw_filters
+
+async def sum_by_consumption_type(user_id: str, start: Optional[datetime] = None,
+                                  end: Optional[datetime] = None, card_id: Optional[str] = None) -> List[Dict]:
+    """按消费类型统计 [start, end) 内的金额与笔数
+
+    整月部分读取汇总行，首尾不完整的月份扫描原始记录
+    """
+    month_filter, raw_filters = split_date_range(start, end)
+    totals: Dict[Optional[str], Dict[str, Any]] = {}
+
+    async def load_rollups():
+        if month_filter is None:
+            return []
+        filter_dict = {"user_id": user_id}
+        if card_id:
+            filter_dict["card_id"] = card_id
+        if month_filter:
+            filter_dict["month"] = month_filter
+        rows = await RecordRollup.find_many(filter_dict)
+        return [
+            {"_id": row.consumption_type_id, "total_amount": row.amount, "count": row.record_count}
+            for row in rows if row.record_count
+        ]
+
+    async def load_raw():
+        if not raw_filters:
+            return []
+        match_filter = {"user_id": user_id, "is_active": True}
+        if card_id:
+            match_filter["card_id"] = card_id
+        match_filter["$or"] = [{"trade_date": date_filter} for date_filter in raw_filters]
+        return await Record.aggregate([
+            {"$match": match_filter},
+            {"$group": {
+                "_id": "$consumption_type_id",
+                "total_amount": {"$sum": "$amount"},
+                "count": {"$sum": 1}
+            }}
+        ])
+
+    rollup_rows, raw_rows = await asyncio.gather(load_rollups(), load_raw())
+    for row in rollup_rows + raw_rows:
+        total = totals.setdefault(row["_id"], {"_id": row["_id"], "total_amount": 0.0, "count": 0})
+        total["total_amount"] += row["total_amount"]
+        total["count"] += row["count"]
+    return sorted(totals.values(), key=lambda x: x["total_amount"], reverse=True)
+
+async def sum_monthly_by_card(user_id: str, month: str) -> Tuple[Dict[str, float], Dict[str, float]]:
+    """读取某月的支付汇总，返回 (按卡账单金额, 按卡未还金额)"""
+    rows = await RecordRollup.find_many({"user_id": user_id, "month": month, "record_type": "支付"})
+    bill_by_card: Dict[str, float] = {}
+    outstanding_by_card: Dict[str, float] = {}
+    for row in rows:
+        bill_by_card[row.card_id] = bill_by_card.get(row.card_id, 0.0) + row.amount
+        outstanding_by_card[row.card_id] = outstanding_by_card.get(row.card_id, 0.0) + row.outstanding
+    return bill_by_card, outstanding_by_card
+
+def build_rollup_pipeline(user_id: str, rebuilt_at: datetime) -> List[Dict]:
+    """构建从原始记录重建用户汇总行并 $merge 写入的聚合管道"""
+    timezone = rebuilt_at.strftime("%z")
+    dimension_exprs = {
+        "user_id": "$user_id",
+        "card_id": "$card_id",
+        "swipe_type_id": "$swipe_type_id",
+        "consumption_type_id": "$consumption_type_id",
+        "month": {"$dateToString": {"format": "%Y-%m", "date": "$trade_date", "timezone": timezone}},
+        "record_type": "$record_type"
+    }
+    key_parts = []
+    for field in ROLLUP_DIMENSIONS:
+        if key_parts:
+            key_parts.append(":")
+        key_parts.append({"$ifNull": [f"$_id.{field}", "none"]})
+    return [
+        {"$match": {"user_id": user_id, "is_active": True}},
+        {"$group": {
+            "_id": dimension_exprs,
+            "amount": {"$sum": "$amount"},
+            "count": {"$sum": 1},
+            "outstanding": {"$sum": OUTSTANDING_EXPR}
+        }},
+        {"$project": {
+            "_id": {"$concat": key_parts},
+            **{field: f"$_id.{field}" for field in ROLLUP_DIMENSIONS},
+            "amount": 1, "count": 1, "outstanding": 1,
+            "created_at": rebuilt_at,
+            "updated_at": rebuilt_at,
+            "rebuilt_at": rebuilt_at
+        }},
+        {"$merge": {
+            "into": RecordRollup.Config.collection,
+            "on": "_id",
+            "whenMatched": "replace",
+            "whenNotMatched": "insert"
+        }}
+    ]
+
+async def rebuild_user_rollups(user_id: str) -> int:
+    """从原始记录重建单个用户的汇总行，并清理已不存在的维度组合
+
+    持有该用户的汇总锁：重建期间的增量写入等待重建完成后再应用，
+    因此 $merge 替换与清理时不会丢失并发写入的增量；重建期间持续续期，
+    锁丢失时中止重建并抛出 LockLostError
+    """
+    async with create_rollup_lock(user_id, timeout=60) as lock, lock.keep_alive():
+        rebuilt_at = datetime.now().astimezone()
+        await Record.aggregate(build_rollup_pipeline(user_id, rebuilt_at))
+        return await RecordRollup.delete_many({
+            "user_id": user_id,
+            "$or": [{"rebuilt_at": {"$lt": rebuilt_at}}, {"rebuilt_at": None}]
+        })
+
+async def rebuild_rollups(user_ids: Optional[List[str]] = None, batch_size: int = 50) -> int:
+    """分批回填月度汇总
+
+    Args:
+        user_ids: 指定回填的用户ID，默认流式遍历 records 中的全部用户
+        batch_size: 每批并发重建的用户数
+
+    Returns:
+        回填的用户数
+    """
+    async def iter_user_ids():
+        if user_ids is not None:
+            for user_id in user_ids:
+                yield user_id
+            return
+        async for row in Record.iter_aggregate([{"$group": {"_id": "$user_id"}}], batch_size=batch_size):
+            yield row["_id"]
+
+    count = 0
+    batch: List[str] = []
+    async for user_id in iter_user_ids():
+        batch.append(user_id)
+        if len(batch) >= batch_size:
+            await asyncio.gather(*[rebuild_user_rollups(uid) for uid in batch])
+            count += len(batch)
+            batch = []
+            logger.info(f"月度汇总回填进度: {count} 个用户")
+    if batch:
+        await asyncio.gather(*[rebuild_user_rollups(uid) for uid in batch])
+        count += len(batch)
+        logger.info(f"月度汇总回填进度: {count} 个用户")
+    return count
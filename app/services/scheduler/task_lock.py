@@ -1,5 +1,6 @@
 import asyncio
 import functools
+import uuid
 from datetime import datetime, timedelta
 from typing import Callable, Any
 from app.services.mongodb.models import Schedule
@@ -31,6 +32,18 @@ class TaskLockManager:
             }
         )
         
+        if result is None:
+            # 首次执行时任务记录尚不存在，先创建（executed_at 缺失即可被获取）
+            await Schedule.update_one(
+                {"task_name": task_name},
+                {"$setOnInsert": {"_id": str(uuid.uuid4()), "created_at": datetime.now().astimezone()}},
+                upsert=True
+            )
+            result = await Schedule.find_one_and_update(
+                {"task_name": task_name, "executed_at": {"$exists": False}},
+                {"$set": {"executed_at": datetime.now().astimezone()}}
+            )
+        
         # 如果更新了文档，说明获取锁成功
         return result is not None
 
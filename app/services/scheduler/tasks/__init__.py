@@ -1,5 +1,9 @@
 from app.services.scheduler.tasks.example_task import example_task
+from app.services.scheduler.tasks.dashboard_snapshot_task import dashboard_snapshot_task
+from app.services.scheduler.tasks.rollup_repair_task import rollup_repair_task
 
 __all__ = [
-    'example_task'
+    'example_task',
+    'dashboard_snapshot_task',
+    'rollup_repair_task'
 ]
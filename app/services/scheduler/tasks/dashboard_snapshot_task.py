@@ -0,0 +1,17 @@
+"""
+看板快照重建任务
+每天凌晨全量重建已存在的看板快照，修正增量更新累计的误差
+"""
+from app.utils import get_logger
+from app.services.scheduler.scheduler import scheduled_job
+from app.services.scheduler.task_lock import task_execution
+from app.services.dashboard import rebuild_all_dashboard_snapshots
+
+logger = get_logger()
+
+@scheduled_job('cron', hour=3, minute=30, id='dashboard_snapshot_task')
+@task_execution('dashboard_snapshot_task', lock_seconds=600)
+async def dashboard_snapshot_task():
+    """重建所有用户的看板快照"""
+    count = await rebuild_all_dashboard_snapshots()
+    logger.info(f"看板快照重建完成，共 {count} 个用户")
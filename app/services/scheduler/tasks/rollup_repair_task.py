@@ -0,0 +1,18 @@
+"""
+月度汇总修复任务
+每分钟重建增量写入失败而被标记的用户汇总
+"""
+from app.utils import get_logger
+from app.services.scheduler.scheduler import scheduled_job
+from app.services.scheduler.task_lock import task_execution
+from app.services.rollup import repair_dirty_rollups
+
+logger = get_logger()
+
+@scheduled_job('interval', seconds=60, id='rollup_repair_task')
+@task_execution('rollup_repair_task', lock_seconds=50)
+async def rollup_repair_task():
+    """重建被标记的用户汇总"""
+    count = await repair_dirty_rollups()
+    if count:
+        logger.info(f"月度汇总修复完成，共 {count} 个用户")
@@ -4,6 +4,7 @@ from typing import Optional
 from datetime import datetime
 from app.services.mongodb import User
 from app.utils import get_logger, session_manager
+from app.utils.worker_pool import password_pool
 
 logger = get_logger()
 
@@ -44,7 +45,7 @@ async def create_user(mobile: str, password: str):
         raise ValueError(f"手机号 '{mobile}' 已存在")
 
     # 创建密码哈希和盐
-    password_hash, salt = _create_password_hash(password)
+    password_hash, salt = await password_pool.run(_create_password_hash, password)
     
     user = User(mobile=mobile, password_hash=password_hash, salt=salt)
     await user.save()
@@ -61,8 +62,10 @@ def _create_password_hash(password: str, salt: Optional[str] = None) -> tuple[st
     
     return password_hash, salt
 
+def _check_password(password: str, salt: str, password_hash: str) -> bool:
+    password_bytes = (password + salt).encode('utf-8')
+    return bcrypt.checkpw(password_bytes, password_hash.encode('utf-8'))
+
 async def verify_password(user: User, password: str) -> bool:
-    password_bytes = (password + user.salt).encode('utf-8')
-    hashed = bcrypt.hashpw(password_bytes, user.password_hash.encode('utf-8')).decode('utf-8')
-    
-    return hashed == user.password_hash 
\ No newline at end of file
+    """在密码哈希线程池中校验，线程池繁忙时抛出 WorkerPoolBusy"""
+    return await password_pool.run(_check_password, password, user.salt, user.password_hash) 
\ No newline at end of file
@@ -0,0 +1,191 @@
+"""
+测试公共夹具
+- ledger：内存中的 records 集合，替换 Record.find_many / Record.bulk_write，用于测试分配引擎
+- api_client：接口测试客户端，默认使用内存 MongoDB/Redis（见 fake_services），
+  设置 BB_TEST_SERVICES=real 时连接配置中的服务（使用独立的测试库），服务不可用时跳过
+"""
+import copy
+import os
+import uuid
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+import pytest
+from app.config import config
+from app.services.mongodb.models.record import Record
+
+def local_dt(*args) -> datetime:
+    """本地时区的时间"""
+    return datetime(*args).astimezone()
+
+def make_record(**kwargs) -> Record:
+    """构造记录，默认属于同一账本的未还支付"""
+    data = {
+        "user_id": "u1",
+        "card_id": "c1",
+        "swipe_type_id": "s1",
+        "consumption_type_id": "t1",
+        "record_type": "支付",
+        "status": "未还",
+        "trade_date": local_dt(2024, 1, 1)
+    }
+    data.update(kwargs)
+    if data["record_type"] == "支付":
+        data.setdefault("outstanding_amount", data["amount"])
+    return Record(**data)
+
+def _values(document: Dict[str, Any], path: str) -> List[Any]:
+    """按点号路径取值，路径经过数组时展开"""
+    values = [document]
+    for part in path.split("."):
+        next_values = []
+        for value in values:
+            items = value if isinstance(value, list) else [value]
+            for item in items:
+                if isinstance(item, dict) and part in item:
+                    next_values.append(item[part])
+        values = next_values
+    expanded = []
+    for value in values:
+        expanded.extend(value if isinstance(value, list) else [value])
+    return expanded or [None]
+
+def _match_value(value: Any, condition: Any) -> bool:
+    if isinstance(condition, dict) and any(key.startswith("$") for key in condition):
+        for op, operand in condition.items():
+            if op == "$in" and value not in operand:
+                return False
+            if op in ("$gte", "$gt", "$lte", "$lt") and value is None:
+                return False
+            if op == "$gte" and not value >= operand:
+                return False
+            if op == "$gt" and not value > operand:
+                return False
+            if op == "$lte" and not value <= operand:
+                return False
+            if op == "$lt" and not value < operand:
+                return False
+        return True
+    return value == condition
+
+def matches(document: Dict[str, Any], filter: Optional[Dict]) -> bool:
+    """支持分配引擎用到的查询条件：等值、$in、比较、$or、$and 与数组字段"""
+    for key, condition in (filter or {}).items():
+        if key == "$or":
+            if not any(matches(document, sub) for sub in condition):
+                return False
+        elif key == "$and":
+            if not all(matches(document, sub) for sub in condition):
+                return False
+        elif not any(_match_value(value, condition) for value in _values(document, key)):
+            return False
+    return True
+
+class FakeRecordCollection:
+    """内存中的 records 集合"""
+
+    def __init__(self):
+        self.documents: Dict[str, Dict[str, Any]] = {}
+
+    def add(self, *records: Record):
+        for record in records:
+            self.documents[record.id] = record.to_document()
+
+    def get(self, record_id: str) -> Record:
+        return Record.from_document(copy.deepcopy(self.documents[record_id]))
+
+    def set(self, record_id: str, **fields):
+        self.documents[record_id].update(fields)
+
+    async def find_many(self, filter: Dict = None, sort: List = None, **kwargs) -> List[Record]:
+        documents = [doc for doc in self.documents.values() if matches(doc, filter)]
+        for field, direction in reversed(sort or []):
+            documents.sort(key=lambda doc: doc.get(field), reverse=direction < 0)
+        return [Record.from_document(copy.deepcopy(doc)) for doc in documents]
+
+    async def bulk_write(self, requests: List, ordered: bool = True):
+        inserted = modified = 0
+        for request in requests:
+            document = copy.deepcopy(request._doc)
+            if not hasattr(request, "_filter"):
+                self.documents[document["_id"]] = document
+                inserted += 1
+                continue
+            target = next(doc for doc in self.documents.values() if matches(doc, request._filter))
+            for field, value in (document.get("$set") or {}).items():
+                target[field] = value
+            for field, value in (document.get("$inc") or {}).items():
+                target[field] = target.get(field, 0) + value
+            for field, value in (document.get("$push") or {}).items():
+                target.setdefault(field, []).append(value)
+            modified += 1
+        return SimpleNamespace(inserted_count=inserted, matched_count=modified, modified_count=modified,
+                               upserted_count=0, deleted_count=0)
+
+@pytest.fixture
+def ledger(monkeypatch) -> FakeRecordCollection:
+    """以内存集合替换 Record 的查询与批量写入"""
+    collection = FakeRecordCollection()
+    monkeypatch.setattr(Record, "find_many", collection.find_many)
+    monkeypatch.setattr(Record, "bulk_write", collection.bulk_write)
+    return collection
+
+def _services_available() -> bool:
+    """配置中的 MongoDB 与 Redis 能否响应 ping"""
+    from pymongo import MongoClient
+    from redis import Redis
+    mongo, redis = config["mongodb"], config["redis"]
+    mongo_client = MongoClient(host=mongo["host"], port=mongo["port"], serverSelectionTimeoutMS=1000)
+    try:
+        mongo_client.admin.command("ping")
+        Redis(host=redis["host"], port=redis["port"], password=redis["password"],
+              socket_timeout=1, socket_connect_timeout=1).ping()
+        return True
+    except Exception:
+        return False
+    finally:
+        mongo_client.close()
+
+@pytest.fixture(scope="session")
+def api_client():
+    """接口测试客户端，使用独立的测试库"""
+    from fastapi.testclient import TestClient
+    from app.services.mongodb.client import _MongoDBClient
+    from app.services.redis.client import _RedisClient
+    from app.tests.fake_services import connect_fake_mongodb, connect_fake_redis
+
+    use_real = os.environ.get("BB_TEST_SERVICES") == "real"
+    if use_real and not _services_available():
+        pytest.skip("MongoDB/Redis 不可用，跳过接口测试")
+    # 在连接建立前切换到测试库
+    mongo = config["mongodb"]
+    mongo["db"] = os.environ.get("BB_TEST_MONGODB_DB", f"{mongo['db']}-test")
+    with pytest.MonkeyPatch.context() as patch:
+        if not use_real:
+            patch.setattr(_MongoDBClient, "_connect", connect_fake_mongodb)
+            patch.setattr(_RedisClient, "_connect", connect_fake_redis)
+        from app.server import app
+        with TestClient(app) as client:
+            yield client
+
+@pytest.fixture
+def api_user(api_client):
+    """注册并登录一个测试用户，创建信用卡、刷卡类型与消费类型"""
+    from app.services.mongodb.models.card import Card
+    from app.services.mongodb.models.swipe_type import SwipeType
+    from app.services.mongodb.models.consumption_type import ConsumptionType
+    from app.services.user import create_user, login_user
+
+    async def setup():
+        user = await create_user(f"1{uuid.uuid4().int % 10 ** 10:010d}", "password")
+        card = await Card(user_id=user.id, name="测试卡", bank="测试银行", card_number="0000",
+                          credit_limit=10000, bill_day=1, payment_day=20, last_payment_day=20).save()
+        swipe_type = await SwipeType(user_id=user.id, name="测试刷卡").save()
+        consumption_type = await ConsumptionType(user_id=user.id, name="测试消费").save()
+        session_id, _ = await login_user(user)
+        return user, card, swipe_type, consumption_type, session_id
+
+    user, card, swipe_type, consumption_type, session_id = api_client.portal.call(setup)
+    api_client.cookies.set("bb_session", session_id)
+    yield SimpleNamespace(user=user, card=card, swipe_type=swipe_type, consumption_type=consumption_type)
+    api_client.cookies.clear()
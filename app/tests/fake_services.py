@@ -0,0 +1,145 @@
+"""
+接口测试用的内存服务
+- MongoDB：mongomock 集合外包一层异步接口，每次命令调用 record_mongo，计入请求级数据库调用预算
+- Redis：fakeredis 连接接入 redis.asyncio 连接池，客户端仍为 InstrumentedRedis，命令照常统计
+- 游标只在首次拉取时计为一次命令（不模拟 getMore 分批）
+"""
+import time
+import fakeredis
+import mongomock
+from datetime import datetime
+from fakeredis.aioredis import FakeAsyncRedisConnection
+from redis.asyncio import ConnectionPool
+from app.config import config
+from app.utils.db_budget import record_mongo
+
+def _record(start: float, documents: int = 0):
+    record_mongo((time.perf_counter() - start) * 1000, documents)
+
+class FakeCursor:
+    """异步游标，首次迭代时执行查询"""
+
+    def __init__(self, execute):
+        self._execute = execute
+        self._options = []
+        self._documents = None
+
+    def sort(self, *args, **kwargs):
+        self._options.append(("sort", args, kwargs))
+        return self
+
+    def skip(self, skip: int):
+        self._options.append(("skip", (skip,), {}))
+        return self
+
+    def limit(self, limit: int):
+        self._options.append(("limit", (limit,), {}))
+        return self
+
+    def batch_size(self, batch_size: int):
+        return self
+
+    def _fetch(self):
+        if self._documents is None:
+            start = time.perf_counter()
+            cursor = self._execute()
+            for name, args, kwargs in self._options:
+                cursor = getattr(cursor, name)(*args, **kwargs)
+            self._documents = list(cursor)
+            _record(start, len(self._documents))
+        return self._documents
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for document in self._fetch():
+            yield document
+
+    async def to_list(self, length=None):
+        documents = self._fetch()
+        return documents if length is None else documents[:length]
+
+class FakeCollection:
+    """mongomock 集合的异步包装"""
+
+    def __init__(self, collection: mongomock.Collection):
+        self._collection = collection
+        self.name = collection.name
+
+    def find(self, *args, **kwargs) -> FakeCursor:
+        return FakeCursor(lambda: self._collection.find(*args, **kwargs))
+
+    def aggregate(self, pipeline, **kwargs) -> FakeCursor:
+        return FakeCursor(lambda: self._collection.aggregate(pipeline))
+
+    def __getattr__(self, name):
+        method = getattr(self._collection, name)
+
+        async def call(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                _record(start)
+        return call
+
+class FakeDatabase:
+    """mongomock 数据库的异步包装"""
+
+    def __init__(self, database: mongomock.Database):
+        self._database = database
+        self.name = database.name
+
+    def get_collection(self, name: str) -> FakeCollection:
+        return FakeCollection(self._database.get_collection(name))
+
+    def __getitem__(self, name: str) -> FakeCollection:
+        return self.get_collection(name)
+
+class FakeMongoClient:
+    """只支持测试用到的接口：按库名取库、admin ping 与 close"""
+
+    def __init__(self):
+        self._client = mongomock.MongoClient(tz_aware=True, tzinfo=datetime.now().astimezone().tzinfo)
+        self.admin = self
+
+    async def command(self, name: str, *args, **kwargs):
+        return {"ok": 1.0}
+
+    def __getitem__(self, name: str) -> FakeDatabase:
+        return FakeDatabase(self._client[name])
+
+    def close(self):
+        self._client.close()
+
+def connect_fake_mongodb(client):
+    """替换 _MongoDBClient._connect：使用内存 MongoDB"""
+    if getattr(client, "_fake_client", None) is None:
+        client._fake_client = FakeMongoClient()
+    client.async_client = client._fake_client
+    client.async_db = client.async_client[client.mongodb_config["db"]]
+
+# 同一进程内的 Redis 连接共用一个内存服务器，重连后数据不丢失
+fake_redis_server = fakeredis.FakeServer()
+
+async def connect_fake_redis(client):
+    """替换 _RedisClient._connect：使用内存 Redis，客户端仍按命令统计"""
+    from app.services.redis.client import InstrumentedRedis
+
+    def pool(db: int, max_connections: int) -> ConnectionPool:
+        return ConnectionPool(
+            connection_class=FakeAsyncRedisConnection,
+            server=fake_redis_server,
+            db=db,
+            decode_responses=client.redis_config["decode_responses"],
+            max_connections=max_connections
+        )
+
+    max_connections = client.redis_config["max_connections"]
+    client.session_pool = pool(client.session_db, max_connections)
+    client.business_pool = pool(client.business_db, max_connections)
+    client.lock_wait_pool = pool(client.business_db, config["lock_wait"]["max_connections"])
+    client.session_client = InstrumentedRedis(connection_pool=client.session_pool)
+    client.business_client = InstrumentedRedis(connection_pool=client.business_pool)
+    client.lock_wait_client = InstrumentedRedis(connection_pool=client.lock_wait_pool)
@@ -0,0 +1,133 @@
+import asyncio
+import pytest
+from app.services.allocation import (
+    allocation_status, _allocate_new_record, _reallocate_ledger, _replay, _remaining
+)
+from app.tests.conftest import local_dt, make_record
+
+def test_allocation_status():
+    assert allocation_status(0, 100) == "未还"
+    assert allocation_status(40, 100) == "部分还"
+    assert allocation_status(100, 100) == "已还"
+    assert allocation_status(120, 100) == "已还"
+
+def test_new_repayment_allocates_fifo(ledger):
+    first = make_record(amount=100, trade_date=local_dt(2024, 1, 1))
+    second = make_record(amount=50, trade_date=local_dt(2024, 1, 2))
+    ledger.add(first, second)
+    repayment = make_record(amount=120, record_type="还款", trade_date=local_dt(2024, 1, 3))
+
+    changes = asyncio.run(_allocate_new_record(repayment))
+
+    stored_first, stored_second, stored_repayment = (
+        ledger.get(first.id), ledger.get(second.id), ledger.get(repayment.id)
+    )
+    assert (stored_first.repaid_amount, stored_first.outstanding_amount, stored_first.status) == (100, 0, "已还")
+    assert (stored_second.repaid_amount, stored_second.outstanding_amount, stored_second.status) == (20, 30, "部分还")
+    assert [(ref.repayment_id, ref.amount) for ref in stored_second.repayment_refs] == [(repayment.id, 20)]
+    assert (stored_repayment.applied_amount, stored_repayment.status) == (120, "已还")
+    # 变更列表包含对方记录与新记录，新记录的变更前为 None
+    assert [before.id if before else None for before, _ in changes] == [first.id, second.id, None]
+    assert changes[-1][1] is repayment
+
+def test_new_payment_consumes_open_repayment(ledger):
+    repayment = make_record(amount=80, record_type="还款", trade_date=local_dt(2024, 1, 1))
+    ledger.add(repayment)
+
+    payment = make_record(amount=50, trade_date=local_dt(2024, 1, 2))
+    asyncio.run(_allocate_new_record(payment))
+    assert (ledger.get(repayment.id).applied_amount, ledger.get(repayment.id).status) == (50, "部分还")
+    assert (ledger.get(payment.id).repaid_amount, ledger.get(payment.id).status) == (50, "已还")
+
+    payment = make_record(amount=50, trade_date=local_dt(2024, 1, 3))
+    asyncio.run(_allocate_new_record(payment))
+    assert (ledger.get(repayment.id).applied_amount, ledger.get(repayment.id).status) == (80, "已还")
+    stored = ledger.get(payment.id)
+    assert (stored.repaid_amount, stored.outstanding_amount, stored.status) == (30, 20, "部分还")
+
+def test_new_record_ignores_other_ledgers(ledger):
+    other = make_record(amount=100, card_id="c2")
+    ledger.add(other)
+
+    repayment = make_record(amount=100, record_type="还款", trade_date=local_dt(2024, 1, 2))
+    asyncio.run(_allocate_new_record(repayment))
+
+    assert ledger.get(other.id).status == "未还"
+    assert (ledger.get(repayment.id).applied_amount, ledger.get(repayment.id).status) == (0, "未还")
+
+def test_replay_fifo_across_payments():
+    first = make_record(amount=100, trade_date=local_dt(2024, 1, 1))
+    second = make_record(amount=50, trade_date=local_dt(2024, 1, 2))
+    repayment = make_record(amount=120, record_type="还款", trade_date=local_dt(2024, 1, 3))
+    open_payments, open_repayments = [first, second], []
+
+    _replay(repayment, open_payments, open_repayments)
+
+    assert (first.repaid_amount, first.outstanding_amount, first.status) == (100, 0, "已还")
+    assert (second.repaid_amount, second.outstanding_amount, second.status) == (20, 30, "部分还")
+    assert [ref.repayment_id for ref in second.repayment_refs] == [repayment.id]
+    assert (repayment.applied_amount, repayment.status) == (120, "已还")
+    # 已还清的支付移出队列，还款已分配完不进入队列
+    assert open_payments == [second]
+    assert open_repayments == []
+
+def test_replay_keeps_unallocated_remainder_open():
+    payment = make_record(amount=30)
+    repayment = make_record(amount=50, record_type="还款", trade_date=local_dt(2024, 1, 2))
+    open_payments, open_repayments = [payment], []
+
+    _replay(repayment, open_payments, open_repayments)
+
+    assert open_payments == []
+    assert open_repayments == [repayment]
+    assert _remaining(repayment) == 20
+    assert repayment.status == "部分还"
+
+@pytest.fixture
+def allocated_ledger(ledger):
+    """P1(1/1, 100) ← R(1/2, 150) → P2(1/3, 100)：R 分配 P1 100、P2 50"""
+    p1 = make_record(amount=100, trade_date=local_dt(2024, 1, 1))
+    ledger.add(p1)
+    r = make_record(amount=150, record_type="还款", trade_date=local_dt(2024, 1, 2))
+    asyncio.run(_allocate_new_record(r))
+    p2 = make_record(amount=100, trade_date=local_dt(2024, 1, 3))
+    asyncio.run(_allocate_new_record(p2))
+    assert ledger.get(p2.id).repaid_amount == 50
+    return ledger, p1, r, p2
+
+def test_replay_after_repayment_deleted(allocated_ledger):
+    ledger, p1, r, p2 = allocated_ledger
+    ledger.set(r.id, is_active=False)
+    deleted = ledger.get(r.id)
+
+    changes = asyncio.run(_reallocate_ledger("u1", "c1", "s1", deleted.trade_date, detached=deleted))
+
+    for payment in (ledger.get(p1.id), ledger.get(p2.id)):
+        assert (payment.repayment_refs, payment.repaid_amount, payment.status) == ([], 0, "未还")
+        assert payment.outstanding_amount == payment.amount
+    assert (ledger.get(r.id).applied_amount, ledger.get(r.id).status) == (0, "未还")
+    assert {after.id for _, after in changes} == {p1.id, p2.id, r.id}
+
+def test_replay_after_payment_amount_reduced(allocated_ledger):
+    ledger, p1, r, p2 = allocated_ledger
+    ledger.set(p1.id, amount=50.0, outstanding_amount=0.0)
+
+    asyncio.run(_reallocate_ledger("u1", "c1", "s1", p1.trade_date))
+
+    stored_p1, stored_p2, stored_r = ledger.get(p1.id), ledger.get(p2.id), ledger.get(r.id)
+    assert (stored_p1.repaid_amount, stored_p1.outstanding_amount, stored_p1.status) == (50, 0, "已还")
+    assert (stored_p2.repaid_amount, stored_p2.outstanding_amount, stored_p2.status) == (100, 0, "已还")
+    assert [(ref.repayment_id, ref.amount) for ref in stored_p2.repayment_refs] == [(r.id, 100)]
+    assert (stored_r.applied_amount, stored_r.status) == (150, "已还")
+
+def test_replay_leaves_prefix_untouched(allocated_ledger):
+    ledger, p1, r, p2 = allocated_ledger
+    ledger.set(p2.id, amount=40.0)
+
+    changes = asyncio.run(_reallocate_ledger("u1", "c1", "s1", ledger.get(p2.id).trade_date))
+
+    assert ledger.get(p1.id).repaid_amount == 100
+    stored_p2, stored_r = ledger.get(p2.id), ledger.get(r.id)
+    assert (stored_p2.repaid_amount, stored_p2.outstanding_amount, stored_p2.status) == (40, 0, "已还")
+    assert (stored_r.applied_amount, stored_r.status) == (140, "部分还")
+    assert p1.id not in {after.id for _, after in changes}
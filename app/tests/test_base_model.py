@@ -0,0 +1,14 @@
+import pytest
+from app.services.mongodb.models.record import Record
+
+DOCUMENT = {"_id": "r1", "user_id": "u1", "card_id": "c1", "amount": 100.0}
+
+def test_partial_projection_unprojected_field_fails_loudly():
+    record = Record.from_document({"_id": "r1", "amount": 100.0}, fields=["id", "amount"])
+    assert record.dict() == {"id": "r1", "amount": 100.0}
+    with pytest.raises(AttributeError):
+        record.repaid_amount
+
+def test_trusted_full_document_fills_defaults():
+    record = Record.from_document(dict(DOCUMENT), trusted=True)
+    assert record.repaid_amount == 0
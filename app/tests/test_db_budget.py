@@ -0,0 +1,87 @@
+import pytest
+from app.utils.db_budget import DbUsage, assert_db_budget, finish_request, get_budget, record_mongo, record_redis
+
+def _usage(mongo_calls: int = 0, redis_calls: int = 0) -> DbUsage:
+    usage = DbUsage()
+    for _ in range(mongo_calls):
+        usage.add_mongo(1.0)
+    for _ in range(redis_calls):
+        usage.add_redis(1.0)
+    return usage
+
+def test_within_budget():
+    with assert_db_budget("GET /api/record/list", mongo_calls=2, redis_calls=1) as collected:
+        finish_request("GET /api/record/list", _usage(mongo_calls=2, redis_calls=1))
+    assert [route for route, _ in collected] == ["GET /api/record/list"]
+
+def test_over_budget_raises():
+    with pytest.raises(AssertionError, match="mongo_calls 3 > 2"):
+        with assert_db_budget("GET /api/record/list", mongo_calls=2):
+            finish_request("GET /api/record/list", _usage(mongo_calls=3))
+
+def test_only_checks_selected_route():
+    with assert_db_budget("GET /api/record/list", mongo_calls=1):
+        finish_request("GET /api/home/dashboard", _usage(mongo_calls=5))
+
+def test_uses_configured_route_budget():
+    budget = get_budget("POST /api/record/add")
+    with pytest.raises(AssertionError, match="POST /api/record/add"):
+        with assert_db_budget("POST /api/record/add"):
+            finish_request("POST /api/record/add", _usage(mongo_calls=budget["mongo_calls"] + 1))
+
+def test_counts_direct_calls():
+    with pytest.raises(AssertionError, match="direct: redis_calls 2 > 1"):
+        with assert_db_budget(redis_calls=1):
+            record_mongo(1.0)
+            record_redis(1.0)
+            record_redis(1.0)
+
+def test_api_record_add_budget(api_client, api_user):
+    payload = {
+        "card_id": api_user.card.id,
+        "swipe_type_id": api_user.swipe_type.id,
+        "consumption_type_id": api_user.consumption_type.id,
+        "amount": 100,
+        "record_type": "支付"
+    }
+    # 第一次请求回填基础数据缓存，之后按稳态预算检查
+    assert api_client.post("/api/record/add", json=payload).json()["errcode"] == 0
+    with assert_db_budget("POST /api/record/add"):
+        response = api_client.post("/api/record/add", json={**payload, "record_type": "还款", "amount": 150})
+    assert response.json()["errcode"] == 0
+    with assert_db_budget("POST /api/record/add"):
+        response = api_client.post("/api/record/add", json=payload)
+    assert response.json()["errcode"] == 0
+
+def test_api_record_list_budget(api_client, api_user):
+    payload = {
+        "card_id": api_user.card.id,
+        "swipe_type_id": api_user.swipe_type.id,
+        "consumption_type_id": api_user.consumption_type.id,
+        "amount": 10
+    }
+    for _ in range(3):
+        assert api_client.post("/api/record/add", json=payload).json()["errcode"] == 0
+    # 列表与总数各一次查询；会话读取最多一次 Redis
+    with assert_db_budget("GET /api/record/list", mongo_calls=2, redis_calls=1):
+        first = api_client.get("/api/record/list", params={"page_size": 2}).json()
+    assert first["errcode"] == 0
+    assert first["ret"]["total"] == 3
+    with assert_db_budget("GET /api/record/list", mongo_calls=1, redis_calls=1):
+        second = api_client.get("/api/record/list", params={
+            "page_size": 2, "after": first["ret"]["next_cursor"], "with_total": False
+        }).json()
+    assert len(second["ret"]["list"]) == 1
+
+def test_api_home_dashboard_budget(api_client, api_user):
+    payload = {
+        "card_id": api_user.card.id,
+        "swipe_type_id": api_user.swipe_type.id,
+        "consumption_type_id": api_user.consumption_type.id,
+        "amount": 100
+    }
+    assert api_client.post("/api/record/add", json=payload).json()["errcode"] == 0
+    api_client.get("/api/home/dashboard")
+    with assert_db_budget("GET /api/home/dashboard"):
+        response = api_client.get("/api/home/dashboard")
+    assert response.json()["errcode"] == 0
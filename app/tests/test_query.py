@@ -0,0 +1,70 @@
+import pytest
+from app.services.mongodb.models.record import Record
+from app.services.mongodb.query import (
+    QueryCompileError, compile_sort, equality_fields, parse_fields, parse_sort
+)
+
+LIST_FILTER = {"user_id": "u1", "is_active": True}
+
+def test_parse_sort_dict_literal():
+    assert parse_sort("{'trade_date': -1, 'created_at': 1}") == [("trade_date", -1), ("created_at", 1)]
+
+def test_parse_sort_comma_list():
+    assert parse_sort("-trade_date, +amount,created_at") == [("trade_date", -1), ("amount", 1), ("created_at", 1)]
+
+def test_parse_sort_empty():
+    assert parse_sort(None) == []
+    assert parse_sort("  ") == []
+
+@pytest.mark.parametrize("spec", [
+    "{'trade_date': 2}",
+    "{'$where': 1}",
+    "{'trade_date': __import__('os')}",
+    "{1, 2}",
+    "trade_date,-trade_date",
+])
+def test_parse_sort_rejects_invalid(spec):
+    with pytest.raises(QueryCompileError):
+        parse_sort(spec)
+
+@pytest.mark.parametrize("spec", ["__import__('os').system('id')", "['trade_date']"])
+def test_compile_sort_never_evaluates(spec):
+    # 非字典写法按字段名解析，不存在的字段没有索引可用
+    with pytest.raises(QueryCompileError):
+        compile_sort(Record, spec, equality_fields(LIST_FILTER))
+
+def test_equality_fields():
+    filter_dict = {**LIST_FILTER, "trade_date": {"$gte": 1}, "$or": [], "card_id": "c1"}
+    assert equality_fields(filter_dict) == ["user_id", "is_active", "card_id"]
+
+def test_compile_sort_appends_id_from_index():
+    assert compile_sort(Record, "{'trade_date': -1}", equality_fields(LIST_FILTER)) == [
+        ("trade_date", -1), ("_id", -1)
+    ]
+
+def test_compile_sort_inverted_index():
+    assert compile_sort(Record, "trade_date", equality_fields(LIST_FILTER)) == [("trade_date", 1), ("_id", 1)]
+
+def test_compile_sort_prefers_longer_equality_prefix():
+    filter_dict = {**LIST_FILTER, "card_id": "c1"}
+    # 两个索引都能完成排序，均附带 _id 次序；选择等值前缀更长的索引
+    assert compile_sort(Record, "-trade_date", equality_fields(filter_dict)) == [("trade_date", -1), ("_id", -1)]
+
+def test_compile_sort_default():
+    assert compile_sort(Record, None, equality_fields(LIST_FILTER), default=[("trade_date", -1)]) == [
+        ("trade_date", -1), ("_id", -1)
+    ]
+    assert compile_sort(Record, None, equality_fields(LIST_FILTER)) == []
+
+def test_compile_sort_rejects_unindexed():
+    with pytest.raises(QueryCompileError):
+        compile_sort(Record, "-amount", equality_fields(LIST_FILTER))
+    # 方向混合的排序无法由单个索引完成
+    with pytest.raises(QueryCompileError):
+        compile_sort(Record, "{'trade_date': 1, 'created_at': -1}", ["user_id", "card_id", "swipe_type_id", "is_active"])
+
+def test_parse_fields():
+    assert parse_fields(Record, None) is None
+    assert parse_fields(Record, "id, amount,amount", required=["trade_date", "_id"]) == ["id", "amount", "trade_date"]
+    with pytest.raises(QueryCompileError):
+        parse_fields(Record, "amount,password_hash")
@@ -0,0 +1,83 @@
+from app.services.rollup import compute_rollup_deltas, rollup_id, split_date_range
+from app.tests.conftest import local_dt, make_record
+
+def test_rollup_id_uses_none_for_missing_dimensions():
+    dimensions = {"user_id": "u1", "card_id": "c1", "swipe_type_id": None,
+                  "consumption_type_id": "t1", "month": "2024-01", "record_type": "支付"}
+    assert rollup_id(dimensions) == "u1:c1:none:t1:2024-01:支付"
+
+def test_deltas_for_new_record():
+    record = make_record(amount=100, trade_date=local_dt(2024, 1, 15))
+    deltas = compute_rollup_deltas([(None, record)])
+    assert list(deltas) == ["u1:c1:s1:t1:2024-01:支付"]
+    delta = deltas["u1:c1:s1:t1:2024-01:支付"]
+    assert (delta["amount"], delta["count"], delta["outstanding"]) == (100, 1, 100)
+    assert delta["dimensions"]["month"] == "2024-01"
+
+def test_deltas_for_soft_delete():
+    before = make_record(amount=100, outstanding_amount=40.0)
+    after = before.copy(update={"is_active": False})
+    delta = compute_rollup_deltas([(before, after)])["u1:c1:s1:t1:2024-01:支付"]
+    assert (delta["amount"], delta["count"], delta["outstanding"]) == (-100, -1, -40)
+
+def test_deltas_move_record_between_months():
+    before = make_record(amount=100, trade_date=local_dt(2024, 1, 31))
+    after = before.copy(update={"trade_date": local_dt(2024, 2, 1), "amount": 80.0, "outstanding_amount": 80.0})
+    deltas = compute_rollup_deltas([(before, after)])
+    assert deltas["u1:c1:s1:t1:2024-01:支付"]["count"] == -1
+    assert deltas["u1:c1:s1:t1:2024-02:支付"]["amount"] == 80
+    assert deltas["u1:c1:s1:t1:2024-02:支付"]["count"] == 1
+
+def test_deltas_drop_unchanged_rows():
+    # 只改描述的记录不产生增量
+    before = make_record(amount=100)
+    after = before.copy(update={"description": "备注"})
+    assert compute_rollup_deltas([(before, after)]) == {}
+
+def test_deltas_accumulate_repayment_allocation():
+    payment = make_record(amount=100)
+    repaid = payment.copy(update={"outstanding_amount": 0.0, "repaid_amount": 100.0, "status": "已还"})
+    repayment = make_record(amount=100, record_type="还款")
+    deltas = compute_rollup_deltas([(payment, repaid), (None, repayment)])
+    payment_delta = deltas["u1:c1:s1:t1:2024-01:支付"]
+    assert (payment_delta["amount"], payment_delta["count"], payment_delta["outstanding"]) == (0, 0, -100)
+    repayment_delta = deltas["u1:c1:s1:t1:2024-01:还款"]
+    assert (repayment_delta["amount"], repayment_delta["count"], repayment_delta["outstanding"]) == (100, 1, 0)
+
+def test_split_range_within_one_month():
+    start, end = local_dt(2024, 1, 5), local_dt(2024, 1, 20)
+    assert split_date_range(start, end) == (None, [{"$gte": start, "$lt": end}])
+
+def test_split_range_whole_months():
+    start, end = local_dt(2024, 1, 1), local_dt(2024, 3, 1)
+    assert split_date_range(start, end) == ({"$gte": "2024-01", "$lt": "2024-03"}, [])
+
+def test_split_range_partial_head_and_tail():
+    start, end = local_dt(2024, 1, 15), local_dt(2024, 4, 10)
+    month_filter, raw_filters = split_date_range(start, end)
+    assert month_filter == {"$gte": "2024-02", "$lt": "2024-04"}
+    assert raw_filters == [
+        {"$gte": start, "$lt": local_dt(2024, 2, 1)},
+        {"$gte": local_dt(2024, 4, 1), "$lt": end}
+    ]
+
+def test_split_range_across_year():
+    start, end = local_dt(2023, 12, 20), local_dt(2024, 2, 10)
+    month_filter, raw_filters = split_date_range(start, end)
+    assert month_filter == {"$gte": "2024-01", "$lt": "2024-02"}
+    assert raw_filters == [
+        {"$gte": start, "$lt": local_dt(2024, 1, 1)},
+        {"$gte": local_dt(2024, 2, 1), "$lt": end}
+    ]
+
+def test_split_range_without_full_month():
+    # 跨月但不含完整自然月，全部扫描原始记录
+    start, end = local_dt(2023, 12, 20), local_dt(2024, 1, 1)
+    assert split_date_range(start, end) == (None, [{"$gte": start, "$lt": end}])
+
+def test_split_range_open_ends():
+    assert split_date_range(None, None) == ({}, [])
+    start = local_dt(2024, 1, 15)
+    assert split_date_range(start, None) == ({"$gte": "2024-02"}, [{"$gte": start, "$lt": local_dt(2024, 2, 1)}])
+    end = local_dt(2024, 3, 10)
+    assert split_date_range(None, end) == ({"$lt": "2024-03"}, [{"$gte": local_dt(2024, 3, 1), "$lt": end}])
@@ -0,0 +1,17 @@
+from datetime import datetime, timedelta, timezone
+import pytest
+from app.utils import encode_cursor, decode_cursor
+
+def test_cursor_round_trip():
+    trade_date = datetime(2024, 3, 1, 12, 30, tzinfo=timezone(timedelta(hours=8)))
+    token = encode_cursor([trade_date, "record-id"])
+    assert "=" not in token
+    assert decode_cursor(token) == [trade_date, "record-id"]
+
+def test_cursor_keeps_plain_values():
+    assert decode_cursor(encode_cursor([1, "a", None])) == [1, "a", None]
+
+@pytest.mark.parametrize("token", ["not-a-cursor", "%%%", "eyJhIjoxfQ"])
+def test_decode_cursor_rejects_invalid(token):
+    with pytest.raises(ValueError):
+        decode_cursor(token)
@@ -0,0 +1,144 @@
+"""
+请求级数据库调用预算
+- 每个请求持有一个 DbUsage（contextvar），统计 MongoDB/Redis 命令次数、总耗时与单次最大返回文档数
+- 请求结束后按路由预算检查，超出时记录警告并可在响应头中返回用量
+- assert_db_budget 供测试断言接口的调用次数，避免 N+1 查询回归
+
+配置示例（config["db_budget"]）:
+    {
+        "header": True,
+        "default": {"mongo_calls": 30, "redis_calls": 30, "total_ms": 1000},
+        "routes": {"POST /api/record/add": {"mongo_calls": 10}}
+    }
+"""
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from app.config import config
+from app.utils.logger import get_logger
+
+logger = get_logger()
+
+# 预算项：命令次数、总耗时与单次最大返回文档数
+BUDGET_FIELDS = ["mongo_calls", "redis_calls", "total_ms", "max_documents"]
+
+class DbUsage:
+    """单个请求的数据库调用统计（MongoDB 监听器在驱动线程中回调，需加锁）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.mongo_calls = 0
+        self.mongo_ms = 0.0
+        self.redis_calls = 0
+        self.redis_ms = 0.0
+        self.max_documents = 0
+
+    def add_mongo(self, duration_ms: float, documents: int = 0):
+        with self._lock:
+            self.mongo_calls += 1
+            self.mongo_ms += duration_ms
+            self.max_documents = max(self.max_documents, documents)
+
+    def add_redis(self, duration_ms: float):
+        with self._lock:
+            self.redis_calls += 1
+            self.redis_ms += duration_ms
+
+    @property
+    def total_ms(self) -> float:
+        return self.mongo_ms + self.redis_ms
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "mongo_calls": self.mongo_calls,
+            "mongo_ms": round(self.mongo_ms, 3),
+            "redis_calls": self.redis_calls,
+            "redis_ms": round(self.redis_ms, 3),
+            "total_ms": round(self.total_ms, 3),
+            "max_documents": self.max_documents
+        }
+
+# 当前请求的用量，请求外为 None（不统计）
+db_usage: ContextVar[Optional[DbUsage]] = ContextVar("db_usage", default=None)
+
+# 测试用的用量收集器：每个收集器是一个 [(路由, 用量)] 列表
+_collectors: List[List[Tuple[str, DbUsage]]] = []
+_collectors_lock = threading.Lock()
+
+def record_mongo(duration_ms: float, documents: int = 0, usage: Optional[DbUsage] = None):
+    """记录一次 MongoDB 命令"""
+    usage = usage or db_usage.get()
+    if usage is not None:
+        usage.add_mongo(duration_ms, documents)
+
+def record_redis(duration_ms: float):
+    """记录一次 Redis 命令"""
+    usage = db_usage.get()
+    if usage is not None:
+        usage.add_redis(duration_ms)
+
+def get_budget(route: str) -> Dict[str, float]:
+    """路由的预算（默认预算与路由预算合并）"""
+    budget_config = config.get("db_budget") or {}
+    budget = dict(budget_config.get("default") or {})
+    budget.update((budget_config.get("routes") or {}).get(route) or {})
+    return budget
+
+def check_budget(usage: DbUsage, budget: Dict[str, float]) -> List[str]:
+    """返回超出预算的项，如 ["mongo_calls 35 > 30"]"""
+    values = usage.to_dict()
+    return [
+        f"{field} {values[field]} > {budget[field]}"
+        for field in BUDGET_FIELDS
+        if budget.get(field) is not None and values[field] > budget[field]
+    ]
+
+def finish_request(route: str, usage: DbUsage) -> List[str]:
+    """请求结束：检查预算、通知测试收集器，返回超出预算的项"""
+    violations = check_budget(usage, get_budget(route))
+    if violations:
+        logger.warning(f"数据库调用超出预算: {route} {', '.join(violations)} usage={usage.to_dict()}")
+    with _collectors_lock:
+        for collector in _collectors:
+            collector.append((route, usage))
+    return violations
+
+@contextmanager
+def assert_db_budget(route: Optional[str] = None, **limits) -> Iterator[List[Tuple[str, DbUsage]]]:
+    """断言代码块内请求的数据库调用不超过预算（供 pytest 使用）
+
+    用法:
+        with assert_db_budget("POST /api/record/add", mongo_calls=6, redis_calls=4):
+            client.post("/api/record/add", json=payload)
+
+    Args:
+        route: 只检查该路由（路由模板，如 "POST /api/record/add"），默认检查全部
+        limits: 预算项，见 BUDGET_FIELDS；未指定时使用配置中的路由预算
+
+    代码块内直接调用（不经过 HTTP）的数据库命令以路由 "direct" 统计
+    """
+    collected: List[Tuple[str, DbUsage]] = []
+    direct = DbUsage()
+    token = db_usage.set(direct)
+    with _collectors_lock:
+        _collectors.append(collected)
+    try:
+        yield collected
+    finally:
+        db_usage.reset(token)
+        with _collectors_lock:
+            _collectors.remove(collected)
+
+    if direct.mongo_calls or direct.redis_calls:
+        collected.append(("direct", direct))
+    failures = []
+    for request_route, usage in collected:
+        if route is not None and request_route != route:
+            continue
+        budget = dict(limits) if limits else get_budget(request_route)
+        violations = check_budget(usage, budget)
+        if violations:
+            failures.append(f"{request_route}: {', '.join(violations)}")
+    if failures:
+        raise AssertionError("数据库调用超出预算: " + "; ".join(failures))
@@ -1,27 +1,142 @@
 import asyncio
+import math
 import time
 import uuid
+from contextlib import asynccontextmanager
 from typing import Optional
-from app.services.redis.client import business_client
+from app.config import config
+from app.services.redis.client import business_client, lock_wait_client
 from app.utils.logger import get_logger
+from app.utils.redis_script import LuaScript
 
 logger = get_logger()
 
+# 同时阻塞等待释放信号的等待者上限（与锁等待连接池大小一致），超出的等待者改为定时重试
+_wait_slots = asyncio.Semaphore(config["lock_wait"]["max_connections"])
+
+# 发出信号：信号列表最多保留一个信号，并随锁超时过期，避免无人等待时堆积
+# KEYS: 信号列表  ARGV: 锁超时(毫秒)
+NOTIFY_SCRIPT = LuaScript("""
+if redis.call("LLEN", KEYS[1]) == 0 then
+    redis.call("RPUSH", KEYS[1], 1)
+end
+redis.call("PEXPIRE", KEYS[1], ARGV[1])
+return 1
+""")
+
+# 释放锁：只有锁的持有者才能释放
+# 有排队的等待者（公平模式）时返回队首，由调用方唤醒其私有信号列表；否则唤醒任意一个等待者（共享信号列表）
+# KEYS: 锁, 等待队列, 共享信号列表  ARGV: 锁值, 锁超时(毫秒)
+# 返回: 0 未持有锁, 1 已释放, 字符串 已释放且需唤醒的队首
+RELEASE_SCRIPT = LuaScript("""
+if redis.call("GET", KEYS[1]) ~= ARGV[1] then
+    return 0
+end
+redis.call("DEL", KEYS[1])
+local head = redis.call("ZRANGE", KEYS[2], 0, 0)[1]
+if head then
+    return head
+end
+if redis.call("LLEN", KEYS[3]) == 0 then
+    redis.call("RPUSH", KEYS[3], 1)
+end
+redis.call("PEXPIRE", KEYS[3], ARGV[2])
+return 1
+""")
+
+# 延长锁：只有锁的持有者才能延长
+EXTEND_SCRIPT = LuaScript("""
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("EXPIRE", KEYS[1], ARGV[2])
+else
+    return 0
+end
+""")
+
+# 公平模式获取锁：按到达顺序排队（分数为等待截止时间，同一类锁超时相同，因此与到达顺序一致），
+# 只有队首能获取锁。每次尝试都续约自己的租约；已超过截止时间的等待者、以及租约过期
+# （进程退出等，不再续约）的队首从队列中移除，不会阻塞后面的等待者直到其截止时间
+# KEYS: 锁, 等待队列, 租约  ARGV: 锁值, 锁超时(毫秒), 当前时间(毫秒), 等待截止时间(毫秒), 租约时长(毫秒)
+FAIR_ACQUIRE_SCRIPT = LuaScript("""
+local now = tonumber(ARGV[3])
+local expired = redis.call("ZRANGEBYSCORE", KEYS[2], "-inf", now)
+for _, member in ipairs(expired) do
+    redis.call("ZREM", KEYS[2], member)
+    redis.call("HDEL", KEYS[3], member)
+end
+redis.call("ZADD", KEYS[2], "NX", ARGV[4], ARGV[1])
+redis.call("HSET", KEYS[3], ARGV[1], now + tonumber(ARGV[5]))
+local head
+while true do
+    head = redis.call("ZRANGE", KEYS[2], 0, 0)[1]
+    local lease = tonumber(redis.call("HGET", KEYS[3], head))
+    if lease and lease >= now then
+        break
+    end
+    redis.call("ZREM", KEYS[2], head)
+    redis.call("HDEL", KEYS[3], head)
+end
+local last = redis.call("ZRANGE", KEYS[2], -1, -1, "WITHSCORES")[2]
+redis.call("PEXPIREAT", KEYS[2], last)
+redis.call("PEXPIREAT", KEYS[3], last)
+if head == ARGV[1] and redis.call("SET", KEYS[1], ARGV[1], "NX", "PX", ARGV[2]) then
+    redis.call("ZREM", KEYS[2], ARGV[1])
+    redis.call("HDEL", KEYS[3], ARGV[1])
+    return 1
+end
+return 0
+""")
+
+# 放弃等待（超时或取消）：离开队列并删除私有信号列表，锁空闲时返回需唤醒的新队首
+# KEYS: 锁, 等待队列, 租约, 私有信号列表  ARGV: 锁值
+LEAVE_SCRIPT = LuaScript("""
+redis.call("ZREM", KEYS[2], ARGV[1])
+redis.call("HDEL", KEYS[3], ARGV[1])
+redis.call("DEL", KEYS[4])
+if redis.call("EXISTS", KEYS[1]) == 0 then
+    local head = redis.call("ZRANGE", KEYS[2], 0, 0)[1]
+    if head then
+        return head
+    end
+end
+return 0
+""")
+
+class LockLostError(RuntimeError):
+    """持有期间锁已过期或被其他进程获取"""
+
 class DynamicRedisLock:
-    """动态Redis锁，支持基于动态key的分布式锁"""
+    """动态Redis锁，支持基于动态key的分布式锁
+
+    - 获取失败时阻塞在信号列表上（BLPOP），持有者释放时立即唤醒等待者，不再轮询
+    - 持有者异常退出未释放时，等待者最多 wait_slice 秒后重新检查（锁过期后即可获取）
+    - 阻塞等待使用独立的锁等待连接池，同时阻塞的等待者数量有上限，超出时退化为每 wait_slice 秒重试
+    - fair=True 时按到达顺序（FIFO）获取锁，等待者每次重试时续约，异常退出的队首租约过期后被移出队列
+    - 脚本通过 EVALSHA 调用，只在服务端缺少脚本时发送一次源码
+    - 锁以外的键以锁键为哈希标签（{锁键}:...），与锁键位于同一槽位，脚本涉及的键全部经 KEYS 传入
+    """
     
-    def __init__(self, key: str, timeout: int = 30, retry_interval: float = 0.1):
+    def __init__(self, key: str, timeout: int = 30, wait_slice: int = 1, fair: bool = False):
         """
         初始化动态Redis锁
         
         Args:
             key: 锁的唯一标识
-            timeout: 锁的超时时间（秒）
-            retry_interval: 获取锁失败时的重试间隔（秒）
+            timeout: 锁的超时时间（秒），同时也是获取锁的最长等待时间
+            wait_slice: 单次阻塞等待的最长时间（秒，整数），需小于 Redis 连接的 socket_timeout
+            fair: 是否按到达顺序获取锁
         """
         self.key = f"dynamic_lock:{key}"
+        # 哈希标签为完整锁键，Redis Cluster 下与锁键位于同一槽位
+        tag = f"{{{self.key}}}"
+        self.queue_key = f"{tag}:queue"
+        self.lease_key = f"{tag}:lease"
+        self.signal_key = f"{tag}:signal"
         self.timeout = timeout
-        self.retry_interval = retry_interval
+        self.wait_slice = max(int(wait_slice), 1)
+        # 租约覆盖两次等待间隔，正常等待的队首不会被误移出队列
+        self.lease_ms = (2 * self.wait_slice + 1) * 1000
+        self.fair = fair
         self.lock_value = None
         self.acquired = False
     
@@ -33,6 +148,52 @@ class DynamicRedisLock:
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         """异步上下文管理器出口"""
         await self.release()
+
+    async def _try_acquire(self, deadline_ms: int) -> bool:
+        """尝试获取一次锁"""
+        if self.fair:
+            now_ms = int(time.time() * 1000)
+            result = await FAIR_ACQUIRE_SCRIPT(
+                business_client, [self.key, self.queue_key, self.lease_key],
+                [self.lock_value, self.timeout * 1000, now_ms, deadline_ms, self.lease_ms]
+            )
+            return result == 1
+        # 使用 SET 命令的 NX 和 EX 选项实现原子操作
+        return bool(await business_client.set(self.key, self.lock_value, nx=True, ex=self.timeout))
+
+    def _waiter_signal_key(self, lock_value: str) -> str:
+        """公平模式下等待者的私有信号列表"""
+        return f"{self.signal_key}:{lock_value}"
+
+    async def _wait_signal(self, remaining: float):
+        """阻塞等待释放信号，最多 wait_slice 秒"""
+        wait = min(math.ceil(remaining), self.wait_slice)
+        if _wait_slots.locked():
+            # 阻塞等待的连接已用尽：定时重试，不占用连接
+            await asyncio.sleep(min(remaining, wait))
+            return
+        signal_key = self._waiter_signal_key(self.lock_value) if self.fair else self.signal_key
+        async with _wait_slots:
+            await lock_wait_client.blpop([signal_key], timeout=wait)
+
+    async def _notify_waiter(self, head):
+        """唤醒公平模式下的队首等待者"""
+        if isinstance(head, bytes):
+            head = head.decode()
+        await NOTIFY_SCRIPT(business_client, [self._waiter_signal_key(head)], [self.timeout * 1000])
+
+    async def _leave_queue(self):
+        """公平模式下放弃等待时离开队列"""
+        try:
+            head = await LEAVE_SCRIPT(
+                business_client,
+                [self.key, self.queue_key, self.lease_key, self._waiter_signal_key(self.lock_value)],
+                [self.lock_value]
+            )
+            if head != 0:
+                await self._notify_waiter(head)
+        except Exception as e:
+            logger.warning(f"离开动态锁等待队列失败: {self.key}, 错误: {str(e)}")
     
     async def acquire(self):
         """
@@ -41,31 +202,25 @@ class DynamicRedisLock:
         if self.acquired:
             return
         
-        # 生成唯一的锁值，用于安全释放
+        # 生成唯一的锁值，用于安全释放，公平模式下同时作为排队标识
         self.lock_value = f"{uuid.uuid4().hex}_{int(time.time())}"
         start_time = time.time()
+        deadline_ms = int((start_time + self.timeout) * 1000)
         
         try:
             while True:
-                # 使用 SET 命令的 NX 和 EX 选项实现原子操作
-                result = await business_client.set(
-                    self.key, 
-                    self.lock_value, 
-                    nx=True,  # 只在key不存在时设置
-                    ex=self.timeout  # 设置过期时间
-                )
-                
-                if result:
+                if await self._try_acquire(deadline_ms):
                     self.acquired = True
                     logger.debug(f"获取动态锁成功: {self.key}")
                     return
                 
                 # 检查超时
-                if time.time() - start_time > self.timeout:
+                remaining = self.timeout - (time.time() - start_time)
+                if remaining <= 0:
                     raise TimeoutError(f"获取动态锁超时: {self.key}, 超时时间: {self.timeout}秒")
                 
-                # 等待重试
-                await asyncio.sleep(self.retry_interval)
+                # 等待释放信号
+                await self._wait_signal(remaining)
                 
         except TimeoutError:
             # 超时异常直接抛出
@@ -74,6 +229,9 @@ class DynamicRedisLock:
             # 其他异常包装后抛出
             logger.error(f"获取动态锁异常: {self.key}, 错误: {str(e)}")
             raise RuntimeError(f"获取锁时发生异常: {str(e)}")
+        finally:
+            if self.fair and not self.acquired:
+                await self._leave_queue()
     
     async def release(self):
         """
@@ -83,20 +241,17 @@ class DynamicRedisLock:
             return
         
         try:
-            # 使用 Lua 脚本确保只有锁的持有者才能释放锁
-            lua_script = """
-            if redis.call("GET", KEYS[1]) == ARGV[1] then
-                return redis.call("DEL", KEYS[1])
-            else
-                return 0
-            end
-            """
-            
-            result = await business_client.eval(
-                lua_script, 1, self.key, self.lock_value
+            # 使用 Lua 脚本确保只有锁的持有者才能释放锁，并唤醒下一个等待者
+            result = await RELEASE_SCRIPT(
+                business_client, [self.key, self.queue_key, self.signal_key],
+                [self.lock_value, self.timeout * 1000]
             )
             
-            if result == 1:
+            if not isinstance(result, int):
+                # 释放后唤醒队首等待者
+                await self._notify_waiter(result)
+                logger.debug(f"释放动态锁成功: {self.key}")
+            elif result == 1:
                 logger.debug(f"释放动态锁成功: {self.key}")
             else:
                 logger.warning(f"释放动态锁失败，锁可能已被其他进程持有或已过期: {self.key}")
@@ -122,16 +277,8 @@ class DynamicRedisLock:
         
         try:
             # 使用 Lua 脚本确保只有锁的持有者才能延长锁
-            lua_script = """
-            if redis.call("GET", KEYS[1]) == ARGV[1] then
-                return redis.call("EXPIRE", KEYS[1], ARGV[2])
-            else
-                return 0
-            end
-            """
-            
-            result = await business_client.eval(
-                lua_script, 1, self.key, self.lock_value, str(extend_time)
+            result = await EXTEND_SCRIPT(
+                business_client, [self.key], [self.lock_value, extend_time]
             )
             
             if result == 1:
@@ -143,6 +290,44 @@ class DynamicRedisLock:
             logger.error(f"延长动态锁异常: {self.key}, 错误: {str(e)}")
             raise
     
+    @asynccontextmanager
+    async def keep_alive(self, interval: Optional[float] = None):
+        """
+        持有锁期间定期续期，用于执行时间可能超过锁超时的操作
+        续期失败（锁已丢失）时取消代码块并抛出 LockLostError，不再在失去互斥的情况下继续执行
+        
+        Args:
+            interval: 续期间隔（秒），默认锁超时的三分之一
+        """
+        if not self.acquired:
+            raise RuntimeError("锁未获取，无法续期")
+        interval = interval or max(self.timeout / 3, 1)
+        task = asyncio.current_task()
+        lost = False
+        
+        async def renew():
+            nonlocal lost
+            while True:
+                await asyncio.sleep(interval)
+                try:
+                    await self.extend_lock()
+                except Exception:
+                    lost = True
+                    task.cancel()
+                    return
+        
+        renewer = asyncio.create_task(renew())
+        try:
+            yield self
+        except asyncio.CancelledError:
+            if lost:
+                raise LockLostError(f"持有期间动态锁已丢失: {self.key}")
+            raise
+        finally:
+            renewer.cancel()
+        if lost:
+            raise LockLostError(f"持有期间动态锁已丢失: {self.key}")
+    
     def is_acquired(self) -> bool:
         """检查锁是否已获取"""
         return self.acquired
@@ -160,6 +345,58 @@ def create_user_update_lock(user_id: str, timeout: int = 10) -> DynamicRedisLock
     """
     return DynamicRedisLock(
         key=f"user_update_lock:{user_id}",
+        timeout=timeout
+    )
+
+def create_ledger_lock(user_id: str, card_id: str, swipe_type_id: str, timeout: int = 10) -> DynamicRedisLock:
+    """
+    为账本（用户 × 信用卡 × 刷卡类型）创建锁，串行化同一账本上的还款分配
+    不同账本的锁互不影响；按到达顺序获取，批量写入时不会有请求长期等不到锁
+    
+    Args:
+        user_id: 用户ID
+        card_id: 信用卡ID
+        swipe_type_id: 刷卡类型ID
+        timeout: 锁超时时间（秒）
+        
+    Returns:
+        DynamicRedisLock: 动态Redis锁实例
+    """
+    return DynamicRedisLock(
+        key=f"ledger_lock:{user_id}:{card_id}:{swipe_type_id}",
         timeout=timeout,
-        retry_interval=1
+        fair=True
+    )
+
+def create_rollup_lock(user_id: str, timeout: int = 30) -> DynamicRedisLock:
+    """
+    为用户的月度汇总创建锁，串行化汇总增量写入与从原始记录重建
+    重建期间暂停该用户的增量写入，避免增量被重建覆盖或新建的汇总行被清理
+    
+    Args:
+        user_id: 用户ID
+        timeout: 锁超时时间（秒）
+        
+    Returns:
+        DynamicRedisLock: 动态Redis锁实例
+    """
+    return DynamicRedisLock(
+        key=f"rollup_lock:{user_id}",
+        timeout=timeout
+    )
+
+def create_dashboard_lock(user_id: str, timeout: int = 30) -> DynamicRedisLock:
+    """
+    为用户的看板快照创建锁，串行化快照增量写入与全量重建
+    
+    Args:
+        user_id: 用户ID
+        timeout: 锁超时时间（秒）
+        
+    Returns:
+        DynamicRedisLock: 动态Redis锁实例
+    """
+    return DynamicRedisLock(
+        key=f"dashboard_lock:{user_id}",
+        timeout=timeout
     )
@@ -3,6 +3,8 @@ import asyncio
 
 class EVENTS:
     SEND_RESPONSE = "send_response"             # 发送回复
+    RECORD_CHANGED = "record_changed"           # 记录变更（参数：user_id, [(变更前, 变更后)]）
+    CACHE_INVALIDATED = "cache_invalidated"     # 缓存失效（参数：集合, user_id, id；集合为 None 表示全部）
     
 class EventManager:
     """基于装饰器的事件管理器"""
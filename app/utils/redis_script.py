@@ -0,0 +1,23 @@
+"""
+Redis Lua 脚本
+脚本在模块加载时计算 SHA1，调用时使用 EVALSHA；服务端没有缓存该脚本（首次调用、
+Redis 重启或 SCRIPT FLUSH 后）时先 SCRIPT LOAD 再重试，避免每次调用都发送完整脚本
+"""
+import hashlib
+from typing import Any, Sequence
+from redis.exceptions import NoScriptError
+
+class LuaScript:
+    """只注册一次、通过 EVALSHA 调用的 Lua 脚本"""
+
+    def __init__(self, source: str):
+        self.source = source
+        self.sha = hashlib.sha1(source.encode("utf-8")).hexdigest()
+
+    async def __call__(self, client, keys: Sequence[str] = (), args: Sequence[Any] = ()) -> Any:
+        """在指定客户端上执行脚本"""
+        try:
+            return await client.evalsha(self.sha, len(keys), *keys, *args)
+        except NoScriptError:
+            await client.script_load(self.source)
+            return await client.evalsha(self.sha, len(keys), *keys, *args)
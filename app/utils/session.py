@@ -1,15 +1,50 @@
 import uuid
 import json
+import time
 from datetime import datetime
-from typing import Any, Dict, Optional
-from app.utils import get_logger
+from typing import Any, Dict, Optional, Tuple
+from app.utils.logger import get_logger
+from app.utils.event_manager import event_manager, EVENTS
+from app.utils.redis_script import LuaScript
 
 logger = get_logger()
 
+# 失效消息中会话使用的集合名
+SESSION_COLLECTION = "sessions"
+
+# 读取会话并按需续期：剩余有效期低于阈值时才 EXPIRE，返回 [会话数据, 续期后的剩余秒数]
+# （GETEX 只能无条件续期，条件续期需要在脚本内判断，仍为一次往返）
+GET_SESSION_SCRIPT = LuaScript("""
+local data = redis.call("GET", KEYS[1])
+if not data then
+    return {false, -2}
+end
+local ttl = redis.call("TTL", KEYS[1])
+if ttl >= 0 and ttl < tonumber(ARGV[2]) then
+    redis.call("EXPIRE", KEYS[1], ARGV[1])
+    ttl = tonumber(ARGV[1])
+end
+return {data, ttl}
+""")
+
 class SessionManager:
-    def __init__(self, prefix: str = "BB:s:", expire_days: int = 180):
+    """Redis 会话管理
+
+    - 读取会话一次往返：脚本内 GET，剩余有效期低于阈值时才续期（最多每天续期一次）
+    - 已验证的会话（及不存在的会话ID）缓存在进程内，短 TTL，命中时无需访问 Redis
+    - 更新、删除会话时清除本进程缓存，并经缓存失效总线通知其他进程
+    """
+
+    def __init__(self, prefix: str = "BB:s:", expire_days: int = 180,
+                 refresh_interval: int = 24 * 60 * 60, local_ttl: int = 30, local_max_size: int = 10000):
         self.prefix = prefix
         self.expire_seconds = expire_days * 24 * 60 * 60
+        # 剩余有效期低于该值时续期
+        self.refresh_threshold = max(self.expire_seconds - refresh_interval, 0)
+        self.local_ttl = local_ttl
+        self.local_max_size = local_max_size
+        # 进程内缓存：session_id -> (过期时间, 会话数据或 None)
+        self._local: Dict[str, Tuple[float, Optional[Dict[str, Any]]]] = {}
         self._session_client = None
     
     @property # 使用装饰器
@@ -24,6 +59,29 @@ class SessionManager:
         """获取完整的Redis键名"""
         return f"{self.prefix}{session_id}"
     
+    def _cache_local(self, session_id: str, session_data: Optional[Dict[str, Any]]):
+        """写入进程内缓存，超出容量时淘汰最早写入的项"""
+        self._local.pop(session_id, None)
+        if len(self._local) >= self.local_max_size:
+            now = time.monotonic()
+            for key in [key for key, (expires_at, _) in self._local.items() if expires_at <= now]:
+                del self._local[key]
+            while len(self._local) >= self.local_max_size:
+                del self._local[next(iter(self._local))]
+        self._local[session_id] = (time.monotonic() + self.local_ttl, session_data)
+
+    def evict_local(self, session_id: Optional[str] = None):
+        """清除本进程缓存，session_id 为 None 时全部清除"""
+        if session_id is None:
+            self._local.clear()
+        else:
+            self._local.pop(session_id, None)
+
+    async def _broadcast_invalidation(self, session_id: str):
+        """通知其他进程清除该会话的缓存"""
+        from app.services.redis import invalidation_bus
+        await invalidation_bus.publish(SESSION_COLLECTION, None, session_id)
+
     async def create_session(self, **kwargs) -> tuple[str, dict]:
         """创建新会话并返回会话ID及内容"""
         session_id = str(uuid.uuid4())
@@ -39,26 +97,32 @@ class SessionManager:
 
         # 存储到Redis
         await self.session_client.set(key, json.dumps(session_data), ex=self.expire_seconds)
+        self._cache_local(session_id, session_data)
         logger.info(f"创建新会话: {session_id}")
         return session_id, session_data
     
     async def get_session(self, session_id: str) -> Optional[Dict[str, Any]]:
-        """获取会话数据"""
+        """获取会话数据（返回副本，可自由修改）"""
+        entry = self._local.get(session_id)
+        if entry and entry[0] > time.monotonic():
+            return dict(entry[1]) if entry[1] is not None else None
+
         key = self._get_key(session_id)
-        data = await self.session_client.get(key)
-        
+        data, _ = await GET_SESSION_SCRIPT(
+            self.session_client, [key], [self.expire_seconds, self.refresh_threshold]
+        )
+
+        session_data = None
         if not data:
             logger.warning(f"会话不存在: {session_id}")
-            return None
+        else:
+            try:
+                session_data = json.loads(data)
+            except Exception as e:
+                logger.error(f"解析会话数据失败: {e}")
 
-        # 更新过期时间
-        await self.session_client.expire(key, self.expire_seconds)
-        
-        try:
-            return json.loads(data)
-        except Exception as e:
-            logger.error(f"解析会话数据失败: {e}")
-            return None
+        self._cache_local(session_id, session_data)
+        return dict(session_data) if session_data is not None else None
     
     async def update_session(self, session_id: str, **kwargs) -> bool:
         """更新会话数据，使用关键字参数更新会话"""
@@ -77,6 +141,8 @@ class SessionManager:
         
         # 保存回Redis
         await self.session_client.set(key, json.dumps(current_data), ex=self.expire_seconds)
+        self._cache_local(session_id, current_data)
+        await self._broadcast_invalidation(session_id)
         logger.info(f"更新会话: {session_id}")
         return True
     
@@ -84,7 +150,17 @@ class SessionManager:
         """删除会话"""
         key = self._get_key(session_id)
         result = await self.session_client.delete(key)
+        self.evict_local(session_id)
+        await self._broadcast_invalidation(session_id)
         return result > 0
 
 # 创建全局会话管理器实例
-session_manager = SessionManager()
\ No newline at end of file
+session_manager = SessionManager()
+
+@event_manager.on(EVENTS.CACHE_INVALIDATED)
+def evict_session_cache(collection: Optional[str], user_id: Optional[str], id: Optional[str] = None):
+    """收到失效消息后清除进程内的会话缓存"""
+    if collection is None or (collection == SESSION_COLLECTION and id is None):
+        session_manager.evict_local()
+    elif collection == SESSION_COLLECTION:
+        session_manager.evict_local(id)
@@ -1,4 +1,6 @@
 import re
+import json
+import base64
 import random
 from datetime import datetime
 
@@ -82,3 +84,25 @@ def to_local_timezone(dt):
     if dt.tzinfo is None:
         return dt.replace(tzinfo=datetime.now().astimezone().tzinfo)
     return dt.astimezone(datetime.now().astimezone().tzinfo)
+
+
+def to_month_key(dt):
+    """返回本地时区下的自然月键 YYYY-MM"""
+    return to_local_timezone(dt).strftime("%Y-%m")
+
+def encode_cursor(values: list) -> str:
+    """将游标值编码为不透明的 URL 安全字符串（datetime 以 ISO 格式保存）"""
+    data = [{"$dt": v.isoformat()} if isinstance(v, datetime) else v for v in values]
+    raw = json.dumps(data, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(token: str) -> list:
+    """解码 encode_cursor 生成的游标，格式非法时抛出 ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        data = json.loads(raw)
+    except Exception as e:
+        raise ValueError(f"无效的游标: {token}") from e
+    if not isinstance(data, list):
+        raise ValueError(f"无效的游标: {token}")
+    return [datetime.fromisoformat(v["$dt"]) if isinstance(v, dict) and "$dt" in v else v for v in data]
@@ -0,0 +1,135 @@
+"""
+有界工作线程池
+将阻塞事件循环的 CPU 密集型调用（如 bcrypt 哈希）放到独立的线程池执行：
+- 同时执行的任务数不超过 workers，排队的任务数不超过 max_queue
+- 队列已满时立即抛出 WorkerPoolBusy，调用方快速失败，不再让请求无限排队
+- 名额在线程池任务真正结束（或排队中被取消）时才释放，请求取消后仍在执行的任务继续占用名额
+- 统计执行中/排队数量、峰值、拒绝数与等待/执行耗时
+
+bcrypt 计算时释放 GIL，线程池即可并行，不需要进程池
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+from app.config import config
+from app.utils.logger import get_logger
+
+logger = get_logger()
+
+class WorkerPoolBusy(RuntimeError):
+    """线程池排队已满"""
+
+class BoundedWorkerPool:
+    """限制并发与排队长度的线程池"""
+
+    def __init__(self, name: str, workers: int = 2, max_queue: int = 16):
+        self.name = name
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        # 已提交未完成的任务数（执行中 + 排队）
+        self.in_flight = 0
+        self.running = 0
+        self.peak_in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.rejected = 0
+        self.wait_ms = 0.0
+        self.run_ms = 0.0
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """懒加载线程池"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=f"{self.name}-pool")
+        return self._executor
+
+    @property
+    def queued(self) -> int:
+        """排队中的任务数"""
+        return max(self.in_flight - self.running, 0)
+
+    def _run(self, submitted_at: float, fn: Callable, args: tuple) -> Any:
+        """在工作线程中执行并统计耗时"""
+        started_at = time.perf_counter()
+        with self._lock:
+            self.running += 1
+            self.wait_ms += (started_at - submitted_at) * 1000
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self.running -= 1
+                self.run_ms += (time.perf_counter() - started_at) * 1000
+
+    async def run(self, fn: Callable, *args) -> Any:
+        """在线程池中执行 fn(*args)，排队已满时抛出 WorkerPoolBusy"""
+        with self._lock:
+            if self.in_flight >= self.workers + self.max_queue:
+                self.rejected += 1
+                busy = True
+            else:
+                self.in_flight += 1
+                self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+                busy = False
+        if busy:
+            logger.warning(f"线程池繁忙，拒绝任务: {self.name} in_flight={self.in_flight}")
+            raise WorkerPoolBusy(f"{self.name} 线程池繁忙")
+
+        try:
+            future = self.executor.submit(self._run, time.perf_counter(), fn, args)
+        except BaseException:
+            with self._lock:
+                self.in_flight -= 1
+            raise
+        # 名额随线程池任务结束释放，而不是随等待的协程结束释放：
+        # 请求取消时排队中的任务被一并取消，已在执行的任务执行完才释放名额
+        future.add_done_callback(self._on_done)
+        return await asyncio.wrap_future(future)
+
+    def _on_done(self, future: Future):
+        """线程池任务结束（完成、失败或排队中被取消）时释放名额"""
+        with self._lock:
+            self.in_flight -= 1
+            if future.cancelled():
+                self.cancelled += 1
+            elif future.exception() is not None:
+                self.failed += 1
+            else:
+                self.completed += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """当前状态与累计统计"""
+        with self._lock:
+            finished = self.completed + self.failed
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "running": self.running,
+                "queued": self.queued,
+                "peak_in_flight": self.peak_in_flight,
+                "completed": self.completed,
+                "failed": self.failed,
+                "cancelled": self.cancelled,
+                "rejected": self.rejected,
+                "avg_wait_ms": round(self.wait_ms / finished, 3) if finished else 0.0,
+                "avg_run_ms": round(self.run_ms / finished, 3) if finished else 0.0
+            }
+
+    def shutdown(self):
+        """关闭线程池"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+# 密码哈希线程池
+_password_config = config.get("password_pool") or {}
+password_pool = BoundedWorkerPool(
+    "password",
+    workers=_password_config.get("workers", 2),
+    max_queue=_password_config.get("max_queue", 16)
+)
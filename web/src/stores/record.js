@@ -9,6 +9,9 @@ import {
   getRecentConsumptions
 } from '@/api/record'
 
+// 列表页展示所需字段，避免返回还款分配明细等大字段
+const LIST_FIELDS = 'id,trade_date,created_at,amount,consumption_type_name,card_bank,card_number'
+
 export const useRecordStore = defineStore('record', () => {
   const records = ref([])
   const stats = ref({})
@@ -16,7 +19,9 @@ export const useRecordStore = defineStore('record', () => {
   const pagination = ref({
     page: 1,
     limit: 20,
-    total: 0
+    total: 0,
+    cursor: null,
+    hasMore: false
   })
 
   // 获取消费记录列表
@@ -26,8 +31,14 @@ export const useRecordStore = defineStore('record', () => {
       const params = {
         page: pagination.value.page,
         page_size: pagination.value.limit,
+        fields: LIST_FIELDS,
         ...filters
       }
+      // 追加加载时使用游标翻页，且不再重复统计总数
+      if (append && pagination.value.cursor) {
+        params.after = pagination.value.cursor
+        params.with_total = false
+      }
       const response = await getRecords({ params })
       const list = response.list || []
       if (append) {
@@ -35,7 +46,13 @@ export const useRecordStore = defineStore('record', () => {
       } else {
         records.value = list
       }
-      pagination.value.total = response.total || 0
+      if (response.total !== null && response.total !== undefined) {
+        pagination.value.total = response.total
+      }
+      pagination.value.cursor = response.next_cursor || null
+      pagination.value.hasMore = response.next_cursor
+        ? true
+        : records.value.length < pagination.value.total && !params.after
       return { success: true, data: response }
     } catch (error) {
       console.error('获取消费记录列表错误:', error)
@@ -112,13 +129,13 @@ export const useRecordStore = defineStore('record', () => {
     records.value = []
     pagination.value.page = 1
     pagination.value.total = 0
+    pagination.value.cursor = null
+    pagination.value.hasMore = false
   }
 
   const loadMoreRecords = async (filters = {}) => {
     if (loading.value) return
-    const loaded = records.value.length
-    const hasMore = loaded < pagination.value.total
-    if (!hasMore) return
+    if (!pagination.value.hasMore) return
     pagination.value.page += 1
     return fetchRecords(filters, { append: true })
   }